@@ -0,0 +1,163 @@
+#!/usr/bin/env python3
+from collections import defaultdict
+import logging
+import uuid
+
+from cassandra.util import unix_time_from_uuid1, uuid_from_time
+
+from Cassandra import model_cass
+
+# set logger
+
+log = logging.getLogger()
+
+
+# reglas
+#
+# Cada regla recibe la lectura, su hora (segundos epoch) y un dict de estado propio
+# del paciente, y devuelve (alert_type, value, threshold, severity, description) o None.
+# Las reglas con estado asumen que las lecturas de un paciente llegan en orden de tiempo.
+
+def _breaks(value, threshold, above):
+    return value > threshold if above else value < threshold
+
+
+class ThresholdRule:
+    """
+    Alerta cada lectura por encima (above=True) o por debajo de un umbral
+    """
+
+    def __init__(self, metric, threshold, above=True, severity='HIGH', alert_type=None):
+        self.metric = metric
+        self.threshold = threshold
+        self.above = above
+        self.severity = severity
+        self.alert_type = alert_type or f"{metric}_{'high' if above else 'low'}"
+
+    def evaluate(self, reading, ts, state):
+        value = getattr(reading, self.metric)
+        if value is None or not _breaks(value, self.threshold, self.above):
+            return None
+        sign = '>' if self.above else '<'
+        return (self.alert_type, value, self.threshold, self.severity,
+                f"{self.metric}={value} {sign} {self.threshold}")
+
+
+class RateOfChangeRule:
+    """
+    Alerta cuando el valor cambia mas de `max_delta` respecto a la lectura
+    anterior del paciente tomada hace como maximo `window_seconds`
+    """
+
+    def __init__(self, metric, max_delta, window_seconds=60, severity='MEDIUM', alert_type=None):
+        self.metric = metric
+        self.max_delta = max_delta
+        self.window_seconds = window_seconds
+        self.severity = severity
+        self.alert_type = alert_type or f"{metric}_rate"
+
+    def evaluate(self, reading, ts, state):
+        value = getattr(reading, self.metric)
+        if value is None:
+            return None
+        previous = state.get('previous')
+        state['previous'] = (ts, value)
+        if previous is None:
+            return None
+        prev_ts, prev_value = previous
+        delta = value - prev_value
+        if ts - prev_ts > self.window_seconds or abs(delta) <= self.max_delta:
+            return None
+        return (self.alert_type, value, self.max_delta, self.severity,
+                f"{self.metric} changed {delta:+d} in {ts - prev_ts:.0f}s (max {self.max_delta})")
+
+
+class SustainedRule:
+    """
+    Alerta una vez cuando el valor se mantiene fuera del umbral durante al menos
+    `duration_seconds`; se rearma cuando vuelve a rango
+    """
+
+    def __init__(self, metric, threshold, duration_seconds, above=True, severity='HIGH', alert_type=None):
+        self.metric = metric
+        self.threshold = threshold
+        self.duration_seconds = duration_seconds
+        self.above = above
+        self.severity = severity
+        self.alert_type = alert_type or f"{metric}_sustained"
+
+    def evaluate(self, reading, ts, state):
+        value = getattr(reading, self.metric)
+        if value is None:
+            return None
+        if not _breaks(value, self.threshold, self.above):
+            state.clear()
+            return None
+        since = state.setdefault('since', ts)
+        if state.get('fired') or ts - since < self.duration_seconds:
+            return None
+        state['fired'] = True
+        sign = '>' if self.above else '<'
+        return (self.alert_type, value, self.threshold, self.severity,
+                f"{self.metric} {sign} {self.threshold} for {ts - since:.0f}s")
+
+
+def alert_key(reading_timestmp, ts, rule_index):
+    """
+    (alert_id, TIMEUUID) de la alerta de una regla sobre una lectura.
+    Ambos se derivan de la lectura y del indice de la regla: reingestar las
+    mismas lecturas reescribe las mismas filas en lugar de duplicarlas, y
+    varias alertas de la misma lectura no se pisan.
+    """
+    seed = uuid.uuid5(reading_timestmp, str(rule_index))
+    node = seed.int & 0xFFFFFFFFFFFF
+    clock_seq = (seed.int >> 48) & 0x3FFF
+    return str(seed), uuid_from_time(ts, node=node, clock_seq=clock_seq)
+
+
+def default_rules():
+    return [
+        ThresholdRule('heart_rate', model_cass.HEART_RATE_MAX, above=True, severity='HIGH'),
+        ThresholdRule('glucose', model_cass.GLUCOSE_MAX, above=True, severity='MEDIUM'),
+        ThresholdRule('spo2', model_cass.SPO2_MIN, above=False, severity='HIGH'),
+        RateOfChangeRule('heart_rate', 30, window_seconds=60),
+        RateOfChangeRule('glucose', 40, window_seconds=15 * 60),
+        SustainedRule('heart_rate', 120, duration_seconds=10 * 60, above=True),
+        SustainedRule('spo2', 92, duration_seconds=5 * 60, above=False),
+    ]
+
+
+class AlertEngine:
+    """
+    Evalua las reglas sobre cada lectura que entra por ingest_readings y
+    devuelve las filas para alerts_by_patient (en el orden de INSERT_ALERT)
+    """
+
+    def __init__(self, rules=None):
+        self.rules = rules if rules is not None else default_rules()
+        # {patient_id: {indice de regla: estado}}
+        self._state = defaultdict(lambda: defaultdict(dict))
+        self.emitted = 0
+
+    def evaluate(self, reading):
+        ts = unix_time_from_uuid1(reading.timestmp)
+        patient_state = self._state[reading.patient_id]
+        alerts = []
+        for index, rule in enumerate(self.rules):
+            result = rule.evaluate(reading, ts, patient_state[index])
+            if result is None:
+                continue
+            alert_type, value, threshold, severity, description = result
+            alert_id, timestmp = alert_key(reading.timestmp, ts, index)
+            alerts.append((
+                alert_id, reading.patient_id, alert_type, value, threshold,
+                severity, description, timestmp,
+            ))
+        self.emitted += len(alerts)
+        return alerts
+
+    def reset(self, patient_id=None):
+        if patient_id is None:
+            self._state.clear()
+        else:
+            self._state.pop(patient_id, None)
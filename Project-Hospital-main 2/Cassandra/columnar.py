@@ -0,0 +1,178 @@
+#!/usr/bin/env python3
+from datetime import datetime
+import logging
+
+from cassandra.cluster import EXEC_PROFILE_DEFAULT
+
+from Cassandra import model_cass
+
+try:
+    import numpy as np
+except ImportError:  # numpy es opcional, solo lo necesita este modulo
+    np = None
+
+# set logger
+
+log = logging.getLogger()
+
+
+# diferencia entre el epoch de los UUID v1 (1582-10-15) y el epoch Unix, en unidades de 100 ns
+UUID_EPOCH_OFFSET = 0x01B21DD213814000
+
+# columnas que se devuelven como enteros (float64 con NaN si hay nulos)
+NUMERIC_COLUMNS = ('steps', 'heart_rate', 'spo2', 'glucose')
+
+
+def _require_numpy():
+    if np is None:
+        raise RuntimeError("numpy no esta instalado: pip install numpy")
+
+
+def timeuuids_to_datetime64(values):
+    """
+    Convierte TIMEUUIDs a datetime64[ns] (UTC) sin pasar por datetime de Python
+    """
+    _require_numpy()
+    ticks = np.fromiter((u.time for u in values), dtype=np.int64, count=len(values))
+    return ((ticks - UUID_EPOCH_OFFSET) * 100).astype('datetime64[ns]')
+
+
+def _column(name, values):
+    if name == 'timestmp':
+        return timeuuids_to_datetime64(values)
+    if name in NUMERIC_COLUMNS:
+        if None in values:
+            return np.array([np.nan if v is None else v for v in values], dtype=np.float64)
+        return np.array(values, dtype=np.int64)
+    return np.array(values, dtype=object)
+
+
+def columnar_row_factory(colnames, rows):
+    """
+    row_factory del driver: cada pagina se decodifica en un dict {columna: ndarray}
+    en lugar de una namedtuple por fila. Al iterar el ResultSet se obtiene un dict por pagina.
+    """
+    _require_numpy()
+    columns = list(zip(*rows)) if rows else [()] * len(colnames)
+    return [{name: _column(name, list(values)) for name, values in zip(colnames, columns)}]
+
+
+def fetch_columns(session, query, params, fetch_size=5000):
+    """
+    Ejecuta `query` con columnar_row_factory y concatena las paginas.
+    Devuelve {columna: ndarray}; requiere un Cluster configurado con execution profiles.
+    """
+    _require_numpy()
+    profile = session.execution_profile_clone_update(EXEC_PROFILE_DEFAULT, row_factory=columnar_row_factory)
+    bound = model_cass.prepare_statement(session, query).bind(params)
+    bound.fetch_size = fetch_size
+    model_cass.count_executions()
+    pages = list(session.execute(bound, execution_profile=profile))
+    if not pages:
+        return {}
+    return {name: np.concatenate([page[name] for page in pages]) for name in pages[0]}
+
+
+def fetch_readings_columns(session, patient_id, start_dt, end_dt, fetch_size=5000):
+    """
+    Lecturas de un paciente en [start_dt, end_dt] como arrays ordenados por tiempo ascendente
+    """
+    if isinstance(start_dt, str):
+        start_dt = datetime.strptime(start_dt, '%Y-%m-%d %H:%M:%S')
+    if isinstance(end_dt, str):
+        end_dt = datetime.strptime(end_dt, '%Y-%m-%d %H:%M:%S')
+    columns = fetch_columns(session, model_cass.SELECT_READINGS_COLUMNS_BY_PATIENT_INTERVAL,
+                            (patient_id, start_dt, end_dt), fetch_size)
+    if not columns:
+        return columns
+    # la tabla viene en orden DESC; la vista invertida no copia los datos
+    return {name: values[::-1] for name, values in columns.items()}
+
+
+# analitica vectorizada (los nulos se representan como NaN)
+
+def rolling_mean(values, window):
+    """
+    Media movil de `window` muestras ignorando NaN; las primeras window-1 posiciones quedan en NaN
+    """
+    _require_numpy()
+    values = np.asarray(values, dtype=np.float64)
+    valid = ~np.isnan(values)
+    sums = np.cumsum(np.where(valid, values, 0.0))
+    counts = np.cumsum(valid)
+    sums[window:] = sums[window:] - sums[:-window]
+    counts[window:] = counts[window:] - counts[:-window]
+    with np.errstate(invalid='ignore', divide='ignore'):
+        result = sums / counts
+    result[:window - 1] = np.nan
+    result[counts == 0] = np.nan
+    return result
+
+
+def percentiles(values, q=(50, 90, 95, 99)):
+    _require_numpy()
+    values = np.asarray(values, dtype=np.float64)
+    if np.isnan(values).all():
+        return {p: None for p in q}
+    return dict(zip(q, np.nanpercentile(values, q).tolist()))
+
+
+def resample(timestamps, values, interval=None, how='mean'):
+    """
+    Agrupa la serie en intervalos fijos (p. ej. np.timedelta64(5, 'm'); por defecto 1 minuto).
+    Devuelve (inicio de cada intervalo, valor agregado) solo para intervalos con datos.
+    how: 'mean', 'min', 'max', 'sum' o 'count'.
+    """
+    _require_numpy()
+    if interval is None:
+        interval = np.timedelta64(1, 'm')
+    values = np.asarray(values, dtype=np.float64)
+    valid = ~np.isnan(values)
+    timestamps, values = timestamps[valid], values[valid]
+    if len(values) == 0:
+        return timestamps, values
+
+    step = interval.astype('timedelta64[ns]').astype(np.int64)
+    ticks = timestamps.astype('datetime64[ns]').astype(np.int64)
+    buckets, inverse = np.unique(ticks // step, return_inverse=True)
+    starts = (buckets * step).astype('datetime64[ns]')
+
+    if how == 'count':
+        return starts, np.bincount(inverse).astype(np.float64)
+    if how in ('mean', 'sum'):
+        sums = np.bincount(inverse, weights=values)
+        return starts, sums if how == 'sum' else sums / np.bincount(inverse)
+    if how in ('min', 'max'):
+        out = np.full(len(buckets), np.inf if how == 'min' else -np.inf)
+        (np.minimum if how == 'min' else np.maximum).at(out, inverse, values)
+        return starts, out
+    raise ValueError(f"how no soportado: {how}")
+
+
+def anomaly_flags(values, z=3.0, window=None):
+    """
+    Marca muestras cuyo z-score supera `z`. Con `window` se usa la media y la
+    desviacion moviles de esa cantidad de muestras en lugar de las globales.
+    """
+    _require_numpy()
+    values = np.asarray(values, dtype=np.float64)
+    if window is None:
+        mean, std = np.nanmean(values), np.nanstd(values)
+    else:
+        mean = rolling_mean(values, window)
+        std = np.sqrt(np.maximum(rolling_mean(values * values, window) - mean * mean, 0.0))
+    with np.errstate(invalid='ignore', divide='ignore'):
+        scores = np.abs(values - mean) / std
+    return np.nan_to_num(scores, nan=0.0) > z
+
+
+def out_of_range_mask(columns, hr_threshold=model_cass.HEART_RATE_MAX,
+                      glucose_threshold=model_cass.GLUCOSE_MAX, spo2_threshold=model_cass.SPO2_MIN):
+    """
+    Version vectorizada de model_cass.is_out_of_range sobre el resultado de fetch_readings_columns
+    """
+    _require_numpy()
+    with np.errstate(invalid='ignore'):
+        return ((np.asarray(columns['heart_rate'], dtype=np.float64) > hr_threshold)
+                | (np.asarray(columns['glucose'], dtype=np.float64) > glucose_threshold)
+                | (np.asarray(columns['spo2'], dtype=np.float64) < spo2_threshold))
@@ -0,0 +1,339 @@
+#!/usr/bin/env python3
+from collections import defaultdict, deque, namedtuple
+from datetime import datetime
+import csv
+import logging
+import os
+import sys
+import threading
+import time
+import uuid
+
+from cassandra.query import BatchStatement, BatchType
+from cassandra.util import unix_time_from_uuid1, uuid_from_time
+
+from Cassandra import model_cass
+from common import TimedStats
+
+# set logger
+
+log = logging.getLogger()
+
+
+# una lectura de data_by_patient, en el mismo orden que INSERT_DATA_BY_PATIENT
+
+Reading = namedtuple('Reading', 'patient_id name steps heart_rate spo2 glucose timestmp')
+
+
+class RetryPolicy:
+    """
+    Reintentos con backoff exponencial para los futures que fallan
+    """
+
+    def __init__(self, max_retries=3, base_delay=0.05, max_delay=2.0):
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+
+    def should_retry(self, attempt, exc):
+        return attempt < self.max_retries
+
+    def delay(self, attempt):
+        return min(self.max_delay, self.base_delay * (2 ** attempt))
+
+
+class IngestStats(TimedStats):
+    """
+    Contadores de una ingesta: filas escritas, requests, reintentos y fallos
+    """
+
+    COUNTERS = ('rows', 'requests', 'retries', 'failed_rows', 'alerts')
+    RATE = 'rows'
+
+    @property
+    def rows_per_sec(self):
+        return self.per_sec('rows')
+
+
+class AsyncWriter:
+    """
+    Ejecuta escrituras con execute_async manteniendo como maximo `max_in_flight`
+    requests pendientes. submit() se bloquea cuando la ventana esta llena
+    (backpressure) y los futures fallidos se reintentan segun `retry_policy`
+    desde el hilo que escribe, nunca desde el hilo de eventos del driver.
+    `on_written(payload)` se llama (desde el hilo del driver) cuando el servidor
+    confirma un request enviado con payload; los que se abandonan no lo llaman.
+    """
+
+    def __init__(self, session, max_in_flight=128, retry_policy=None, stats=None, on_written=None):
+        self.session = session
+        self.retry_policy = retry_policy or RetryPolicy()
+        self.stats = stats or IngestStats()
+        self.on_written = on_written
+        self.errors = []
+        self._slots = threading.Semaphore(max_in_flight)
+        self._lock = threading.Condition()
+        self._pending = 0
+        self._retries = deque()
+
+    def submit(self, statement, params=None, rows=1, attempt=0, payload=None):
+        self._drain_retries()
+        self._slots.acquire()
+        with self._lock:
+            self._pending += 1
+            self.stats.requests += 1
+        model_cass.count_executions()
+        future = self.session.execute_async(statement, params)
+        future.add_callbacks(
+            self._on_success, self._on_error,
+            callback_args=(rows, payload),
+            errback_args=(statement, params, rows, attempt, payload),
+        )
+
+    def flush(self):
+        """
+        Espera a que terminen todos los requests pendientes (incluyendo reintentos)
+        """
+        while True:
+            self._drain_retries()
+            with self._lock:
+                while self._pending and not self._retries:
+                    self._lock.wait()
+                if not self._pending and not self._retries:
+                    return self.stats
+
+    def _on_success(self, _result, rows, payload):
+        with self._lock:
+            self.stats.rows += rows
+        if payload is not None and self.on_written is not None:
+            try:
+                self.on_written(payload)
+            except Exception as e:
+                log.error(f"on_written failed: {e}")
+        self._release()
+
+    def _on_error(self, exc, statement, params, rows, attempt, payload):
+        with self._lock:
+            if self.retry_policy.should_retry(attempt, exc):
+                ready_at = time.monotonic() + self.retry_policy.delay(attempt)
+                self._retries.append((ready_at, statement, params, rows, attempt + 1, payload))
+            else:
+                self.stats.failed_rows += rows
+                self.errors.append(exc)
+                log.error(f"Write failed after {attempt} retries: {exc}")
+        self._release()
+
+    def _release(self):
+        self._slots.release()
+        with self._lock:
+            self._pending -= 1
+            self._lock.notify_all()
+
+    def _drain_retries(self):
+        while True:
+            with self._lock:
+                if not self._retries:
+                    return
+                ready_at, statement, params, rows, attempt, payload = self._retries.popleft()
+                self.stats.retries += 1
+            wait = ready_at - time.monotonic()
+            if wait > 0:
+                time.sleep(wait)
+            self.submit(statement, params, rows=rows, attempt=attempt, payload=payload)
+
+
+def _partition_request(stmt, rows):
+    # una sola fila no necesita batch; varias filas de la misma particion van en un UNLOGGED batch
+    if len(rows) == 1:
+        return stmt, rows[0]
+    batch = BatchStatement(batch_type=BatchType.UNLOGGED)
+    for row in rows:
+        batch.add(stmt, row)
+    return batch, None
+
+
+def _legacy_row(reading):
+    # (patient_id, name, steps, heart_rate, spo2, glucose, timestmp)
+    return reading[0], tuple(reading)
+
+def _day_row(reading):
+    # (patient_id, day, name, steps, heart_rate, spo2, glucose, timestmp)
+    day = model_cass.reading_day(reading[6])
+    return (reading[0], day), (reading[0], day) + tuple(reading[1:])
+
+
+def ingest_readings(session, readings, batch_rows=50, max_buffered=5000,
+                    max_in_flight=128, retry_policy=None, legacy=True, buckets=False, latest=False,
+                    alert_engine=None, rollups=None):
+    """
+    Carga lecturas (Reading o tuplas en el orden de INSERT_DATA_BY_PATIENT) en
+    data_by_patient. Las filas se agrupan por clave de particion y cada grupo se
+    envia como un batch UNLOGGED de una sola particion con execute_async.
+    `readings` puede ser cualquier iterable (lista, generador, read_readings_csv).
+    Con buckets=True tambien se escribe en data_by_patient_day (particion por dia);
+    legacy=False deja de escribir en data_by_patient.
+    Con latest=True tambien se actualiza latest_by_patient (ultima lectura por paciente).
+    Si se pasa un AlertEngine, cada lectura se evalua al entrar y las alertas
+    se escriben en alerts_by_patient por el mismo writer asincrono.
+    Con un RollupAccumulator se recalculan los agregados de rollups_by_patient de
+    los dias que recibieron lecturas confirmadas por el servidor (las que fallan
+    no cuentan), leyendo la tabla cruda que se esta escribiendo.
+    Devuelve IngestStats con filas/seg.
+    """
+    targets = []
+    if legacy:
+        targets.append((model_cass.prepare_statement(session, model_cass.INSERT_DATA_BY_PATIENT), _legacy_row))
+    if buckets:
+        targets.append((model_cass.prepare_statement(session, model_cass.INSERT_DATA_BY_PATIENT_DAY), _day_row))
+    writer = AsyncWriter(session, max_in_flight=max_in_flight, retry_policy=retry_policy,
+                         on_written=rollups.touch_rows if rollups is not None else None)
+    # los rollups se recalculan desde la primera tabla destino (data_by_patient si legacy)
+    rollup_day_table = not legacy
+    alert_stmt = latest_stmt = None
+    if latest:
+        latest_stmt = model_cass.prepare_statement(session, model_cass.INSERT_LATEST_BY_PATIENT)
+    if alert_engine is not None:
+        alert_stmt = model_cass.prepare_statement(session, model_cass.INSERT_ALERT)
+
+    # {(indice de tabla, clave de particion): [filas]}
+    buffers = defaultdict(list)
+    buffered = 0
+    # {patient_id: (write_ts, Reading)} solo la mas reciente de cada paciente entre vaciados
+    newest = {}
+
+    def send(key):
+        rows = buffers.pop(key)
+        request, params = _partition_request(targets[key[0]][0], rows)
+        # (patient_id, timestmp) de cada fila: primera y ultima columna en ambas tablas
+        payload = [(row[0], row[-1]) for row in rows] if rollups is not None and key[0] == 0 else None
+        writer.submit(request, params, rows=len(rows), payload=payload)
+        return len(rows)
+
+    def send_latest():
+        for write_ts, reading in newest.values():
+            writer.submit(latest_stmt, tuple(reading) + (write_ts,), rows=0)
+        newest.clear()
+
+    for reading in readings:
+        reading = Reading(*reading)
+        if latest_stmt is not None:
+            write_ts = int(unix_time_from_uuid1(reading.timestmp) * 1000000)
+            current = newest.get(reading.patient_id)
+            if current is None or write_ts > current[0]:
+                newest[reading.patient_id] = (write_ts, reading)
+        if alert_engine is not None:
+            for alert in alert_engine.evaluate(reading):
+                writer.submit(alert_stmt, alert, rows=0)
+                writer.stats.alerts += 1
+        if rollups is not None and len(rollups) >= rollups.max_keys:
+            # solo hay dias ya confirmados: se pueden recalcular sin esperar al resto
+            rollups.flush(session, day_table=rollup_day_table)
+        for index, (_stmt, to_row) in enumerate(targets):
+            partition, row = to_row(reading)
+            key = (index, partition)
+            buffers[key].append(row)
+            buffered += 1
+            if len(buffers[key]) >= batch_rows:
+                buffered -= send(key)
+        if buffered >= max_buffered:
+            # demasiadas particiones con pocas filas: vaciar todo para acotar memoria
+            for key in list(buffers):
+                buffered -= send(key)
+            send_latest()
+
+    for key in list(buffers):
+        send(key)
+    send_latest()
+
+    stats = writer.flush()
+    if rollups is not None:
+        rollups.flush(session, day_table=rollup_day_table)
+    stats.finish()
+    log.info(f"Ingested {stats.rows} readings in {stats.elapsed:.2f}s ({stats.rows_per_sec:.0f} rows/sec), "
+             f"{stats.retries} retries, {stats.failed_rows} failed, {stats.alerts} alerts")
+    return stats
+
+
+def migrate_to_day_buckets(session, fetch_size=1000, **kwargs):
+    """
+    Copia todo data_by_patient a data_by_patient_day leyendo por paginas.
+    Para migrar sin perder lecturas: activar primero la doble escritura
+    (ingest_readings(..., buckets=True)), ejecutar esta migracion y despues
+    cambiar las lecturas a bucketed=True. Con CASSANDRA_BUCKETS_MIGRATED=1 las
+    lecturas por intervalo dejan de completarse desde data_by_patient.
+    """
+    stmt = model_cass.prepare_statement(session, model_cass.SELECT_ALL_DATA_BY_PATIENT)
+    stmt.fetch_size = fetch_size
+    model_cass.count_executions()
+    rows = session.execute(stmt)
+    readings = (Reading(*row) for row in rows)
+    return ingest_readings(session, readings, legacy=False, buckets=True, **kwargs)
+
+
+def write_rows(session, query, rows, max_in_flight=128, retry_policy=None):
+    """
+    Escribe filas independientes (una particion por fila) con execute_async
+    """
+    stmt = model_cass.prepare_statement(session, query)
+    writer = AsyncWriter(session, max_in_flight=max_in_flight, retry_policy=retry_policy)
+    for row in rows:
+        writer.submit(stmt, tuple(row))
+    stats = writer.flush()
+    stats.finish()
+    return stats
+
+
+def _to_int(value):
+    return int(value) if value not in (None, '') else None
+
+
+def read_readings_csv(file_path):
+    """
+    Genera Readings desde un CSV con columnas
+    patient_id,name,steps,heart_rate,spo2,glucose[,timestamp]
+    timestamp (ISO, opcional) se convierte en TIMEUUID; si no existe se usa la hora actual.
+    """
+    with open(file_path, 'r', encoding='utf-8', newline='') as fd:
+        for row in csv.DictReader(fd):
+            ts = row.get('timestamp')
+            timestmp = uuid_from_time(datetime.fromisoformat(ts)) if ts else uuid.uuid1()
+            yield Reading(
+                row['patient_id'],
+                row.get('name'),
+                _to_int(row.get('steps')),
+                _to_int(row.get('heart_rate')),
+                _to_int(row.get('spo2')),
+                _to_int(row.get('glucose')),
+                timestmp,
+            )
+
+
+if __name__ == "__main__":
+    # python -m Cassandra.ingest lecturas.csv
+    # python -m Cassandra.ingest --migrate-buckets
+    # python -m Cassandra.ingest --backfill-rollups
+    from connect import connections
+
+    logging.basicConfig(level=logging.INFO)
+    if len(sys.argv) < 2:
+        print("usage: python -m Cassandra.ingest <readings.csv> | --migrate-buckets | --backfill-rollups")
+        sys.exit(1)
+
+    session = connections.get_cassandra_session()
+    session.set_keyspace(os.getenv('CASSANDRA_KEYSPACE', 'cassandra_project'))
+    try:
+        if sys.argv[1] == '--migrate-buckets':
+            print(migrate_to_day_buckets(session))
+        elif sys.argv[1] == '--backfill-rollups':
+            from Cassandra.rollups import backfill_rollups
+            backfill_rollups(session)
+        else:
+            from Cassandra.alerts import AlertEngine
+            from Cassandra.rollups import RollupAccumulator
+
+            buckets = os.getenv('CASSANDRA_DAY_BUCKETS', '0') == '1'
+            rollups = RollupAccumulator() if os.getenv('CASSANDRA_ROLLUPS', '0') == '1' else None
+            print(ingest_readings(session, read_readings_csv(sys.argv[1]), buckets=buckets, latest=True,
+                                  alert_engine=AlertEngine(), rollups=rollups))
+    finally:
+        connections.close_all()
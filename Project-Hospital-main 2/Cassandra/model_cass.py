@@ -1,10 +1,14 @@
 #!/usr/bin/env python3
-from datetime import datetime
+from datetime import datetime, timedelta, timezone
 import logging
+import os
 import random
+import threading
 import uuid
+import weakref
 
-from cassandra.query import BatchStatement
+from cassandra.concurrent import execute_concurrent, execute_concurrent_with_args
+from cassandra.util import datetime_from_uuid1
 
 # set logger
 
@@ -42,6 +46,22 @@ CREATE_DATA_BY_PATIENT_TABLE = """
         ) WITH CLUSTERING ORDER BY (timestmp DESC)
 """
 
+# misma lectura particionada por (patient_id, day) para acotar el tamano de cada particion
+
+CREATE_DATA_BY_PATIENT_DAY_TABLE = """
+        CREATE TABLE IF NOT EXISTS data_by_patient_day (
+            patient_id TEXT,
+            day DATE,
+            name TEXT,
+            steps INT,
+            heart_rate INT,
+            spo2 INT,
+            glucose INT,
+            timestmp TIMEUUID,
+            PRIMARY KEY ((patient_id, day), timestmp)
+        ) WITH CLUSTERING ORDER BY (timestmp DESC)
+"""
+
 CREATE_ALERTS_TABLE = """
     CREATE TABLE IF NOT EXISTS alerts_by_patient (
         alert_id TEXT,
@@ -57,6 +77,38 @@ CREATE_ALERTS_TABLE = """
 """
 
 
+# ultima lectura por paciente (write-through desde la ingesta)
+
+CREATE_LATEST_BY_PATIENT_TABLE = """
+    CREATE TABLE IF NOT EXISTS latest_by_patient (
+        patient_id TEXT PRIMARY KEY,
+        name TEXT,
+        steps INT,
+        heart_rate INT,
+        spo2 INT,
+        glucose INT,
+        timestmp TIMEUUID
+    )
+"""
+
+# agregados por paciente/resolucion (minute, hour, day) y metrica
+
+CREATE_ROLLUPS_TABLE = """
+    CREATE TABLE IF NOT EXISTS rollups_by_patient (
+        patient_id TEXT,
+        resolution TEXT,
+        metric TEXT,
+        bucket TIMESTAMP,
+        cnt BIGINT,
+        total BIGINT,
+        minimum INT,
+        maximum INT,
+        sumsq BIGINT,
+        PRIMARY KEY ((patient_id, resolution), metric, bucket)
+    ) WITH CLUSTERING ORDER BY (metric ASC, bucket DESC)
+"""
+
+
 INSERT_ALERT = """
     INSERT INTO alerts_by_patient (
         alert_id, patient_id, alert_type, value, threshold, severity, description, timestmp
@@ -64,6 +116,63 @@ INSERT_ALERT = """
 """
 
 
+SELECT_ALERTS_BY_PATIENT_INTERVAL = """
+    SELECT patient_id, alert_type, severity, value, threshold, description, timestmp
+    FROM alerts_by_patient
+    WHERE patient_id = ?
+      AND timestmp >= minTimeuuid(?)
+      AND timestmp <= maxTimeuuid(?)
+"""
+
+
+INSERT_ROLLUP = """
+    INSERT INTO rollups_by_patient (
+        patient_id, resolution, metric, bucket, cnt, total, minimum, maximum, sumsq
+    ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+    USING TTL ? AND TIMESTAMP ?
+"""
+
+# lecturas crudas de un dia, para recalcular sus rollups (mismo orden que Reading)
+SELECT_ROLLUP_SOURCE = """
+    SELECT patient_id, name, steps, heart_rate, spo2, glucose, timestmp
+    FROM data_by_patient
+    WHERE patient_id = ?
+      AND timestmp >= minTimeuuid(?)
+      AND timestmp < minTimeuuid(?)
+"""
+
+SELECT_ROLLUP_SOURCE_DAY = """
+    SELECT patient_id, name, steps, heart_rate, spo2, glucose, timestmp
+    FROM data_by_patient_day
+    WHERE patient_id = ?
+      AND day = ?
+"""
+
+SELECT_ROLLUPS_BY_METRIC = """
+    SELECT bucket, cnt, total, minimum, maximum, sumsq
+    FROM rollups_by_patient
+    WHERE patient_id = ?
+      AND resolution = ?
+      AND metric = ?
+"""
+
+SELECT_ROLLUPS_BY_METRIC_INTERVAL = """
+    SELECT bucket, cnt, total, minimum, maximum, sumsq
+    FROM rollups_by_patient
+    WHERE patient_id = ?
+      AND resolution = ?
+      AND metric = ?
+      AND bucket >= ?
+      AND bucket <= ?
+"""
+
+DELETE_ROLLUPS_BY_PATIENT = """
+    DELETE FROM rollups_by_patient
+    WHERE patient_id = ?
+      AND resolution = ?
+"""
+
+
 # query statments
 
 #Q1
@@ -94,18 +203,35 @@ SELECT_GLUCOSE_BY_PATIENT = """
 
 #Q4
 
+# una consulta LIMIT 1 por particion (en paralelo) en lugar de un IN sobre un solo coordinador
+
 SELECT_LAST_READ_BY_N_PATIENTS = """
     SELECT patient_id, heart_rate, spo2, glucose, timestmp
     FROM data_by_patient
-    WHERE patient_id IN ?
+    WHERE patient_id = ?
+    LIMIT 1
+"""
 
+SELECT_LATEST_BY_PATIENT = """
+    SELECT patient_id, heart_rate, spo2, glucose, timestmp
+    FROM latest_by_patient
+    WHERE patient_id = ?
 """
 
 
+SELECT_READINGS_BY_PATIENT_DAY_INTERVAL = """
+    SELECT patient_id, name, heart_rate, glucose, timestmp
+    FROM data_by_patient_day
+    WHERE patient_id = ?
+      AND day = ?
+      AND timestmp >= minTimeuuid(?)
+      AND timestmp <= maxTimeuuid(?)
+"""
+
 #Q5
 
 SELECT_LAST_READ_BY_PATIENT = """
-    SELECT *
+    SELECT patient_id, name, steps, heart_rate, spo2, glucose, timestmp
     FROM data_by_patient
     WHERE patient_id = ?
     LIMIT 1
@@ -114,28 +240,31 @@ SELECT_LAST_READ_BY_PATIENT = """
 
 #Q6
 
-SELECT_HEARTRATE_OUT = """
+SELECT_VITALS_BY_PATIENT_INTERVAL = """
     SELECT patient_id, name, heart_rate, glucose, spo2, timestmp
     FROM data_by_patient
     WHERE patient_id = ?
-        AND heart_rate > ?
-    ALLOW FILTERING
+      AND timestmp >= minTimeuuid(?)
+      AND timestmp <= maxTimeuuid(?)
 """
 
-SELECT_GLUCOSE_OUT = """
-    SELECT patient_id, name, heart_rate, glucose, spo2, timestmp
+# analitica columnar (Cassandra/columnar.py)
+
+SELECT_READINGS_COLUMNS_BY_PATIENT_INTERVAL = """
+    SELECT steps, heart_rate, spo2, glucose, timestmp
     FROM data_by_patient
     WHERE patient_id = ?
-        AND glucose > ?
-    ALLOW FILTERING
+      AND timestmp >= minTimeuuid(?)
+      AND timestmp <= maxTimeuuid(?)
 """
 
-SELECT_SPO2_OUT = """
+SELECT_VITALS_BY_PATIENT_DAY_INTERVAL = """
     SELECT patient_id, name, heart_rate, glucose, spo2, timestmp
-    FROM data_by_patient
+    FROM data_by_patient_day
     WHERE patient_id = ?
-        AND spo2 < ?
-    ALLOW FILTERING
+      AND day = ?
+      AND timestmp >= minTimeuuid(?)
+      AND timestmp <= maxTimeuuid(?)
 """
 
 #Q7
@@ -150,13 +279,22 @@ SELECT_HEART_RATE_BY_PATIENT = """
 #Q8
 
 SELECT_LAST_N_READS_BY_PATIENT = """
-    SELECT *
+    SELECT patient_id, name, steps, heart_rate, spo2, glucose, timestmp
     FROM data_by_patient
     WHERE patient_id = ?
     LIMIT ?
 """
 
 
+SELECT_LAST_N_READS_BY_PATIENT_DAY = """
+    SELECT patient_id, name, steps, heart_rate, spo2, glucose, timestmp
+    FROM data_by_patient_day
+    WHERE patient_id = ?
+      AND day = ?
+    LIMIT ?
+"""
+
+
 #Q9
 
 SELECT_COUNT_READINGS_BY_PATIENT = """
@@ -174,11 +312,113 @@ SELECT_WEAREABLE_INFO_BY_PATIENT_ID = """
     ALLOW FILTERING
 """
 
+# inserts
+
+INSERT_DATA_BY_PATIENT = """
+    INSERT INTO data_by_patient (patient_id, name, steps, heart_rate, spo2, glucose, timestmp)
+    VALUES (?, ?, ?, ?, ?, ?, ?)
+"""
+
+INSERT_DATA_BY_PATIENT_DAY = """
+    INSERT INTO data_by_patient_day (patient_id, day, name, steps, heart_rate, spo2, glucose, timestmp)
+    VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+"""
+
+# recorrido completo de data_by_patient (migracion a buckets)
+
+SELECT_ALL_DATA_BY_PATIENT = """
+    SELECT patient_id, name, steps, heart_rate, spo2, glucose, timestmp
+    FROM data_by_patient
+"""
+
+# USING TIMESTAMP = hora de la lectura: una lectura vieja que llega tarde no pisa a la mas reciente
+
+INSERT_LATEST_BY_PATIENT = """
+    INSERT INTO latest_by_patient (patient_id, name, steps, heart_rate, spo2, glucose, timestmp)
+    VALUES (?, ?, ?, ?, ?, ?, ?)
+    USING TIMESTAMP ?
+"""
+
+INSERT_WEAREABLE_INFO = """
+    INSERT INTO weareable_info (device_id, device_name, patient_id)
+    VALUES (?, ?, ?)
+"""
+
 """
 En algunos queries estoy usando ALLOW FLITERING para poder acceder a las columnas que no son parte de la clave primaria.
 Esto puede afectar el rendimiento en tablas grandes.
 """
 
+# registro de statements preparados
+
+QUERY_STATEMENTS = [
+    SELECT_DATA_BY_PATIENT,
+    SELECT_READINGS_BY_PATIENT_INTERVAL,
+    SELECT_GLUCOSE_BY_PATIENT,
+    SELECT_LAST_READ_BY_N_PATIENTS,
+    SELECT_LATEST_BY_PATIENT,
+    SELECT_LAST_READ_BY_PATIENT,
+    SELECT_VITALS_BY_PATIENT_INTERVAL,
+    SELECT_VITALS_BY_PATIENT_DAY_INTERVAL,
+    SELECT_READINGS_COLUMNS_BY_PATIENT_INTERVAL,
+    SELECT_HEART_RATE_BY_PATIENT,
+    SELECT_LAST_N_READS_BY_PATIENT,
+    SELECT_READINGS_BY_PATIENT_DAY_INTERVAL,
+    SELECT_LAST_N_READS_BY_PATIENT_DAY,
+    SELECT_COUNT_READINGS_BY_PATIENT,
+    SELECT_WEAREABLE_INFO_BY_PATIENT_ID,
+    INSERT_DATA_BY_PATIENT,
+    INSERT_DATA_BY_PATIENT_DAY,
+    INSERT_LATEST_BY_PATIENT,
+    INSERT_WEAREABLE_INFO,
+    INSERT_ALERT,
+    SELECT_ALERTS_BY_PATIENT_INTERVAL,
+    INSERT_ROLLUP,
+    SELECT_ROLLUP_SOURCE,
+    SELECT_ROLLUP_SOURCE_DAY,
+    SELECT_ROLLUPS_BY_METRIC,
+    SELECT_ROLLUPS_BY_METRIC_INTERVAL,
+]
+
+# consultas que aceptan LIMIT del lado del servidor (ver with_limit)
+LIMITABLE_STATEMENTS = [
+    SELECT_DATA_BY_PATIENT,
+    SELECT_READINGS_BY_PATIENT_INTERVAL,
+    SELECT_READINGS_BY_PATIENT_DAY_INTERVAL,
+    SELECT_GLUCOSE_BY_PATIENT,
+    SELECT_ALERTS_BY_PATIENT_INTERVAL,
+]
+
+# statements preparados por sesion: {session: {query: PreparedStatement}}
+_prepared_by_session = weakref.WeakKeyDictionary()
+
+# contadores para confirmar que el hot path no vuelve a preparar; se actualizan
+# desde varios hilos (ingesta, rollups), siempre con count_* y bajo _stats_lock
+STATEMENT_STATS = {'prepares': 0, 'executions': 0}
+_stats_lock = threading.Lock()
+
+# buckets diarios: cuantos dias se consultan en paralelo y hasta donde se busca hacia atras
+# (lo que quede fuera de la ventana se completa desde data_by_patient)
+BUCKET_FANOUT = 7
+BUCKET_LOOKBACK_DAYS = int(os.getenv('CASSANDRA_BUCKET_LOOKBACK_DAYS', '90'))
+# '1' una vez corrida migrate_to_day_buckets: los intervalos ya no se completan desde data_by_patient
+BUCKETS_MIGRATED = os.getenv('CASSANDRA_BUCKETS_MIGRATED', '0') == '1'
+
+# filas por pagina al iterar resultados (fetch_size del driver)
+DEFAULT_FETCH_SIZE = 100
+
+# consultas simultaneas al buscar la ultima lectura de muchos pacientes (Q4)
+LAST_READ_CONCURRENCY = 32
+
+# ventana por defecto para buscar lecturas fuera de rango (Q6) y alertas
+OUT_OF_RANGE_WINDOW = timedelta(days=1)
+
+# umbrales por defecto (Q6 y motor de alertas)
+HEART_RATE_MAX = 140
+GLUCOSE_MAX = 120
+SPO2_MIN = 90
+
+
 # sample data
 
 
@@ -233,28 +473,206 @@ def create_schema(session):
     log.info("Creating tables...")
     session.execute(CREATE_WEAREABLE_INFO_TABLE)
     session.execute(CREATE_DATA_BY_PATIENT_TABLE)
+    session.execute(CREATE_DATA_BY_PATIENT_DAY_TABLE)
+    session.execute(CREATE_LATEST_BY_PATIENT_TABLE)
     session.execute(CREATE_ALERTS_TABLE)
+    session.execute(CREATE_ROLLUPS_TABLE)
+    # el esquema pudo cambiar: los statements se vuelven a preparar en el siguiente uso
+    reset_prepared_statements(session)
     log.info("Tables created successfully.")
 
-def execute_batch(session, stmt, data):
-    batch_size = 25
-    for i in range(0, len(data), batch_size):
-        batch = BatchStatement()
-        for item in data[i : i+batch_size]:
-            batch.add(stmt, item)
-        session.execute(batch)
+def prepare_statement(session, query):
+    """
+    Devuelve el PreparedStatement de `query` para esta sesion, preparandolo
+    solo la primera vez. El driver se encarga de re-preparar en los nodos
+    que se reinician (reprepare_on_up) o que responden UNPREPARED.
+    """
+    cache = _prepared_by_session.setdefault(session, {})
+    stmt = cache.get(query)
+    if stmt is None:
+        stmt = session.prepare(query)
+        with _stats_lock:
+            STATEMENT_STATS['prepares'] += 1
+        cache[query] = stmt
+    return stmt
+
+def prepare_all_statements(session):
+    """
+    Prepara todos los statements Q1-Q10 (e inserts) al iniciar la sesion
+    """
+    for query in QUERY_STATEMENTS:
+        prepare_statement(session, query)
+    for query in LIMITABLE_STATEMENTS:
+        prepare_statement(session, with_limit(query))
+    log.info(f"Prepared {len(QUERY_STATEMENTS) + len(LIMITABLE_STATEMENTS)} statements")
+
+def reset_prepared_statements(session):
+    """
+    Descarta los statements preparados de la sesion (p. ej. despues de un cambio de esquema)
+    """
+    _prepared_by_session.pop(session, None)
+
+def count_executions(n=1):
+    """
+    Suma `n` ejecuciones a STATEMENT_STATS; la usa todo lo que ejecuta statements
+    fuera de execute_prepared (paginas, execute_concurrent, execute_async)
+    """
+    with _stats_lock:
+        STATEMENT_STATS['executions'] += n
+
+def execute_prepared(session, query, params=None, **kwargs):
+    stmt = prepare_statement(session, query)
+    count_executions()
+    return session.execute(stmt, params, **kwargs)
+
+def with_limit(query):
+    """
+    Variante de `query` con LIMIT ? para que el servidor corte el resultado
+    """
+    return query.rstrip() + "\n    LIMIT ?\n"
+
+def _decode_paging_state(token):
+    """
+    Token de pagina (hex, el que devuelve get_page) -> paging state del driver
+    """
+    return bytes.fromhex(token) if token else None
+
+def _encode_paging_state(state):
+    return state.hex() if state else None
+
+def iter_rows(session, query, params, fetch_size=DEFAULT_FETCH_SIZE, paging_state=None):
+    """
+    Generador sobre el resultado de `query` pidiendo `fetch_size` filas por pagina.
+    Solo hay una pagina en memoria a la vez; la siguiente se pide al consumir la actual.
+    `paging_state` es un token de get_page para continuar desde esa pagina.
+    """
+    bound = prepare_statement(session, query).bind(params)
+    bound.fetch_size = fetch_size
+    count_executions()
+    for row in session.execute(bound, paging_state=_decode_paging_state(paging_state)):
+        yield row
+
+def get_page(session, query, params, page_size=DEFAULT_FETCH_SIZE, paging_state=None):
+    """
+    Devuelve una pagina (filas, token). El token es el paging state del driver en
+    hex (None si no hay mas) y se pasa de vuelta para pedir la pagina siguiente,
+    incluso desde otro proceso o request.
+    """
+    bound = prepare_statement(session, query).bind(params)
+    bound.fetch_size = page_size
+    count_executions()
+    result = session.execute(bound, paging_state=_decode_paging_state(paging_state))
+    return list(result.current_rows), _encode_paging_state(result.paging_state)
+
+def get_statement_stats():
+    """
+    Devuelve los contadores de prepares vs ejecuciones
+    """
+    with _stats_lock:
+        stats = dict(STATEMENT_STATS)
+    stats['cached'] = sum(len(c) for c in _prepared_by_session.values())
+    return stats
+
+def reading_day(timestmp):
+    """
+    Bucket (dia UTC) al que pertenece una lectura segun su TIMEUUID
+    """
+    return datetime_from_uuid1(timestmp).date()
+
+def _days_desc(start_dt, end_dt):
+    # dias del intervalo, del mas reciente al mas antiguo
+    day, first = end_dt.date(), start_dt.date()
+    days = []
+    while day >= first:
+        days.append(day)
+        day -= timedelta(days=1)
+    return days
+
+def _execute_buckets(session, query, params_list):
+    """
+    Ejecuta la misma consulta sobre varios buckets en paralelo.
+    Devuelve las filas concatenadas en el orden de params_list; como cada bucket es
+    un dia distinto y viene ordenado por timestmp DESC, el resultado queda ordenado.
+    """
+    stmt = prepare_statement(session, query)
+    count_executions(len(params_list))
+    results = execute_concurrent(
+        session, [(stmt, params) for params in params_list],
+        concurrency=BUCKET_FANOUT, raise_on_first_error=True
+    )
+    rows = []
+    for _success, result in results:
+        rows.extend(result)
+    return rows
+
+def _last_n_from_buckets(session, patient_id, n, lookback_days=BUCKET_LOOKBACK_DAYS):
+    """
+    Ultimas n lecturas desde los buckets diarios, buscando hasta `lookback_days`
+    hacia atras. Si ahi hay menos de n (lecturas mas antiguas que la ventana),
+    se completa con data_by_patient, que no tiene limite de antiguedad.
+    """
+    today = datetime.now(timezone.utc).date()
+    days = [today - timedelta(days=i) for i in range(lookback_days)]
+    rows = _scan_buckets_desc(session, SELECT_LAST_N_READS_BY_PATIENT_DAY,
+                              [(patient_id, day, n) for day in days], n)
+    if len(rows) >= n:
+        return rows
+    legacy = execute_prepared(session, SELECT_LAST_N_READS_BY_PATIENT, (patient_id, n))
+    return _merge_desc(rows, legacy, n)
+
+def _scan_buckets_desc(session, query, params_list, limit=None):
+    """
+    Recorre los buckets en el orden de params_list (del dia mas reciente al mas
+    antiguo), BUCKET_FANOUT dias a la vez, y para en cuanto junta `limit` filas
+    """
+    rows = []
+    for offset in range(0, len(params_list), BUCKET_FANOUT):
+        rows.extend(_execute_buckets(session, query, params_list[offset:offset + BUCKET_FANOUT]))
+        if limit is not None and len(rows) >= limit:
+            return rows[:limit]
+    return rows
+
+def _merge_desc(rows, legacy, limit=None):
+    """
+    Combina filas de los buckets con las de data_by_patient (mismas columnas), sin
+    repetir por timestmp y de la mas reciente a la mas antigua
+    """
+    merged = {row.timestmp: row for row in legacy}
+    merged.update((row.timestmp, row) for row in rows)
+    rows = sorted(merged.values(), key=lambda row: datetime_from_uuid1(row.timestmp), reverse=True)
+    return rows if limit is None else rows[:limit]
 
-def bulk_insert(session):
+def _interval_from_buckets(session, query, legacy_query, patient_id, start_dt, end_dt, limit=None):
+    """
+    Lecturas de un intervalo desde los buckets diarios. Mientras la migracion no
+    haya terminado (BUCKETS_MIGRATED) se completa con data_by_patient, donde siguen
+    las lecturas que todavia no se copiaron a data_by_patient_day.
+    """
+    days = _days_desc(start_dt, end_dt)
+    if limit is None:
+        rows = _execute_buckets(session, query, [(patient_id, day, start_dt, end_dt) for day in days])
+    else:
+        rows = _scan_buckets_desc(session, with_limit(query),
+                                  [(patient_id, day, start_dt, end_dt, limit) for day in days], limit)
+    if BUCKETS_MIGRATED or (limit is not None and len(rows) >= limit):
+        return rows
+    if limit is None:
+        legacy = execute_prepared(session, legacy_query, (patient_id, start_dt, end_dt))
+    else:
+        legacy = execute_prepared(session, with_limit(legacy_query), (patient_id, start_dt, end_dt, limit))
+    return _merge_desc(rows, legacy, limit)
+
+def bulk_insert(session, buckets=False, rollups=False, latest=True):
     """
     Inserta los datos de PATIENTS_INFO y WEAREABLE_INFO en las tablas
     Se genera timestmp (TIMEUUID) para cada lectura 
+    Con buckets=True las lecturas tambien se escriben en data_by_patient_day
+    Con rollups=True se actualizan los agregados de rollups_by_patient
+    Con latest=True se mantiene latest_by_patient
     """
-    patients_stmt = session.prepare(
-        "INSERT INTO data_by_patient (patient_id, name, steps, heart_rate, spo2, glucose, timestmp) VALUES (?, ?, ?, ?, ?, ?, ?)"
-    )
-    weareable_stmt = session.prepare(
-        "INSERT INTO weareable_info (device_id, device_name, patient_id) VALUES (?, ?, ?)"
-    )
+    from Cassandra.alerts import AlertEngine
+    from Cassandra.ingest import ingest_readings, write_rows
+    from Cassandra.rollups import RollupAccumulator
 
     # preparar lista con timestmp para cada paciente
     patients_with_ts = []
@@ -266,8 +684,9 @@ def bulk_insert(session):
         patients_with_ts.append((p[0], p[1], p[2], p[3], p[4], p[5], ts))
 
     # weareable data ya está en formato (device_id, device_name, patient_id)
-    execute_batch(session, patients_stmt, patients_with_ts)
-    execute_batch(session, weareable_stmt, WEAREABLE_INFO)
+    ingest_readings(session, patients_with_ts, buckets=buckets, latest=latest, alert_engine=AlertEngine(),
+                    rollups=RollupAccumulator() if rollups else None)
+    write_rows(session, INSERT_WEAREABLE_INFO, WEAREABLE_INFO)
 
 
 
@@ -275,16 +694,32 @@ def bulk_insert(session):
 # Funciones para ejecutar las consultas
 
 def get_data_by_patient(session, patient_id, limit=None):
-    stmt = session.prepare(SELECT_DATA_BY_PATIENT)
-    rows = session.execute(stmt, (patient_id,))
-    results = list(rows)
-    return results if limit is None else results[:limit]
+    if limit is not None:
+        return list(execute_prepared(session, with_limit(SELECT_DATA_BY_PATIENT), (patient_id, limit)))
+    rows = execute_prepared(session, SELECT_DATA_BY_PATIENT, (patient_id,))
+    return list(rows)
 
 
-def get_readings_by_patient_interval(session, patient_id, start_dt, end_dt, limit=None):
+def iter_data_by_patient(session, patient_id, fetch_size=DEFAULT_FETCH_SIZE):
+    """
+    version generador de Q1: recorre todo el historial con memoria constante
+    """
+    return iter_rows(session, SELECT_DATA_BY_PATIENT, (patient_id,), fetch_size)
+
+
+def get_data_by_patient_page(session, patient_id, page_size=DEFAULT_FETCH_SIZE, paging_state=None):
+    """
+    Q1 por paginas: devuelve (filas, token de la siguiente pagina o None)
+    """
+    return get_page(session, SELECT_DATA_BY_PATIENT, (patient_id,), page_size, paging_state)
+
+
+def get_readings_by_patient_interval(session, patient_id, start_dt, end_dt, limit=None, bucketed=False):
     """
     Recupera lecturas (heart_rate, glucose, timestmp) entre start_dt y end_dt (datetime).
     Convierte strings a datetime si es necesario.
+    Con bucketed=True consulta en paralelo los buckets diarios de data_by_patient_day,
+    del dia mas reciente hacia atras, y deja de consultar al juntar `limit` lecturas.
     """
 
     if isinstance(start_dt, str):
@@ -292,47 +727,91 @@ def get_readings_by_patient_interval(session, patient_id, start_dt, end_dt, limi
     if isinstance(end_dt, str):
         end_dt = datetime.strptime(end_dt, '%Y-%m-%d %H:%M:%S')
     
-    stmt = session.prepare(SELECT_READINGS_BY_PATIENT_INTERVAL)
-    rows = session.execute(stmt, (patient_id, start_dt, end_dt))
-    results = list(rows)
-    return results if limit is None else results[:limit]
+    if bucketed:
+        return _interval_from_buckets(session, SELECT_READINGS_BY_PATIENT_DAY_INTERVAL,
+                                      SELECT_READINGS_BY_PATIENT_INTERVAL, patient_id, start_dt, end_dt, limit)
+
+    if limit is not None:
+        return list(execute_prepared(session, with_limit(SELECT_READINGS_BY_PATIENT_INTERVAL),
+                                     (patient_id, start_dt, end_dt, limit)))
+    rows = execute_prepared(session, SELECT_READINGS_BY_PATIENT_INTERVAL, (patient_id, start_dt, end_dt))
+    return list(rows)
+
+
+def iter_readings_by_patient_interval(session, patient_id, start_dt, end_dt, fetch_size=DEFAULT_FETCH_SIZE):
+    """
+    version generador de Q2 (tabla data_by_patient)
+    """
+    if isinstance(start_dt, str):
+        start_dt = datetime.strptime(start_dt, '%Y-%m-%d %H:%M:%S')
+    if isinstance(end_dt, str):
+        end_dt = datetime.strptime(end_dt, '%Y-%m-%d %H:%M:%S')
+    return iter_rows(session, SELECT_READINGS_BY_PATIENT_INTERVAL, (patient_id, start_dt, end_dt), fetch_size)
 
 
 def get_glucose_by_patient(session, patient_id, limit=None):
     """
     devuelve lecturas de glucosa para un paciente
     """
-    stmt = session.prepare(SELECT_GLUCOSE_BY_PATIENT)
-    rows = session.execute(stmt, (patient_id,))
-    results = list(rows)
-    return results if limit is None else results[:limit]
+    if limit is not None:
+        return list(execute_prepared(session, with_limit(SELECT_GLUCOSE_BY_PATIENT), (patient_id, limit)))
+    rows = execute_prepared(session, SELECT_GLUCOSE_BY_PATIENT, (patient_id,))
+    return list(rows)
 
 
-def get_last_read_by_n_patients(session, patient_ids):
+def iter_glucose_by_patient(session, patient_id, fetch_size=DEFAULT_FETCH_SIZE):
     """
-    devuelve ltima lectura (LIMIT 1) para un conjunto de pacientes
+    version generador de Q3
     """
-    stmt = session.prepare(SELECT_LAST_READ_BY_N_PATIENTS)
-    rows = session.execute(stmt, (tuple(patient_ids),))
-    return list(rows)
+    return iter_rows(session, SELECT_GLUCOSE_BY_PATIENT, (patient_id,), fetch_size)
+
+
+def get_last_read_by_n_patients(session, patient_ids, concurrency=LAST_READ_CONCURRENCY, from_latest=False):
+    """
+    devuelve la ultima lectura (LIMIT 1) para un conjunto de pacientes como
+    {patient_id: fila o None}. Se lanza una consulta por particion con a lo sumo
+    `concurrency` en vuelo; al ser statements preparados llevan routing key y el
+    TokenAwarePolicy las manda directo a una replica.
+    Con from_latest=True se lee la tabla latest_by_patient (una fila por paciente).
+    """
+    patient_ids = list(dict.fromkeys(patient_ids))
+    query = SELECT_LATEST_BY_PATIENT if from_latest else SELECT_LAST_READ_BY_N_PATIENTS
+    stmt = prepare_statement(session, query)
+    count_executions(len(patient_ids))
+    results = execute_concurrent_with_args(
+        session, stmt, [(pid,) for pid in patient_ids],
+        concurrency=concurrency, raise_on_first_error=False
+    )
+    latest = {}
+    for pid, (success, result) in zip(patient_ids, results):
+        if not success:
+            log.error(f"Error leyendo ultima lectura de patient_id={pid}: {result}")
+            latest[pid] = None
+        else:
+            latest[pid] = result.one()
+    return latest
 
 
-def get_last_read_by_patient(session, patient_id):
+def get_last_read_by_patient(session, patient_id, bucketed=False, lookback_days=BUCKET_LOOKBACK_DAYS):
     """
     devuelve la ultima lectura para un paciente
     """
-    stmt = session.prepare(SELECT_LAST_READ_BY_PATIENT)
-    rows = session.execute(stmt, (patient_id,))
+    if bucketed:
+        rows = _last_n_from_buckets(session, patient_id, 1, lookback_days)
+        return rows[0] if rows else None
+    rows = execute_prepared(session, SELECT_LAST_READ_BY_PATIENT, (patient_id,))
     results = list(rows)
     return results[0] if results else None
 
 
-def get_last_n_reads_by_patient(session, patient_id, n):
+def get_last_n_reads_by_patient(session, patient_id, n, bucketed=False, lookback_days=BUCKET_LOOKBACK_DAYS):
     """
     devuelve las ultimas n lecturas para un paciente
+    con bucketed=True recorre lookback_days dias de buckets y completa con data_by_patient
     """
-    stmt = session.prepare(SELECT_LAST_N_READS_BY_PATIENT)
-    rows = session.execute(stmt, (patient_id, n))
+    if bucketed:
+        return _last_n_from_buckets(session, patient_id, n, lookback_days)
+    rows = execute_prepared(session, SELECT_LAST_N_READS_BY_PATIENT, (patient_id, n))
     return list(rows)
 
 
@@ -340,20 +819,27 @@ def get_weareable_info_by_patient_id(session, patient_id):
     """
     devuelve la informacion de dispositivo wearable por patient_id
     """
-    stmt = session.prepare(SELECT_WEAREABLE_INFO_BY_PATIENT_ID)
-    rows = session.execute(stmt, (patient_id,))
+    rows = execute_prepared(session, SELECT_WEAREABLE_INFO_BY_PATIENT_ID, (patient_id,))
     return list(rows)
 
 
-def get_readings_count_by_patient(session, patient_id):
+def get_readings_count_by_patient(session, patient_id, from_rollups=False):
 
     """
     Cuenta el numero de lecturas  para un patient_id.
     Devuelve int (0 si no hay resultados o en caso de error)
+    Con from_rollups=True suma los buckets diarios en lugar de hacer COUNT(*);
+    si el paciente no tiene rollups se cuenta sobre los datos crudos
     """
     try:
-        stmt = session.prepare(SELECT_COUNT_READINGS_BY_PATIENT)
-        row = session.execute(stmt, (patient_id,)).one()
+        if from_rollups:
+            from Cassandra.rollups import get_readings_count
+            count = get_readings_count(session, patient_id)
+            if count is not None:
+                return count
+            log.warning(f"Sin rollups para patient_id={patient_id}, se cuenta desde data_by_patient")
+
+        row = execute_prepared(session, SELECT_COUNT_READINGS_BY_PATIENT, (patient_id,)).one()
         if row is None:
             return 0
     
@@ -363,39 +849,59 @@ def get_readings_count_by_patient(session, patient_id):
         return 0
 
 
-def get_out_of_range_by_patient(session, patient_id, hr_threshold=140, glucose_threshold=120, spo2_threshold=90):
+def is_out_of_range(row, hr_threshold=HEART_RATE_MAX, glucose_threshold=GLUCOSE_MAX, spo2_threshold=SPO2_MIN):
+    """
+    True si la lectura rompe alguno de los umbrales (valores nulos se ignoran)
+    """
+    hr, glucose, spo2 = row.heart_rate, row.glucose, row.spo2
+    return ((hr is not None and hr > hr_threshold)
+            or (glucose is not None and glucose > glucose_threshold)
+            or (spo2 is not None and spo2 < spo2_threshold))
+
+
+def get_out_of_range_by_patient(session, patient_id, hr_threshold=HEART_RATE_MAX, glucose_threshold=GLUCOSE_MAX, spo2_threshold=SPO2_MIN,
+                                start_dt=None, end_dt=None, bucketed=False):
     """
     Recupera lecturas fuera de rango para un paciente:
     heart_rate > hr_threshold OR glucose > glucose_threshold OR spo2 < spo2_threshold
+    Lee una sola vez el intervalo [start_dt, end_dt] (por defecto las ultimas
+    OUT_OF_RANGE_WINDOW) y evalua los tres umbrales en la misma pasada, sin ALLOW FILTERING.
     """
     try:
-        stmt_hr = session.prepare(SELECT_HEARTRATE_OUT)
-        stmt_gl = session.prepare(SELECT_GLUCOSE_OUT)
-        stmt_sp = session.prepare(SELECT_SPO2_OUT)
-
-        combined = {}
-        
-        for stmt, params in [
-            (stmt_hr, (patient_id, hr_threshold)),
-            (stmt_gl, (patient_id, glucose_threshold)),
-            (stmt_sp, (patient_id, spo2_threshold)),
-        ]:
-            rows = session.execute(stmt, params)
-            for r in rows:
-                key = str(getattr(r, 'timestmp', None))
-                combined[key] = r
-
-        return list(combined.values())
+        if isinstance(start_dt, str):
+            start_dt = datetime.strptime(start_dt, '%Y-%m-%d %H:%M:%S')
+        if isinstance(end_dt, str):
+            end_dt = datetime.strptime(end_dt, '%Y-%m-%d %H:%M:%S')
+        if end_dt is None:
+            end_dt = datetime.now(timezone.utc).replace(tzinfo=None)
+        if start_dt is None:
+            start_dt = end_dt - OUT_OF_RANGE_WINDOW
+
+        if bucketed:
+            rows = _interval_from_buckets(session, SELECT_VITALS_BY_PATIENT_DAY_INTERVAL,
+                                          SELECT_VITALS_BY_PATIENT_INTERVAL, patient_id, start_dt, end_dt)
+        else:
+            rows = execute_prepared(session, SELECT_VITALS_BY_PATIENT_INTERVAL, (patient_id, start_dt, end_dt))
+
+        return [r for r in rows if is_out_of_range(r, hr_threshold, glucose_threshold, spo2_threshold)]
     except Exception as e:
         log.exception(f"Error obteniendo lecturas fuera de rango para patient_id={patient_id}: {e}")
         return []
 
 
-def get_heart_rate_stats(session, patient_id):
+def get_heart_rate_stats(session, patient_id, from_rollups=False):
     #regresa numero de lecturas de "heart_rate", promedio, min y max
+    #con from_rollups=True se calcula desde los buckets diarios de rollups_by_patient
+    #(si el paciente no tiene rollups se calcula desde los datos crudos)
     try:
-        stmt = session.prepare(SELECT_HEART_RATE_BY_PATIENT)
-        rows = session.execute(stmt, (patient_id,))
+        if from_rollups:
+            from Cassandra.rollups import get_rollup_stats
+            stats = get_rollup_stats(session, patient_id, 'heart_rate')
+            if stats is not None:
+                return stats
+            log.warning(f"Sin rollups para patient_id={patient_id}, se calcula desde data_by_patient")
+
+        rows = execute_prepared(session, SELECT_HEART_RATE_BY_PATIENT, (patient_id,))
         hrs = [getattr(r, 'heart_rate', None) for r in rows]
         hrs = [h for h in hrs if h is not None]
         if not hrs:
@@ -408,4 +914,19 @@ def get_heart_rate_stats(session, patient_id):
         }
     except Exception as e:
         log.exception(f"Error calculando estadisticas de ritmo cardiaco para el paciente:={patient_id}: {e}")
-        return {'count': 0, 'avg': None, 'min': None, 'max': None}
\ No newline at end of file
+        return {'count': 0, 'avg': None, 'min': None, 'max': None}
+
+
+def get_alerts_by_patient(session, patient_id, start_dt=None, end_dt=None, limit=None):
+    """
+    devuelve las alertas generadas al ingerir (alerts_by_patient), mas recientes primero.
+    Por defecto las de las ultimas OUT_OF_RANGE_WINDOW.
+    """
+    if end_dt is None:
+        end_dt = datetime.now(timezone.utc).replace(tzinfo=None)
+    if start_dt is None:
+        start_dt = end_dt - OUT_OF_RANGE_WINDOW
+    if limit is not None:
+        return list(execute_prepared(session, with_limit(SELECT_ALERTS_BY_PATIENT_INTERVAL),
+                                     (patient_id, start_dt, end_dt, limit)))
+    return list(execute_prepared(session, SELECT_ALERTS_BY_PATIENT_INTERVAL, (patient_id, start_dt, end_dt)))
@@ -0,0 +1,222 @@
+#!/usr/bin/env python3
+from datetime import datetime, timedelta, timezone
+import logging
+import math
+import threading
+import time
+
+from cassandra.concurrent import execute_concurrent
+from cassandra.util import unix_time_from_uuid1
+
+from Cassandra import model_cass
+
+# set logger
+
+log = logging.getLogger()
+
+
+# resolution: (segundos por bucket, TTL en segundos; 0 = sin expiracion)
+RESOLUTIONS = {
+    'minute': (60, 7 * 24 * 3600),
+    'hour': (3600, 400 * 24 * 3600),
+    'day': (24 * 3600, 0),
+}
+
+# metricas agregadas; 'readings' solo cuenta lecturas (para Q9)
+METRICS = ('steps', 'heart_rate', 'spo2', 'glucose')
+READINGS = 'readings'
+
+
+def bucket_start(ts, resolution):
+    size = RESOLUTIONS[resolution][0]
+    return datetime.fromtimestamp(ts - ts % size, timezone.utc).replace(tzinfo=None)
+
+
+def _merge(agg, other):
+    # agg, other: [cnt, total, minimum, maximum, sumsq]
+    agg[0] += other[0]
+    agg[1] += other[1]
+    agg[2] = other[2] if agg[2] is None else (agg[2] if other[2] is None else min(agg[2], other[2]))
+    agg[3] = other[3] if agg[3] is None else (agg[3] if other[3] is None else max(agg[3], other[3]))
+    agg[4] += other[4]
+    return agg
+
+
+def aggregate(readings, resolutions=('minute', 'hour', 'day')):
+    """
+    count/sum/min/max/sumsq por (paciente, resolucion, metrica, bucket) de un
+    conjunto de lecturas; 'readings' solo lleva la cuenta
+    """
+    aggs = {}
+
+    def add(key, value):
+        agg = aggs.get(key)
+        if agg is None:
+            aggs[key] = [1, value, value, value, value * value]
+        else:
+            _merge(agg, [1, value, value, value, value * value])
+
+    for reading in readings:
+        ts = unix_time_from_uuid1(reading.timestmp)
+        for resolution in resolutions:
+            bucket = bucket_start(ts, resolution)
+            add((reading.patient_id, resolution, READINGS, bucket), 0)
+            for metric in METRICS:
+                value = getattr(reading, metric)
+                if value is not None:
+                    add((reading.patient_id, resolution, metric, bucket), value)
+    return aggs
+
+
+def rollup_params(aggs, write_ts):
+    """Parametros de INSERT_ROLLUP para cada agregado, todos con el mismo write timestamp"""
+    params = []
+    for (patient_id, resolution, metric, bucket), (cnt, total, minimum, maximum, sumsq) in aggs.items():
+        if metric == READINGS:
+            total = minimum = maximum = sumsq = None
+        params.append((patient_id, resolution, metric, bucket, cnt, total, minimum, maximum, sumsq,
+                       RESOLUTIONS[resolution][1], write_ts))
+    return params
+
+
+class RollupAccumulator:
+    """
+    Registra los dias (paciente, dia UTC) que recibieron lecturas y, en flush(),
+    recalcula sus rollups desde los datos crudos y los sobrescribe. No se suma
+    sobre lo que ya habia en la tabla, asi que reingestar el mismo CSV, una
+    ingesta concurrente o un backfill no duplican cuentas.
+    Cada escritura lleva USING TIMESTAMP = momento en que empezo la lectura cruda:
+    si dos procesos recalculan el mismo dia gana el que leyo despues, que vio mas datos.
+    touch_rows() se usa como callback de escrituras confirmadas, por eso es thread-safe.
+    """
+
+    def __init__(self, resolutions=('minute', 'hour', 'day'), max_keys=2000, concurrency=32):
+        self.resolutions = resolutions
+        self.max_keys = max_keys
+        self.concurrency = concurrency
+        self._days = set()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._days)
+
+    def touch(self, patient_id, timestmp):
+        with self._lock:
+            self._days.add((patient_id, model_cass.reading_day(timestmp)))
+
+    def touch_rows(self, rows):
+        # rows: [(patient_id, timestmp)] de un request que el servidor ya confirmo
+        days = {(patient_id, model_cass.reading_day(timestmp)) for patient_id, timestmp in rows}
+        with self._lock:
+            self._days |= days
+
+    def add(self, reading):
+        self.touch(reading.patient_id, reading.timestmp)
+
+    def flush(self, session, day_table=False):
+        """
+        Recalcula los rollups de los dias registrados leyendo data_by_patient
+        (o data_by_patient_day con day_table=True). Lee cada dia una vez y se
+        escriben todas las resoluciones de ese dia.
+        """
+        with self._lock:
+            days, self._days = sorted(self._days), set()
+        if not days:
+            return 0
+        if day_table:
+            source = model_cass.prepare_statement(session, model_cass.SELECT_ROLLUP_SOURCE_DAY)
+            day_params = [(patient_id, day) for patient_id, day in days]
+        else:
+            source = model_cass.prepare_statement(session, model_cass.SELECT_ROLLUP_SOURCE)
+            day_params = [(patient_id, _day_start(day), _day_start(day + timedelta(days=1)))
+                          for patient_id, day in days]
+        insert_stmt = model_cass.prepare_statement(session, model_cass.INSERT_ROLLUP)
+
+        from Cassandra.ingest import Reading
+
+        written = 0
+        for i in range(0, len(day_params), self.concurrency):
+            chunk = day_params[i:i + self.concurrency]
+            write_ts = int(time.time() * 1000000)
+            results = execute_concurrent(session, [(source, p) for p in chunk],
+                                         concurrency=self.concurrency, raise_on_first_error=True)
+            readings = [Reading(*row) for _success, rows in results for row in rows]
+            params = rollup_params(aggregate(readings, self.resolutions), write_ts)
+            execute_concurrent(session, [(insert_stmt, p) for p in params],
+                               concurrency=self.concurrency, raise_on_first_error=True)
+            model_cass.count_executions(len(chunk) + len(params))
+            written += len(params)
+        return written
+
+
+def _day_start(day):
+    return datetime(day.year, day.month, day.day)
+
+
+def get_rollup_stats(session, patient_id, metric, resolution='day', start_dt=None, end_dt=None):
+    """
+    Combina los buckets de una metrica: count, avg, min, max y stddev.
+    El costo depende del numero de buckets, no del numero de lecturas.
+    Devuelve None si no hay ningun bucket (rollups sin poblar para ese paciente),
+    para que quien llama pueda usar la consulta sobre los datos crudos.
+    """
+    if start_dt is None and end_dt is None:
+        rows = model_cass.execute_prepared(session, model_cass.SELECT_ROLLUPS_BY_METRIC,
+                                           (patient_id, resolution, metric))
+    else:
+        start_dt = start_dt or datetime(1970, 1, 1)
+        end_dt = end_dt or datetime.now(timezone.utc).replace(tzinfo=None)
+        rows = model_cass.execute_prepared(session, model_cass.SELECT_ROLLUPS_BY_METRIC_INTERVAL,
+                                           (patient_id, resolution, metric, start_dt, end_dt))
+
+    agg = [0, 0, None, None, 0]
+    buckets = 0
+    for r in rows:
+        buckets += 1
+        _merge(agg, [r.cnt or 0, r.total or 0, r.minimum, r.maximum, r.sumsq or 0])
+    if buckets == 0:
+        return None
+    count, total, minimum, maximum, sumsq = agg
+    if count == 0:
+        return {'count': 0, 'avg': None, 'min': None, 'max': None, 'stddev': None}
+    avg = total / count
+    return {
+        'count': count,
+        'avg': avg,
+        'min': minimum,
+        'max': maximum,
+        'stddev': math.sqrt(max(sumsq / count - avg * avg, 0.0)),
+    }
+
+
+def get_readings_count(session, patient_id, resolution='day'):
+    stats = get_rollup_stats(session, patient_id, READINGS, resolution)
+    return stats['count'] if stats is not None else None
+
+
+def backfill_rollups(session, fetch_size=1000, resolutions=('minute', 'hour', 'day')):
+    """
+    Recalcula los rollups desde data_by_patient. El recorrido completo devuelve
+    las lecturas agrupadas por particion: al empezar cada paciente se borran sus
+    rollups y se registran sus dias; cada max_keys dias el acumulador los
+    recalcula. Las escrituras llevan un timestamp posterior al borrado, y como se
+    sobrescribe desde los datos crudos se puede repetir o correr junto a una ingesta.
+    """
+    stmt = model_cass.prepare_statement(session, model_cass.SELECT_ALL_DATA_BY_PATIENT)
+    stmt.fetch_size = fetch_size
+    accumulator = RollupAccumulator(resolutions=resolutions)
+    current = None
+    patients = 0
+    model_cass.count_executions()
+    for row in session.execute(stmt):
+        if row.patient_id != current:
+            current = row.patient_id
+            patients += 1
+            for resolution in resolutions:
+                model_cass.execute_prepared(session, model_cass.DELETE_ROLLUPS_BY_PATIENT, (current, resolution))
+        accumulator.touch(row.patient_id, row.timestmp)
+        if len(accumulator) >= accumulator.max_keys:
+            accumulator.flush(session)
+    accumulator.flush(session)
+    log.info(f"Rollups backfilled for {patients} patients")
+    return patients
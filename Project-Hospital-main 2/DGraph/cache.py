@@ -0,0 +1,231 @@
+# DGraph/cache.py
+# Cache de resultados de las consultas del catálogo (model_graph.QUERY_CATALOG).
+# La clave es (consulta, variables). Cada entrada guarda el read timestamp de la
+# transacción que la leyó y los predicados que la consulta recorre; una mutación
+# que toca alguno de esos predicados invalida la entrada, salvo que la lectura ya
+# haya visto esa escritura (read ts >= commit ts).
+
+from collections import OrderedDict
+import copy
+import json
+import logging
+import os
+import re
+import threading
+import time
+
+from common import HitStats
+from connect import create_client
+from DGraph.graph import SCHEMA
+from DGraph.model_graph import QUERY_CATALOG, prepare_query
+
+logger = logging.getLogger(__name__)
+
+# Configuración por variables de entorno
+DGRAPH_CACHE_SIZE = int(os.getenv('DGRAPH_CACHE_SIZE', '1024'))
+# red de seguridad para mutaciones hechas por otros procesos, que no avisan aquí
+DGRAPH_CACHE_TTL = float(os.getenv('DGRAPH_CACHE_TTL', '300'))
+# best-effort (opcional): el Alpha responde con su último timestamp sin pedir uno a
+# Zero; la lectura puede ir atrasada. Un resultado anterior a una mutación conocida
+# nunca se guarda (ver _set), pero solo se ven las mutaciones de este proceso
+DGRAPH_BEST_EFFORT = os.getenv('DGRAPH_BEST_EFFORT', '0') == '1'
+
+# predicados declarados en el schema (líneas "nombre: tipo ...")
+PREDICATES = frozenset(re.findall(r'^([\w.]+):', SCHEMA, re.MULTILINE))
+
+
+def query_predicates(query):
+    """Predicados que recorre una consulta DQL (incluye ~reversos y type() -> dgraph.type)"""
+    found = {p for p in PREDICATES if re.search(rf'(?<![\w.]){re.escape(p)}\b', query)}
+    if 'type(' in query:
+        found.add('dgraph.type')
+    return frozenset(found)
+
+
+def mutation_predicates(set_obj=None, nquads=None):
+    """Predicados que escribe una mutación (objetos JSON y/o N-Quads)"""
+    found = set()
+    objs = set_obj if isinstance(set_obj, list) else [set_obj] if set_obj else []
+    while objs:
+        obj = objs.pop()
+        for key, value in obj.items():
+            if key == 'uid':
+                continue
+            found.add(key.split('|')[0])
+            for child in value if isinstance(value, list) else [value]:
+                if isinstance(child, dict):
+                    objs.append(child)
+    # N-Quads: sujeto (<uid>, _:blank o uid(var)) seguido de <predicado>
+    found.update(re.findall(r'^\s*(?:<[^>]*>|_:\S+|uid\(\w+\))\s+<([^>]+)>', nquads or '', re.MULTILINE))
+    return frozenset(found)
+
+
+class GraphCacheStats(HitStats):
+    """
+    Contadores del cache: aciertos, fallos, desalojos, expiraciones, invalidaciones
+    y resultados descartados porque una mutación llegó durante la lectura
+    """
+
+    COUNTERS = HitStats.COUNTERS + ('evictions', 'expirations', 'invalidations', 'discarded')
+
+
+class GraphCache:
+    """
+    Cache LRU de resultados de Dgraph con TTL, versionado por read timestamp.
+    `_commits` guarda por predicado el mayor commit ts conocido: nunca se guarda una
+    lectura con read ts menor. `_versions` cuenta invalidaciones por predicado y
+    `_unknown` la versión de la última sin commit ts; una lectura que empezó antes
+    de una de esas no se guarda. `_epoch` aumenta con clear(): una lectura que
+    empezó antes no se guarda, toque los predicados que toque.
+    """
+
+    def __init__(self, client=None, max_entries=DGRAPH_CACHE_SIZE, ttl=DGRAPH_CACHE_TTL,
+                 best_effort=DGRAPH_BEST_EFFORT):
+        self.client = client
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.best_effort = best_effort
+        self.stats = GraphCacheStats()
+        self._entries = OrderedDict()  # key -> (expira, read_ts, valor, predicados)
+        self._by_predicate = {}        # predicado -> set(keys)
+        self._versions = {}            # predicado -> número de invalidaciones
+        self._commits = {}             # predicado -> mayor commit ts conocido
+        self._unknown = {}             # predicado -> versión de la última mutación sin commit ts
+        self._predicates = {}          # nombre de consulta -> predicados
+        self._epoch = 0
+        self._lock = threading.Lock()
+
+    def _txn(self):
+        client = self.client or create_client()
+        if self.best_effort:
+            return client.txn(read_only=True, best_effort=True)
+        return client.txn(read_only=True)
+
+    def predicates(self, name):
+        if name not in self._predicates:
+            self._predicates[name] = query_predicates(QUERY_CATALOG[name][0])
+        return self._predicates[name]
+
+    def query(self, name, **values):
+        """Igual que model_graph.run_query, pero sirve desde el cache cuando puede"""
+        query, variables = prepare_query(name, values)
+        key = (name, tuple(sorted(variables.items())))
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                if entry[0] >= time.monotonic():
+                    self._entries.move_to_end(key)
+                    self.stats.hits += 1
+                    return copy.deepcopy(entry[2])
+                self._remove(key)
+                self.stats.expirations += 1
+            self.stats.misses += 1
+            predicates = self.predicates(name)
+            versions = {p: self._versions.get(p, 0) for p in predicates}
+            epoch = self._epoch
+
+        res = self._txn().query(query, variables=variables)
+        value = json.loads(res.json)
+        self._set(key, value, res.txn.start_ts, predicates, versions, epoch)
+        return copy.deepcopy(value)
+
+    def _set(self, key, value, read_ts, predicates, versions, epoch):
+        with self._lock:
+            if epoch != self._epoch:
+                # hubo un clear() (carga masiva) durante la lectura
+                self.stats.discarded += 1
+                return
+            for p in predicates:
+                if self._unknown.get(p, 0) > versions[p] or read_ts < self._commits.get(p, 0):
+                    # hubo una mutación sin commit ts durante la lectura, o la lectura
+                    # no vio una mutación ya confirmada (p. ej. best-effort atrasada)
+                    self.stats.discarded += 1
+                    return
+            self._remove(key)
+            self._entries[key] = (time.monotonic() + self.ttl, read_ts, value, predicates)
+            for p in predicates:
+                self._by_predicate.setdefault(p, set()).add(key)
+            while len(self._entries) > self.max_entries:
+                self._remove(next(iter(self._entries)))
+                self.stats.evictions += 1
+
+    def _remove(self, key):
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            for p in entry[3]:
+                keys = self._by_predicate.get(p)
+                if keys is not None:
+                    keys.discard(key)
+
+    def invalidate(self, predicates, commit_ts=None):
+        """
+        Una mutación escribió `predicates` con `commit_ts` (None si no se conoce).
+        Se descartan las entradas que los recorren y cuya lectura es anterior al commit.
+        """
+        with self._lock:
+            keys = set()
+            for p in predicates:
+                self._versions[p] = self._versions.get(p, 0) + 1
+                if commit_ts is None:
+                    self._unknown[p] = self._versions[p]
+                else:
+                    self._commits[p] = max(self._commits.get(p, 0), commit_ts)
+                keys |= self._by_predicate.get(p, set())
+            for key in keys:
+                if commit_ts is None or self._entries[key][1] < commit_ts:
+                    self._remove(key)
+                    self.stats.invalidations += 1
+
+    def invalidate_mutation(self, response=None, set_obj=None, nquads=None):
+        """Hook para después de una mutación con commit_now (el Response trae el commit ts)"""
+        commit_ts = response.txn.commit_ts if response is not None and response.txn.commit_ts else None
+        self.invalidate(mutation_predicates(set_obj, nquads), commit_ts)
+
+    def clear(self):
+        """Vacía todo (p. ej. después de una carga masiva o un cambio de schema)"""
+        with self._lock:
+            self._epoch += 1
+            self.stats.invalidations += len(self._entries)
+            self._entries.clear()
+            self._by_predicate.clear()
+
+    def __len__(self):
+        return len(self._entries)
+
+
+_default = None
+_default_lock = threading.Lock()
+
+
+def default_cache():
+    """Cache compartido del proceso (el que usa model_graph.run_query con DGRAPH_CACHE=1)"""
+    global _default
+    with _default_lock:
+        if _default is None:
+            _default = GraphCache()
+        return _default
+
+
+def invalidate_mutation(response=None, set_obj=None, nquads=None):
+    """Avisa al cache del proceso, si ya se creó, de una mutación"""
+    if _default is not None:
+        _default.invalidate_mutation(response, set_obj, nquads)
+
+
+def invalidate_all():
+    if _default is not None:
+        _default.clear()
+
+
+if __name__ == "__main__":
+    # python -m DGraph.cache recomendacion_especialista specialty=Cardiology limit=5
+    import sys
+
+    cache = GraphCache()
+    name, values = sys.argv[1], dict(arg.split('=', 1) for arg in sys.argv[2:])
+    for _ in range(3):
+        start = time.perf_counter()
+        cache.query(name, **values)
+        print(f"{(time.perf_counter() - start) * 1000:.2f} ms")
+    print(sorted(cache.predicates(name)))
+    print(cache.stats)
@@ -23,6 +23,7 @@ type Medicine {
   medicine_id
   name
   dose_mg
+  interaction_group
   interacts_with
 }
 
@@ -67,6 +68,7 @@ name: string @index(term, fulltext) .
 specialty: string @index(term) .
 rating: float @index(float) .
 dose_mg: float .
+interaction_group: string @index(exact) .
 description: string @index(fulltext) .
 route: string .
 frequency: string .
@@ -76,13 +78,13 @@ relationship: string .
 
 # Relaciones (uid)
 has_primary_doctor: uid @reverse .
-care_team: uid @reverse .
-treated_with: uid @reverse .
+care_team: [uid] @reverse .
+treated_with: [uid] @reverse .
 uses_medicine: uid @reverse .
 for_diagnosis: uid @reverse .
 works_at: uid @reverse .
 emergency_contact: uid @reverse .
-interacts_with: uid @reverse @count .
+interacts_with: [uid] @reverse @count .
 """
 
 from connect import create_client
@@ -0,0 +1,262 @@
+# DGraph/interactions.py
+# Verificación de interacciones medicamento-medicamento. El grafo interacts_with se
+# carga una vez a memoria como adyacencia compacta (cada medicina es un entero y sus
+# vecinos conjuntos de enteros); revisar una lista de medicamentos no consulta Dgraph.
+
+from itertools import combinations
+import json
+import logging
+import threading
+
+from connect import create_client
+from DGraph import cache, model_graph
+
+logger = logging.getLogger(__name__)
+
+PAGE_SIZE = 1000
+
+# Todas las medicinas con sus vecinos, paginadas por uid
+ALL_INTERACTIONS = """
+query all_interactions($first: int, $after: string) {
+  medicines(func: type(Medicine), first: $first, after: $after) {
+    uid
+    medicine_id
+    name
+    edges: count(interacts_with)
+    interacts_with {
+      medicine_id
+    }
+  }
+}
+"""
+
+# Solo los contadores de aristas (índice @count), para detectar qué cambió
+INTERACTION_COUNTS = """
+query interaction_counts($first: int, $after: string) {
+  medicines(func: type(Medicine), first: $first, after: $after) {
+    uid
+    medicine_id
+    edges: count(interacts_with)
+  }
+}
+"""
+
+# Vecinos de un grupo de medicinas
+INTERACTIONS_OF = """
+query interactions_of($ids: string) {
+  medicines(func: eq(medicine_id, $ids)) {
+    medicine_id
+    name
+    edges: count(interacts_with)
+    interacts_with {
+      medicine_id
+    }
+  }
+}
+"""
+
+
+def _pages(txn, query):
+    after = "0x0"
+    while True:
+        res = txn.query(query, variables={"$first": str(PAGE_SIZE), "$after": after})
+        page = json.loads(res.json).get("medicines", [])
+        yield from page
+        if len(page) < PAGE_SIZE:
+            return
+        after = page[-1]["uid"]
+
+
+class InteractionIndex:
+    """
+    Adyacencia en memoria de interacts_with. Se trata como no dirigida: A y B
+    interactúan si existe A -> B o B -> A en el grafo.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._ids = {}        # medicine_id -> entero
+        self._names = []      # entero -> (medicine_id, name)
+        self._out = {}        # entero -> set(enteros), aristas salientes del grafo
+        self._in = {}         # entero -> set(enteros), aristas entrantes
+        self._edges = {}      # entero -> count(interacts_with) visto en la última carga
+
+    def _index(self, medicine_id, name=None):
+        i = self._ids.get(medicine_id)
+        if i is None:
+            i = self._ids[medicine_id] = len(self._names)
+            self._names.append((medicine_id, name))
+        elif name is not None:
+            self._names[i] = (medicine_id, name)
+        return i
+
+    def _set_out(self, node):
+        """Reemplaza las aristas salientes de una medicina manteniendo las entrantes de sus vecinos"""
+        i = self._index(node["medicine_id"], node.get("name"))
+        new = {self._index(n["medicine_id"]) for n in node.get("interacts_with", [])}
+        old = self._out.get(i, set())
+        for j in old - new:
+            self._in[j].discard(i)
+        for j in new - old:
+            self._in.setdefault(j, set()).add(i)
+        self._out[i] = new
+        self._edges[i] = node.get("edges", len(new))
+
+    def load(self, client=None):
+        """
+        Carga completa de la adyacencia (una consulta por página de medicinas).
+        Se construye aparte y se reemplaza de una vez: una verificación que corre
+        durante la recarga ve el índice anterior completo, nunca uno a medias.
+        """
+        txn = (client or create_client()).txn(read_only=True)
+        fresh = InteractionIndex()
+        for node in _pages(txn, ALL_INTERACTIONS):
+            fresh._set_out(node)
+        with self._lock:
+            self._ids, self._names, self._out, self._in, self._edges = (
+                fresh._ids, fresh._names, fresh._out, fresh._in, fresh._edges)
+        logger.info(f"✅ Interacciones cargadas: {len(fresh._names)} medicinas")
+        return self
+
+    def refresh(self, medicine_ids, client=None):
+        """Recarga solo las aristas de `medicine_ids` (p. ej. después de modificarlas)"""
+        ids = sorted(set(medicine_ids))
+        if not ids:
+            return 0
+        txn = (client or create_client()).txn(read_only=True)
+        res = txn.query(INTERACTIONS_OF, variables={"$ids": json.dumps(ids)})
+        nodes = json.loads(res.json).get("medicines", [])
+        with self._lock:
+            for node in nodes:
+                self._set_out(node)
+        return len(nodes)
+
+    def refresh_changed(self, client=None):
+        """
+        Compara count(interacts_with) de cada medicina con lo cargado y recarga
+        solo las que cambiaron o son nuevas. Un cambio que deja el mismo número
+        de aristas no se detecta: para eso están refresh() o load().
+        """
+        with self._lock:
+            known = {medicine_id: self._edges.get(i) for medicine_id, i in self._ids.items()}
+        txn = (client or create_client()).txn(read_only=True)
+        changed = []
+        for node in _pages(txn, INTERACTION_COUNTS):
+            if known.get(node["medicine_id"]) != node.get("edges", 0):
+                changed.append(node["medicine_id"])
+        return self.refresh(changed, client)
+
+    def _linked(self, i, j):
+        return j in self._out.get(i, ()) or j in self._in.get(i, ())
+
+    def interacts(self, a, b):
+        with self._lock:
+            i, j = self._ids.get(a), self._ids.get(b)
+            return i is not None and j is not None and self._linked(i, j)
+
+    def check(self, medicine_ids):
+        """
+        Todas las interacciones entre los medicamentos de la lista, sin consultar Dgraph.
+        Retorna [(medicine_id, medicine_id)] ordenado; los ids desconocidos se ignoran.
+        """
+        with self._lock:
+            known = sorted({self._ids[m] for m in medicine_ids if m in self._ids})
+            return sorted(tuple(sorted((self._names[i][0], self._names[j][0])))
+                          for i, j in combinations(known, 2) if self._linked(i, j))
+
+    def name(self, medicine_id):
+        with self._lock:
+            i = self._ids.get(medicine_id)
+            return self._names[i][1] if i is not None else None
+
+
+_index = None
+_index_lock = threading.Lock()
+
+
+def get_index():
+    """Índice compartido del proceso; se carga en el primer uso"""
+    global _index
+    with _index_lock:
+        if _index is None:
+            _index = InteractionIndex().load()
+        return _index
+
+
+def _set_interaction(a, b, client, delete=False):
+    # upsert: los uids se resuelven en el servidor a partir de medicine_id
+    query = (f"{{ a as var(func: eq(medicine_id, {json.dumps(a)})) "
+             f"b as var(func: eq(medicine_id, {json.dumps(b)})) }}")
+    nquads = "uid(a) <interacts_with> uid(b) ."
+    txn = client.txn()
+    try:
+        mutation = txn.create_mutation(del_nquads=nquads) if delete else txn.create_mutation(set_nquads=nquads)
+        response = txn.do_request(txn.create_request(query=query, mutations=[mutation], commit_now=True))
+    finally:
+        txn.discard()
+    cache.invalidate_mutation(response, nquads=nquads)
+    # solo cambian las aristas salientes de `a`; recargarla deja el índice al día
+    get_index().refresh([a], client)
+
+
+def add_interaction(a, b, client=None):
+    """Registra que `a` interactúa con `b` en Dgraph y en el índice"""
+    _set_interaction(a, b, client or create_client())
+
+
+def remove_interaction(a, b, client=None):
+    """Borra la arista a -> b (si también existe b -> a, siguen interactuando)"""
+    _set_interaction(a, b, client or create_client(), delete=True)
+
+
+#  MEDICAMENTOS DE UN PACIENTE
+
+def patient_medicines(historial):
+    """medicine_ids de un resultado de historial_medicamentos (treated_with -> uses_medicine)"""
+    ids = []
+    for treatment in historial.get("treated_with", []):
+        medicines = treatment.get("uses_medicine", [])
+        for medicine in medicines if isinstance(medicines, list) else [medicines]:
+            if medicine.get("medicine_id"):
+                ids.append(medicine["medicine_id"])
+    return ids
+
+
+def check_patient(patient_id, extra=(), txn=None):
+    """
+    Interacciones entre todos los medicamentos del paciente, más `extra`
+    (p. ej. el que se le quiere recetar). Una consulta para la lista de
+    medicamentos; la verificación es en memoria.
+    """
+    data = model_graph.get_historial_medicamentos(patient_id, txn)
+    patients = data.get("patient", [])
+    medicines = patient_medicines(patients[0]) if patients else []
+    return get_index().check(medicines + list(extra))
+
+
+def check_patients(patient_ids, txn=None):
+    """{patient_id: interacciones} para varios pacientes, con consultas por lote"""
+    index = get_index()
+    return {p["patient_id"]: index.check(patient_medicines(p))
+            for p in model_graph.iter_batch('historial_medicamentos', patient_ids, txn=txn)}
+
+
+def query_interacciones_paciente():
+    patient_id = input("patient_id: ")
+    nuevo = input("medicine_id a recetar (Enter = ninguno): ").strip()
+    index = get_index()
+    pairs = check_patient(patient_id, [nuevo] if nuevo else ())
+    print("\n=== Interacciones en la medicación del paciente ===")
+    if not pairs:
+        print("[OK] Sin interacciones")
+    for a, b in pairs:
+        print(f"- {a} ({index.name(a)}) <-> {b} ({index.name(b)})")
+
+
+if __name__ == "__main__":
+    # python -m DGraph.interactions P001 P002 ...
+    import sys
+
+    logging.basicConfig(level=logging.INFO)
+    for patient_id, pairs in check_patients(sys.argv[1:]).items():
+        print(patient_id, pairs)
@@ -0,0 +1,251 @@
+# DGraph/loader.py
+# Carga masiva del grafo en una sola pasada por los CSV. Los tipos se cargan en
+# orden de dependencia (doctores y medicinas, luego pacientes, luego tratamientos)
+# y cada lote crea sus nodos con blank nodes y, en la misma mutación, sus aristas
+# hacia nodos de tipos ya cargados usando los uids que devolvió Dgraph. No hay
+# ninguna consulta por arista.
+
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+import csv
+import logging
+import os
+import time
+
+import pydgraph
+
+from common import TimedStats, iter_chunks
+from connect import create_client
+from DGraph.cache import invalidate_all
+
+logger = logging.getLogger(__name__)
+
+DATA_DIR = "./data/Graph"
+DGRAPH_BATCH_SIZE = int(os.getenv('DGRAPH_BATCH_SIZE', '1000'))
+DGRAPH_LOAD_CONCURRENCY = int(os.getenv('DGRAPH_LOAD_CONCURRENCY', '4'))
+MAX_RETRIES = 5
+
+
+class GraphLoadStats(TimedStats):
+    """
+    Contadores de la carga: nodos, aristas, mutaciones, reintentos y referencias faltantes
+    """
+
+    COUNTERS = ('nodes', 'edges', 'mutations', 'retries', 'missing')
+    RATE = 'nodes'
+
+    @property
+    def nodes_per_sec(self):
+        return self.per_sec('nodes')
+
+
+def read_csv(name):
+    with open(f"{DATA_DIR}/{name}", newline="", encoding="utf-8") as f:
+        yield from csv.DictReader(f)
+
+
+#  CONSTRUCCION DE MUTACIONES
+#  Cada builder recibe un lote de filas y los uids conocidos; retorna
+#  (objetos set_obj, [(tipo, id externo)] de los nodos creados, aristas, faltantes)
+
+def _ref(uids, kind, key):
+    uid = uids.get((kind, key)) if key else None
+    return {"uid": uid} if uid else None
+
+
+def build_doctors(rows, uids):
+    objs = [{
+        "uid": f"_:{row['doctor_id']}",
+        "dgraph.type": "Doctor",
+        "doctor_id": row["doctor_id"],
+        "name": row["name"],
+        "specialty": row["specialty"],
+        "rating": float(row["rating"]),
+    } for row in rows]
+    return objs, [("Doctor", row["doctor_id"]) for row in rows], 0, 0
+
+
+def build_medicines(rows, uids):
+    objs = []
+    for row in rows:
+        medicine = {
+            "uid": f"_:{row['medicine_id']}",
+            "dgraph.type": "Medicine",
+            "medicine_id": row["medicine_id"],
+            "name": row["name"],
+            "dose_mg": float(row["dose_mg"]),
+        }
+        if row.get("interaction_group"):
+            medicine["interaction_group"] = row["interaction_group"]
+        objs.append(medicine)
+    return objs, [("Medicine", row["medicine_id"]) for row in rows], 0, 0
+
+
+def build_patients(rows, uids):
+    objs, edges, missing = [], 0, 0
+    for row in rows:
+        patient = {
+            "uid": f"_:{row['patient_id']}",
+            "dgraph.type": "Patient",
+            "patient_id": row["patient_id"],
+            "name": row["name"],
+        }
+        if row.get("primary_doctor_id"):
+            doctor = _ref(uids, "Doctor", row["primary_doctor_id"])
+            if doctor:
+                patient["has_primary_doctor"] = doctor
+                edges += 1
+            else:
+                missing += 1
+        objs.append(patient)
+    return objs, [("Patient", row["patient_id"]) for row in rows], edges, missing
+
+
+def build_treatments(rows, uids):
+    objs, edges, missing = [], 0, 0
+    for row in rows:
+        blank = f"_:{row['treatment_id']}"
+        treatment = {
+            "uid": blank,
+            "dgraph.type": "Treatment",
+            "treatment_id": row["treatment_id"],
+            "route": row["route"],
+            "frequency": row["frequency"],
+            # Usar diagnosis como description si no hay description
+            "description": row.get("description") or row.get("diagnosis", "Tratamiento"),
+        }
+        if row.get("medicine_id"):
+            medicine = _ref(uids, "Medicine", row["medicine_id"])
+            if medicine:
+                treatment["uses_medicine"] = medicine
+                edges += 1
+            else:
+                missing += 1
+        objs.append(treatment)
+
+        patient = _ref(uids, "Patient", row["patient_id"])
+        if not patient:
+            missing += 1
+            continue
+        # paciente -> tratamiento y médico tratante al care_team, en la misma mutación
+        patient["treated_with"] = [{"uid": blank}]
+        edges += 1
+        if row.get("doctor_id"):
+            doctor = _ref(uids, "Doctor", row["doctor_id"])
+            if doctor:
+                patient["care_team"] = [doctor]
+                edges += 1
+            else:
+                missing += 1
+        objs.append(patient)
+    # los tratamientos no se referencian después: no se guardan sus uids
+    return objs, [], edges, missing
+
+
+def interaction_edges(rows, uids):
+    """
+    Medicinas del mismo interaction_group interactúan entre sí: un objeto por
+    medicina con interacts_with hacia las demás de su grupo (en ambos sentidos)
+    """
+    groups = {}
+    for row in rows:
+        uid = uids.get(("Medicine", row["medicine_id"]))
+        if row.get("interaction_group") and uid:
+            groups.setdefault(row["interaction_group"], []).append(uid)
+    for members in groups.values():
+        for uid in members:
+            others = [{"uid": other} for other in members if other != uid]
+            if others:
+                yield {"uid": uid, "interacts_with": others}
+
+
+# (archivo, builder); el orden respeta las dependencias entre tipos
+STAGES = [
+    ("doctors.csv", build_doctors),
+    ("medicines.csv", build_medicines),
+    ("patients.csv", build_patients),
+    ("treatments.csv", build_treatments),
+]
+
+
+#  EJECUCION
+
+def _mutate(client, objs, stats):
+    """Una mutación con commit_now; reintenta con backoff si Dgraph aborta por conflicto"""
+    delay = 0.05
+    for attempt in range(MAX_RETRIES + 1):
+        txn = client.txn()
+        try:
+            response = txn.mutate(set_obj=objs, commit_now=True)
+            stats.add(mutations=1)
+            return response.uids
+        except pydgraph.AbortedError:
+            if attempt == MAX_RETRIES:
+                raise
+            stats.add(retries=1)
+            time.sleep(delay)
+            delay = min(delay * 2, 2.0)
+        finally:
+            txn.discard()
+
+
+def _load_chunk(client, builder, rows, uids, stats):
+    objs, created, edges, missing = builder(rows, uids)
+    assigned = _mutate(client, objs, stats)
+    stats.add(nodes=len(rows), edges=edges, missing=missing)
+    return {key: assigned[key[1]] for key in created}
+
+
+def load_stage(client, file_name, builder, uids, stats, batch_size=DGRAPH_BATCH_SIZE,
+               concurrency=DGRAPH_LOAD_CONCURRENCY):
+    """
+    Carga un CSV por lotes con hasta `concurrency` mutaciones en vuelo; los
+    uids nuevos se agregan a `uids` al terminar cada lote. Se lee el CSV solo
+    a medida que se liberan lugares, así la memoria queda acotada.
+    """
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        pending = set()
+        for rows in iter_chunks(read_csv(file_name), batch_size):
+            if len(pending) >= concurrency:
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    uids.update(future.result())
+            pending.add(pool.submit(_load_chunk, client, builder, rows, uids, stats))
+        for future in pending:
+            uids.update(future.result())
+
+
+def load_graph(client=None, batch_size=DGRAPH_BATCH_SIZE, concurrency=DGRAPH_LOAD_CONCURRENCY):
+    """
+    Carga todos los CSV del grafo. Retorna GraphLoadStats.
+    `uids` mapea (tipo, id externo) -> uid solo para los tipos que se referencian después.
+    """
+    client = client or create_client()
+    stats = GraphLoadStats()
+    uids = {}
+    for file_name, builder in STAGES:
+        load_stage(client, file_name, builder, uids, stats, batch_size, concurrency)
+        logger.info(f"✅ {file_name}: {stats}")
+    load_interactions(client, uids, stats, batch_size)
+    # la carga reescribe casi todos los predicados: se vacía el cache de resultados
+    invalidate_all()
+    stats.finish()
+    return stats
+
+
+def load_interactions(client, uids, stats, batch_size=DGRAPH_BATCH_SIZE):
+    """Aristas interacts_with a partir de interaction_group de medicines.csv"""
+    for objs in iter_chunks(interaction_edges(read_csv("medicines.csv"), uids), batch_size):
+        _mutate(client, objs, stats)
+        stats.add(edges=sum(len(o["interacts_with"]) for o in objs))
+    logger.info(f"✅ interacciones: {stats}")
+
+
+if __name__ == "__main__":
+    # python -m DGraph.loader
+    import sys
+
+    from DGraph.graph import set_schema
+
+    logging.basicConfig(level=logging.INFO)
+    set_schema()
+    print(load_graph(batch_size=int(sys.argv[1]) if len(sys.argv) > 1 else DGRAPH_BATCH_SIZE))
@@ -1,304 +1,431 @@
 # DGraph/main.py
 from connect import create_client
 
-client = create_client()
-
 # Consultas de primary doctor, care team, medicines by patient, patients by doctor
 import json
+import os
+
+# cache de resultados (DGraph/cache.py); se activa con DGRAPH_CACHE=1
+DGRAPH_CACHE = os.getenv('DGRAPH_CACHE', '0') == '1'
+
+#-------------------------------------------------------------------------------------------------------
+# CATALOGO DE CONSULTAS DQL
+# Cada consulta se define una sola vez con variables ($...); los valores del usuario
+# viajan aparte en `variables` y nunca se pegan en el texto de la consulta.
+
+REGISTRO_ATENCION_PRIMARIA = """
+query registro_atencion_primaria($patient_id: string) {
+  patient(func: eq(patient_id, $patient_id)) {
+    patient_id
+    name
+    has_primary_doctor {
+      doctor_id
+      name
+      specialty
+    }
+  }
+}
+"""
+
+EQUIPO_CUIDADO = """
+query equipo_cuidado($patient_id: string) {
+  patient(func: eq(patient_id, $patient_id)) {
+    patient_id
+    name
+    has_primary_doctor {
+      doctor_id
+      name
+      specialty
+    }
+    care_team {
+      doctor_id
+      name
+      specialty
+    }
+  }
+}
+"""
+
+HISTORIAL_MEDICAMENTOS = """
+query historial_medicamentos($patient_id: string) {
+  patient(func: eq(patient_id, $patient_id)) {
+    patient_id
+    name
+    treated_with {
+      treatment_id
+      description
+      route
+      frequency
+      uses_medicine {
+        medicine_id
+        name
+        dose_mg
+      }
+    }
+  }
+}
+"""
+
+PLAN_TERAPEUTICO = """
+query plan_terapeutico($diagnosis_id: string) {
+  diagnosis(func: eq(diagnosis_id, $diagnosis_id)) {
+    diagnosis_id
+    name
+    ~for_diagnosis {
+      treatment_id
+      description
+      route
+      frequency
+      uses_medicine {
+        medicine_id
+        name
+        dose_mg
+      }
+    }
+  }
+}
+"""
+
+INTERACCIONES_MEDICAMENTO = """
+query interacciones_medicamento($medicine_id: string) {
+  medicine(func: eq(medicine_id, $medicine_id)) {
+    medicine_id
+    name
+    dose_mg
+    interacts_with {
+      medicine_id
+      name
+      dose_mg
+    }
+  }
+}
+"""
+
+CAMINO_ATENCION = """
+query camino_atencion($patient_id: string) {
+  patient(func: eq(patient_id, $patient_id)) {
+    patient_id
+    name
+    treated_with {
+      treatment_id
+      description
+      route
+      frequency
+      for_diagnosis {
+        diagnosis_id
+        name
+      }
+      uses_medicine {
+        medicine_id
+        name
+        dose_mg
+      }
+    }
+    has_primary_doctor {
+      doctor_id
+      name
+      specialty
+    }
+    care_team {
+      doctor_id
+      name
+      specialty
+    }
+  }
+}
+"""
+
+PACIENTES_POR_MEDICO = """
+query pacientes_por_medico($doctor_id: string) {
+  doctor(func: eq(doctor_id, $doctor_id)) {
+    doctor_id
+    name
+    specialty
+    ~has_primary_doctor {
+      patient_id
+      name
+    }
+    ~care_team {
+      patient_id
+      name
+    }
+  }
+}
+"""
+
+RECOMENDACION_ESPECIALISTA = """
+query recomendacion_especialista($specialty: string, $limit: int) {
+  doctors(func: eq(specialty, $specialty), orderdesc: rating, first: $limit) {
+    doctor_id
+    name
+    specialty
+    rating
+    works_at {
+      clinic_id
+      name
+      city
+    }
+  }
+}
+"""
+
+CONTACTOS_EMERGENCIA = """
+query contactos_emergencia($patient_id: string) {
+  patient(func: eq(patient_id, $patient_id)) {
+    patient_id
+    name
+    emergency_contact {
+      contact_id
+      name
+      phone
+      relationship
+    }
+  }
+}
+"""
+
+CLINICAS_DOCTOR = """
+query clinicas_doctor($doctor_id: string) {
+  doctor(func: eq(doctor_id, $doctor_id)) {
+    doctor_id
+    name
+    specialty
+    works_at {
+      clinic_id
+      name
+      city
+    }
+  }
+}
+"""
+
+# nombre -> (consulta, variables que recibe)
+QUERY_CATALOG = {
+    'registro_atencion_primaria': (REGISTRO_ATENCION_PRIMARIA, ('patient_id',)),
+    'equipo_cuidado': (EQUIPO_CUIDADO, ('patient_id',)),
+    'historial_medicamentos': (HISTORIAL_MEDICAMENTOS, ('patient_id',)),
+    'plan_terapeutico': (PLAN_TERAPEUTICO, ('diagnosis_id',)),
+    'interacciones_medicamento': (INTERACCIONES_MEDICAMENTO, ('medicine_id',)),
+    'camino_atencion': (CAMINO_ATENCION, ('patient_id',)),
+    'pacientes_por_medico': (PACIENTES_POR_MEDICO, ('doctor_id',)),
+    'recomendacion_especialista': (RECOMENDACION_ESPECIALISTA, ('specialty', 'limit')),
+    'contactos_emergencia': (CONTACTOS_EMERGENCIA, ('patient_id',)),
+    'clinicas_doctor': (CLINICAS_DOCTOR, ('doctor_id',)),
+}
+
+# Variantes por lote de las consultas centradas en el paciente: misma selección de
+# campos, pero con eq(patient_id, $ids) sobre una lista de IDs y paginadas.
+BATCH_PAGE_SIZE = 500
+
+def _batch_of(name, query):
+    single = (f"query {name}($patient_id: string) {{\n"
+              "  patient(func: eq(patient_id, $patient_id)) {")
+    batch = (f"query {name}_batch($ids: string, $first: int, $offset: int) {{\n"
+             "  patients(func: eq(patient_id, $ids), orderasc: patient_id, first: $first, offset: $offset) {")
+    if not query.startswith("\n" + single):
+        # sin esto replace() no cambiaría nada y la variante por lote sería la consulta individual
+        raise ValueError(f"{name}: la consulta no empieza con patient(func: eq(patient_id, $patient_id))")
+    return query.replace(single, batch, 1)
+
+for _name in ('registro_atencion_primaria', 'equipo_cuidado', 'historial_medicamentos',
+              'camino_atencion', 'contactos_emergencia'):
+    QUERY_CATALOG[_name + '_batch'] = (_batch_of(_name, QUERY_CATALOG[_name][0]), ('ids', 'first', 'offset'))
+
+
+def prepare_query(name, values):
+    """(consulta, variables) listas para txn.query; valida que no falte ninguna variable"""
+    query, names = QUERY_CATALOG[name]
+    missing = [n for n in names if values.get(n) is None]
+    if missing:
+        raise ValueError(f"{name}: faltan variables {', '.join(missing)}")
+    # pydgraph solo acepta strings como valores de variables; las listas van como arreglo JSON
+    variables = {f"${n}": json.dumps([str(v) for v in values[n]]) if isinstance(values[n], (list, tuple, set))
+                 else str(values[n]) for n in names}
+    return query, variables
+
+def run_query(name, txn=None, **values):
+    """
+    Ejecuta una consulta del catálogo y retorna el JSON ya decodificado.
+    Con `txn` se reutiliza una transacción de solo lectura (varias consultas
+    sobre el mismo snapshot); sin ella se abre una nueva, o con DGRAPH_CACHE=1
+    se sirve desde DGraph.cache.
+    """
+    if txn is None and DGRAPH_CACHE:
+        from DGraph.cache import default_cache
+        return default_cache().query(name, **values)
+    query, variables = prepare_query(name, values)
+    txn = txn or create_client().txn(read_only=True)
+    res = txn.query(query, variables=variables)
+    return json.loads(res.json)
+
+#-------------------------------------------------------------------------------------------------------
+# CONSULTAS (sin E/S de consola)
 
 # 1. Registro y vínculo de atención primaria
-def query_registro_atencion_primaria():
+def get_registro_atencion_primaria(patient_id, txn=None):
     """
     Registrar en el grafo el vínculo "atención primaria" entre un paciente y su médico responsable.
     Flujo: Paciente --hasPrimaryDoctor--> Doctor con facetas {desde, estado}.
     """
-    patient_id = input("patient_id: ")
-    q = f"""
-    {{
-      patient(func: eq(patient_id, "{patient_id}")) {{
-        patient_id
-        name
-        has_primary_doctor {{
-          doctor_id
-          name
-          specialty
-        }}
-      }}
-    }}
-    """
-    res = client.txn(read_only=True).query(q)
-    data = json.loads(res.json)
-    print("\n=== Vínculo de Atención Primaria ===")
-    print(json.dumps(data, indent=2, ensure_ascii=False))
+    return run_query('registro_atencion_primaria', txn, patient_id=patient_id)
 
 # 2. Mapa de equipo de cuidado por paciente
-def query_equipo_cuidado():
+def get_equipo_cuidado(patient_id, txn=None):
     """
     Consultar a todos los profesionales activos que atienden a un paciente.
     Resultado: Gráfica con todos los médicos y descripción de su rol.
     """
-    patient_id = input("patient_id: ")
-    q = f"""
-    {{
-      patient(func: eq(patient_id, "{patient_id}")) {{
-        patient_id
-        name
-        has_primary_doctor {{
-          doctor_id
-          name
-          specialty
-        }}
-        care_team {{
-          doctor_id
-          name
-          specialty
-        }}
-      }}
-    }}
-    """
-    res = client.txn(read_only=True).query(q)
-    data = json.loads(res.json)
-    print("\n=== Equipo de Cuidado del Paciente ===")
-    print(json.dumps(data, indent=2, ensure_ascii=False))
+    return run_query('equipo_cuidado', txn, patient_id=patient_id)
 
 # 3. Historial de Medicamentos
-def query_historial_medicamentos():
+def get_historial_medicamentos(patient_id, txn=None):
     """
     Consultar los medicamentos para el tratamiento de un paciente.
     Resultado: Medicamentos, fecha de caducidad, gramos (dosis).
     """
-    patient_id = input("patient_id: ")
-    q = f"""
-    {{
-      patient(func: eq(patient_id, "{patient_id}")) {{
-        patient_id
-        name
-        treated_with {{
-          treatment_id
-          description
-          route
-          frequency
-          uses_medicine {{
-            medicine_id
-            name
-            dose_mg
-          }}
-        }}
-      }}
-    }}
-    """
-    res = client.txn(read_only=True).query(q)
-    data = json.loads(res.json)
-    print("\n=== Historial de Medicamentos ===")
-    print(json.dumps(data, indent=2, ensure_ascii=False))
+    return run_query('historial_medicamentos', txn, patient_id=patient_id)
 
 # 4. Plan terapéutico dirigido por diagnóstico
-def query_plan_terapeutico():
+def get_plan_terapeutico(diagnosis_id, txn=None):
     """
     Dado un diagnóstico, recuperar el plan activo de tratamientos.
     Resultado: Relación con medicamento, vía de administración, frecuencia y dosis.
     """
-    diagnosis_id = input("diagnosis_id: ")
-    q = f"""
-    {{
-      diagnosis(func: eq(diagnosis_id, "{diagnosis_id}")) {{
-        diagnosis_id
-        name
-        ~for_diagnosis {{
-          treatment_id
-          description
-          route
-          frequency
-          uses_medicine {{
-            medicine_id
-            name
-            dose_mg
-          }}
-        }}
-      }}
-    }}
-    """
-    res = client.txn(read_only=True).query(q)
-    data = json.loads(res.json)
-    print("\n=== Plan Terapéutico por Diagnóstico ===")
-    print(json.dumps(data, indent=2, ensure_ascii=False))
+    return run_query('plan_terapeutico', txn, diagnosis_id=diagnosis_id)
 
 # 5. Detección de interacciones medicamento–medicamento
-def query_interacciones_medicamento():
+def get_interacciones_medicamento(medicine_id, txn=None):
     """
     Consultar los posibles efectos secundarios de un medicamento que toma un paciente.
     Resultado: Efectos secundarios de un medicamento.
     """
-    medicine_id = input("medicine_id: ")
-    q = f"""
-    {{
-      medicine(func: eq(medicine_id, "{medicine_id}")) {{
-        medicine_id
-        name
-        dose_mg
-        interacts_with {{
-          medicine_id
-          name
-          dose_mg
-        }}
-      }}
-    }}
-    """
-    res = client.txn(read_only=True).query(q)
-    data = json.loads(res.json)
-    print("\n=== Interacciones Medicamento-Medicamento ===")
-    print(json.dumps(data, indent=2, ensure_ascii=False))
+    return run_query('interacciones_medicamento', txn, medicine_id=medicine_id)
 
 # 6. Camino de atención
-def query_camino_atencion():
+def get_camino_atencion(patient_id, txn=None):
     """
     Construir la secuencia de eventos clínicos (visitas, estudios, tratamientos) como camino en el grafo.
     Resultado: Timeline ordenado, con nodos etiquetados por tipo de evento y referencias a IDs.
     """
-    patient_id = input("patient_id: ")
-    q = f"""
-    {{
-      patient(func: eq(patient_id, "{patient_id}")) {{
-        patient_id
-        name
-        treated_with {{
-          treatment_id
-          description
-          route
-          frequency
-          for_diagnosis {{
-            diagnosis_id
-            name
-          }}
-          uses_medicine {{
-            medicine_id
-            name
-            dose_mg
-          }}
-        }}
-        has_primary_doctor {{
-          doctor_id
-          name
-          specialty
-        }}
-        care_team {{
-          doctor_id
-          name
-          specialty
-        }}
-      }}
-    }}
-    """
-    res = client.txn(read_only=True).query(q)
-    data = json.loads(res.json)
-    print("\n=== Camino de Atención del Paciente ===")
-    print(json.dumps(data, indent=2, ensure_ascii=False))
+    return run_query('camino_atencion', txn, patient_id=patient_id)
 
 # 7. Búsqueda pacientes por médico (búsqueda por vecindad)
-def query_pacientes_por_medico():
+def get_pacientes_por_medico(doctor_id, txn=None):
     """
     Encontrar pacientes conectados a un mismo médico.
     Resultado: Lista de pacientes de un médico, inicio de consulta.
     """
-    doctor_id = input("doctor_id: ")
-    q = f"""
-    {{
-      doctor(func: eq(doctor_id, "{doctor_id}")) {{
-        doctor_id
-        name
-        specialty
-        ~has_primary_doctor {{
-          patient_id
-          name
-        }}
-        ~care_team {{
-          patient_id
-          name
-        }}
-      }}
-    }}
-    """
-    res = client.txn(read_only=True).query(q)
-    data = json.loads(res.json)
-    print("\n=== Pacientes por Médico ===")
-    print(json.dumps(data, indent=2, ensure_ascii=False))
+    return run_query('pacientes_por_medico', txn, doctor_id=doctor_id)
 
 # 8. Recomendación de especialista
-def query_recomendacion_especialista():
+def get_recomendacion_especialista(specialty, limit=5, txn=None):
     """
     Consultar los mejores médicos / especialistas de una clínica.
     Resultado: Top-N doctores con puntuación de recomendación y especialidad.
     """
-    specialty = input("Especialidad (ej: Cardiology, Neurology): ")
-    limit = input("Número de resultados (Top-N): ")
-    q = f"""
-    {{
-      doctors(func: eq(specialty, "{specialty}"), orderdesc: rating, first: {limit}) {{
-        doctor_id
-        name
-        specialty
-        rating
-        works_at {{
-          clinic_id
-          name
-          city
-        }}
-      }}
-    }}
-    """
-    res = client.txn(read_only=True).query(q)
-    data = json.loads(res.json)
-    print("\n=== Recomendación de Especialistas ===")
-    print(json.dumps(data, indent=2, ensure_ascii=False))
+    return run_query('recomendacion_especialista', txn, specialty=specialty, limit=int(limit))
 
 # 9. Búsqueda de contactos de emergencia del paciente
-def query_contactos_emergencia():
+def get_contactos_emergencia(patient_id, txn=None):
     """
     Búsqueda y consulta de contactos de emergencia con sus datos y relación.
     Resultado: Nodos de relaciones de los contactos de emergencia, con nombre, teléfono y parentesco.
     """
-    patient_id = input("patient_id: ")
-    q = f"""
-    {{
-      patient(func: eq(patient_id, "{patient_id}")) {{
-        patient_id
-        name
-        emergency_contact {{
-          contact_id
-          name
-          phone
-          relationship
-        }}
-      }}
-    }}
-    """
-    res = client.txn(read_only=True).query(q)
-    data = json.loads(res.json)
-    print("\n=== Contactos de Emergencia ===")
-    print(json.dumps(data, indent=2, ensure_ascii=False))
+    return run_query('contactos_emergencia', txn, patient_id=patient_id)
 
 # 10. Mostrar las clínicas en las que opera un doctor / médico
-def query_clinicas_doctor():
+def get_clinicas_doctor(doctor_id, txn=None):
     """
     Visualizar las clínicas en las que opera un doctor.
     Resultado: Mapa de clínicas en las que opera un doctor y su relación.
     """
-    doctor_id = input("doctor_id: ")
-    q = f"""
-    {{
-      doctor(func: eq(doctor_id, "{doctor_id}")) {{
-        doctor_id
-        name
-        specialty
-        works_at {{
-          clinic_id
-          name
-          city
-        }}
-      }}
-    }}
-    """
-    res = client.txn(read_only=True).query(q)
-    data = json.loads(res.json)
-    print("\n=== Clínicas del Doctor ===")
+    return run_query('clinicas_doctor', txn, doctor_id=doctor_id)
+
+# CONSULTAS POR LOTE
+# Una sola petición por página para una lista de pacientes (p. ej. todo un piso).
+# Retornan la lista de pacientes encontrados, ordenada por patient_id.
+
+def run_batch(name, patient_ids, first=BATCH_PAGE_SIZE, offset=0, txn=None):
+    """Una página de `name`_batch sobre `patient_ids`"""
+    ids = sorted(set(patient_ids))
+    if not ids:
+        return []
+    data = run_query(name + '_batch', txn, ids=ids, first=int(first), offset=int(offset))
+    return data.get('patients', [])
+
+def iter_batch(name, patient_ids, page_size=BATCH_PAGE_SIZE, txn=None):
+    """Recorre todas las páginas de `name`_batch sobre el mismo snapshot"""
+    txn = txn or create_client().txn(read_only=True)
+    offset = 0
+    while True:
+        page = run_batch(name, patient_ids, page_size, offset, txn)
+        yield from page
+        if len(page) < page_size:
+            return
+        offset += page_size
+
+def get_registro_atencion_primaria_batch(patient_ids, first=BATCH_PAGE_SIZE, offset=0, txn=None):
+    return run_batch('registro_atencion_primaria', patient_ids, first, offset, txn)
+
+def get_equipo_cuidado_batch(patient_ids, first=BATCH_PAGE_SIZE, offset=0, txn=None):
+    return run_batch('equipo_cuidado', patient_ids, first, offset, txn)
+
+def get_historial_medicamentos_batch(patient_ids, first=BATCH_PAGE_SIZE, offset=0, txn=None):
+    return run_batch('historial_medicamentos', patient_ids, first, offset, txn)
+
+def get_camino_atencion_batch(patient_ids, first=BATCH_PAGE_SIZE, offset=0, txn=None):
+    return run_batch('camino_atencion', patient_ids, first, offset, txn)
+
+def get_contactos_emergencia_batch(patient_ids, first=BATCH_PAGE_SIZE, offset=0, txn=None):
+    return run_batch('contactos_emergencia', patient_ids, first, offset, txn)
+
+#-------------------------------------------------------------------------------------------------------
+# MENU (E/S de consola)
+
+def _print_result(title, data):
+    print(f"\n=== {title} ===")
     print(json.dumps(data, indent=2, ensure_ascii=False))
+
+def query_registro_atencion_primaria():
+    patient_id = input("patient_id: ")
+    _print_result("Vínculo de Atención Primaria", get_registro_atencion_primaria(patient_id))
+
+def query_equipo_cuidado():
+    patient_id = input("patient_id: ")
+    _print_result("Equipo de Cuidado del Paciente", get_equipo_cuidado(patient_id))
+
+def query_historial_medicamentos():
+    patient_id = input("patient_id: ")
+    _print_result("Historial de Medicamentos", get_historial_medicamentos(patient_id))
+
+def query_plan_terapeutico():
+    diagnosis_id = input("diagnosis_id: ")
+    _print_result("Plan Terapéutico por Diagnóstico", get_plan_terapeutico(diagnosis_id))
+
+def query_interacciones_medicamento():
+    medicine_id = input("medicine_id: ")
+    _print_result("Interacciones Medicamento-Medicamento", get_interacciones_medicamento(medicine_id))
+
+def query_camino_atencion():
+    patient_id = input("patient_id: ")
+    _print_result("Camino de Atención del Paciente", get_camino_atencion(patient_id))
+
+def query_pacientes_por_medico():
+    doctor_id = input("doctor_id: ")
+    _print_result("Pacientes por Médico", get_pacientes_por_medico(doctor_id))
+
+def query_recomendacion_especialista():
+    specialty = input("Especialidad (ej: Cardiology, Neurology): ")
+    limit = input("Número de resultados (Top-N): ").strip()
+    if not limit.isdigit():
+        print("El número de resultados debe ser un entero positivo.")
+        return
+    _print_result("Recomendación de Especialistas", get_recomendacion_especialista(specialty, int(limit)))
+
+def query_contactos_emergencia():
+    patient_id = input("patient_id: ")
+    _print_result("Contactos de Emergencia", get_contactos_emergencia(patient_id))
+
+def query_clinicas_doctor():
+    doctor_id = input("doctor_id: ")
+    _print_result("Clínicas del Doctor", get_clinicas_doctor(doctor_id))
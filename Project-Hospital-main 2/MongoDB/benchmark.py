@@ -0,0 +1,114 @@
+import argparse
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+import random
+import time
+
+from MongoDB.model import HospitalModel
+from MongoDB.model_async import AsyncHospitalModel
+
+#  BENCHMARK SINCRONO VS ASINCRONO
+#  N clientes simulados hacen cada uno `requests` consultas mezcladas (paciente,
+#  expediente, medicamentos por principio activo) contra la misma base.
+#  python -m MongoDB.benchmark --clients 50 --requests 200 --threads 1
+
+
+def _workload(pacientes, principios, requests, seed):
+    """Lista de (metodo, argumento) reproducible para un cliente"""
+    rnd = random.Random(seed)
+    ops = []
+    for _ in range(requests):
+        r = rnd.random()
+        if r < 0.5:
+            ops.append(('get_paciente_by_id', rnd.choice(pacientes)))
+        elif r < 0.8:
+            ops.append(('get_expediente_by_paciente_id', rnd.choice(pacientes)))
+        else:
+            ops.append(('get_medicamentos_por_principio', rnd.choice(principios)))
+    return ops
+
+
+def _summary(name, latencies, elapsed):
+    latencies.sort()
+    n = len(latencies)
+    return {
+        'modo': name,
+        'consultas': n,
+        'segundos': round(elapsed, 3),
+        'consultas_por_seg': round(n / elapsed, 1) if elapsed > 0 else 0.0,
+        'p50_ms': round(latencies[n // 2] * 1000, 2) if n else None,
+        'p99_ms': round(latencies[min(n - 1, int(n * 0.99))] * 1000, 2) if n else None,
+    }
+
+
+def run_sync(workloads, threads):
+    """Clientes repartidos en `threads` hilos; con threads=1 hay una consulta en vuelo a la vez"""
+    model = HospitalModel()
+    model.connect()
+    latencies = []
+
+    def client(ops):
+        local = []
+        for method, arg in ops:
+            start = time.perf_counter()
+            getattr(model, method)(arg)
+            local.append(time.perf_counter() - start)
+        return local
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=threads) as pool:
+        for local in pool.map(client, workloads):
+            latencies.extend(local)
+    elapsed = time.perf_counter() - start
+    model.close()
+    return _summary(f'sync ({threads} hilo/s)', latencies, elapsed)
+
+
+async def run_async(workloads):
+    """Un cliente por corrutina, todos en un solo event loop"""
+    model = AsyncHospitalModel()
+    await model.connect()
+    latencies = []
+
+    async def client(ops):
+        for method, arg in ops:
+            start = time.perf_counter()
+            await getattr(model, method)(arg)
+            latencies.append(time.perf_counter() - start)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(client(ops) for ops in workloads))
+    elapsed = time.perf_counter() - start
+    model.close()
+    return _summary('async (1 event loop)', latencies, elapsed)
+
+
+def _sample_keys(limit=1000):
+    model = HospitalModel()
+    model.connect()
+    pacientes = [p['Paciente_ID'] for p in model.db.pacientes.find({}, {'_id': 0, 'Paciente_ID': 1}).limit(limit)]
+    principios = [m['Principio_Activo'] for m in
+                  model.db.medicamentos.find({}, {'_id': 0, 'Principio_Activo': 1}).limit(limit)]
+    model.close()
+    return pacientes, principios
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark HospitalModel síncrono vs asíncrono")
+    parser.add_argument('--clients', type=int, default=50)
+    parser.add_argument('--requests', type=int, default=200, help="consultas por cliente")
+    parser.add_argument('--threads', type=int, default=1, help="hilos del modo síncrono")
+    args = parser.parse_args()
+
+    pacientes, principios = _sample_keys()
+    if not pacientes or not principios:
+        print("La base está vacía: ejecuta populate.py primero")
+        return
+    workloads = [_workload(pacientes, principios, args.requests, seed) for seed in range(args.clients)]
+
+    for result in (run_sync(workloads, args.threads), asyncio.run(run_async(workloads))):
+        print(result)
+
+
+if __name__ == "__main__":
+    main()
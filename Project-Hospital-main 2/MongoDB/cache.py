@@ -0,0 +1,328 @@
+from collections import OrderedDict
+import copy
+import logging
+import os
+import sqlite3
+import threading
+import time
+
+import bson
+from bson.errors import InvalidBSON
+
+from common import HitStats
+from connect import replica_set_name
+from MongoDB.model import HospitalModel
+
+logger = logging.getLogger(__name__)
+
+# Configuración por variables de entorno
+MONGO_CACHE = os.getenv('MONGO_CACHE', '0') == '1'
+MONGO_CACHE_SIZE = int(os.getenv('MONGO_CACHE_SIZE', '1024'))
+MONGO_CACHE_TTL = float(os.getenv('MONGO_CACHE_TTL', '60'))
+MONGO_CACHE_SQLITE = os.getenv('MONGO_CACHE_SQLITE')  # ruta del store compartido (opcional)
+WATCH_START_TIMEOUT = 5.0
+
+# colecciones cuyos cambios invalidan entradas
+WATCHED = ('pacientes', 'medicamentos', 'expedientes')
+
+
+class CacheStats(HitStats):
+    """
+    Contadores del cache: aciertos, fallos, desalojos por tamaño, expiraciones e invalidaciones
+    """
+
+    COUNTERS = HitStats.COUNTERS + ('evictions', 'expirations', 'invalidations')
+
+
+class SQLiteStore:
+    """
+    Segundo nivel compartido entre procesos de la misma máquina (archivo SQLite).
+    Los valores se guardan como BSON (los mismos tipos que devuelve pymongo, sin
+    ejecutar código al leer como pickle) junto con su expiración y sus etiquetas.
+    """
+
+    def __init__(self, path):
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("CREATE TABLE IF NOT EXISTS entries (key TEXT PRIMARY KEY, value BLOB, expires REAL)")
+        self._conn.execute("CREATE TABLE IF NOT EXISTS tags (tag TEXT, key TEXT, PRIMARY KEY (tag, key))")
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        """Retorna (encontrado, valor)"""
+        with self._lock:
+            row = self._conn.execute("SELECT value, expires FROM entries WHERE key = ?", (key,)).fetchone()
+        if row is None or row[1] < time.time():
+            return False, None
+        try:
+            return True, bson.decode(row[0])['v']
+        except InvalidBSON:
+            # entrada de un formato anterior: se trata como fallo
+            return False, None
+
+    def set(self, key, value, ttl, tags):
+        with self._lock:
+            self._conn.execute("INSERT OR REPLACE INTO entries VALUES (?, ?, ?)",
+                               (key, bson.encode({'v': value}), time.time() + ttl))
+            self._conn.executemany("INSERT OR IGNORE INTO tags VALUES (?, ?)", [(t, key) for t in tags])
+
+    def tags(self, key):
+        with self._lock:
+            return [row[0] for row in self._conn.execute("SELECT tag FROM tags WHERE key = ?", (key,))]
+
+    def invalidate_tag(self, tag):
+        with self._lock:
+            self._conn.execute("DELETE FROM entries WHERE key IN (SELECT key FROM tags WHERE tag = ?)", (tag,))
+            self._conn.execute("DELETE FROM tags WHERE tag = ?", (tag,))
+
+    def clear(self):
+        with self._lock:
+            self._conn.execute("DELETE FROM entries")
+            self._conn.execute("DELETE FROM tags")
+
+
+class LRUCache:
+    """
+    Cache LRU en memoria con TTL por entrada. Cada entrada lleva etiquetas
+    (p. ej. 'pacientes' y 'pacientes:P001') para invalidarla por documento o
+    por colección. Con `store` las entradas también se leen/escriben en un
+    segundo nivel compartido (SQLiteStore).
+    """
+
+    def __init__(self, max_entries=MONGO_CACHE_SIZE, ttl=MONGO_CACHE_TTL, store=None):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.store = store
+        self.stats = CacheStats()
+        self.enabled = True
+        # aumenta con cada invalidación: una carga que empezó antes no se guarda
+        self.epoch = 0
+        self._entries = OrderedDict()  # key -> (expira, valor, etiquetas)
+        self._tags = {}                # etiqueta -> set(keys)
+        self._lock = threading.RLock()
+
+    def get(self, key):
+        """Retorna (encontrado, valor)"""
+        if not self.enabled:
+            return False, None
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                if entry[0] >= time.monotonic():
+                    self._entries.move_to_end(key)
+                    self.stats.hits += 1
+                    return True, copy.deepcopy(entry[1])
+                self._remove(key)
+                self.stats.expirations += 1
+        if self.store is not None:
+            found, value = self.store.get(key)
+            if found:
+                with self._lock:
+                    self.stats.hits += 1
+                    self._set_local(key, value, self.store.tags(key))
+                return True, copy.deepcopy(value)
+        with self._lock:
+            self.stats.misses += 1
+        return False, None
+
+    def set(self, key, value, tags=(), epoch=None):
+        """
+        Guarda `value`. Con `epoch` (leído antes de ir a la base) no se guarda si
+        hubo una invalidación mientras tanto, para no cachear un valor ya viejo.
+        """
+        if not self.enabled:
+            return
+        with self._lock:
+            if epoch is not None and epoch != self.epoch:
+                return
+            self._set_local(key, value, tags)
+            if self.store is not None:
+                self.store.set(key, value, self.ttl, tags)
+
+    def _set_local(self, key, value, tags):
+        if key in self._entries:
+            self._remove(key)
+        self._entries[key] = (time.monotonic() + self.ttl, copy.deepcopy(value), tuple(tags))
+        for tag in tags:
+            self._tags.setdefault(tag, set()).add(key)
+        while len(self._entries) > self.max_entries:
+            self._remove(next(iter(self._entries)))
+            self.stats.evictions += 1
+
+    def _remove(self, key):
+        _expires, _value, tags = self._entries.pop(key)
+        for tag in tags:
+            keys = self._tags.get(tag)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self._tags[tag]
+
+    def invalidate_tag(self, tag):
+        with self._lock:
+            self.epoch += 1
+            for key in list(self._tags.get(tag, ())):
+                self._remove(key)
+                self.stats.invalidations += 1
+            if self.store is not None:
+                self.store.invalidate_tag(tag)
+
+    def clear(self):
+        with self._lock:
+            self.epoch += 1
+            self._entries.clear()
+            self._tags.clear()
+            if self.store is not None:
+                self.store.clear()
+
+    def __len__(self):
+        return len(self._entries)
+
+
+def default_cache():
+    """LRUCache configurado por entorno (con SQLiteStore si MONGO_CACHE_SQLITE está definido)"""
+    store = SQLiteStore(MONGO_CACHE_SQLITE) if MONGO_CACHE_SQLITE else None
+    return LRUCache(MONGO_CACHE_SIZE, MONGO_CACHE_TTL, store)
+
+
+#  INVALIDACION
+
+def invalidate_change(cache, change):
+    """
+    Invalida las entradas afectadas por un evento del change stream. Si el evento
+    no trae el documento (delete) se invalida la colección completa.
+    """
+    coll = change.get('ns', {}).get('coll')
+    op = change['operationType']
+    if op in ('drop', 'rename', 'dropDatabase', 'invalidate'):
+        target = change.get('to', {}).get('coll') if op == 'rename' else coll
+        if target in WATCHED:
+            cache.invalidate_tag(target)
+        elif op in ('dropDatabase', 'invalidate'):
+            cache.clear()
+        return
+    if coll not in WATCHED:
+        return
+    if coll == 'medicamentos':
+        # get_medicamentos_por_principio depende de varios documentos a la vez
+        cache.invalidate_tag('medicamentos')
+        return
+    doc = change.get('fullDocument')
+    if doc is None:
+        cache.invalidate_tag(coll)
+    else:
+        cache.invalidate_tag(f"{coll}:{doc.get('Paciente_ID')}")
+
+
+def watch_invalidations(db, cache, stop=None, ready=None):
+    """
+    Invalida `cache` con un change stream sobre la base (requiere replica set).
+    `ready` (threading.Event) se activa cuando el stream ya está abierto.
+    Si el stream falla el cache se vacía y se desactiva: es preferible ir a la
+    base que servir datos clínicos viejos.
+    """
+    pipeline = [{'$match': {'$or': [
+        {'ns.coll': {'$in': list(WATCHED)}},
+        {'operationType': {'$in': ['drop', 'rename', 'dropDatabase', 'invalidate']}},
+    ]}}]
+    try:
+        with db.watch(pipeline, full_document='updateLookup') as stream:
+            logger.info("✅ Cache: escuchando cambios")
+            if ready is not None:
+                ready.set()
+            while stream.alive and not (stop is not None and stop.is_set()):
+                change = stream.try_next()
+                if change is not None:
+                    invalidate_change(cache, change)
+    except Exception as e:
+        logger.error(f"❌ Cache: change stream detenido ({e}); cache desactivado")
+    finally:
+        cache.enabled = False
+        cache.clear()
+        if ready is not None:
+            ready.set()
+
+
+#  MODELO CON CACHE
+
+class CachedHospitalModel(HospitalModel):
+    """
+    HospitalModel con cache read-through para las búsquedas repetidas por ID y
+    principio activo. Con watch=True un hilo invalida el cache desde el change
+    stream; sin él las entradas solo caducan por TTL (o con invalidate_*).
+    Si el servidor no es un replica set no hay change streams: se usa solo el TTL.
+    """
+
+    def __init__(self, cache=None, watch=True):
+        super().__init__()
+        self.cache = cache if cache is not None else default_cache()
+        self.watch = watch
+        self._stop = threading.Event()
+        self._watcher = None
+
+    def connect(self):
+        if not super().connect():
+            return False
+        if self.watch and replica_set_name(self.db.client) is None:
+            logger.warning(f"⚠️ Cache: MongoDB sin replica set, sin invalidación por change stream; "
+                           f"las entradas solo caducan por TTL ({self.cache.ttl:.0f}s)")
+            self.watch = False
+        if self.watch:
+            # no se cachea nada hasta que el stream esté escuchando
+            ready = threading.Event()
+            self._watcher = threading.Thread(target=watch_invalidations,
+                                             args=(self.db, self.cache, self._stop, ready),
+                                             name='mongo-cache-invalidation', daemon=True)
+            self._watcher.start()
+            ready.wait(WATCH_START_TIMEOUT)
+            if not ready.is_set():
+                logger.warning("Cache: el change stream no respondió; cache desactivado")
+                self.cache.enabled = False
+        return True
+
+    def close(self):
+        self._stop.set()
+        logger.info(f"Cache: {self.cache.stats}")
+        super().close()
+
+    def _cached(self, key, tags, load):
+        found, value = self.cache.get(key)
+        if found:
+            return value
+        epoch = self.cache.epoch
+        value = load()
+        self.cache.set(key, value, tags, epoch)
+        return value
+
+    def get_paciente_by_id(self, paciente_id):
+        pid = str(paciente_id)
+        return self._cached(f"paciente:{pid}", ('pacientes', f"pacientes:{pid}"),
+                            lambda: super(CachedHospitalModel, self).get_paciente_by_id(pid))
+
+    def get_expediente_by_paciente_id(self, paciente_id):
+        pid = str(paciente_id)
+        return self._cached(f"expediente:{pid}", ('expedientes', f"expedientes:{pid}"),
+                            lambda: super(CachedHospitalModel, self).get_expediente_by_paciente_id(pid))
+
+    def get_medicamentos_por_principio(self, principio):
+        return self._cached(f"principio:{principio}", ('medicamentos',),
+                            lambda: super(CachedHospitalModel, self).get_medicamentos_por_principio(principio))
+
+    # hooks para rutas de escritura que no pasan por el change stream
+
+    def invalidate_paciente(self, paciente_id):
+        self.cache.invalidate_tag(f"pacientes:{paciente_id}")
+        self.cache.invalidate_tag(f"expedientes:{paciente_id}")
+
+    def invalidate_medicamentos(self):
+        self.cache.invalidate_tag('medicamentos')
+
+    def dispensar_medicamento(self, medicamento_id, cantidad):
+        result = super().dispensar_medicamento(medicamento_id, cantidad)
+        self.invalidate_medicamentos()
+        return result
+
+    def reabastecer_medicamento(self, medicamento_id, cantidad):
+        result = super().reabastecer_medicamento(medicamento_id, cantidad)
+        self.invalidate_medicamentos()
+        return result
@@ -0,0 +1,210 @@
+from pymongo import ASCENDING, DESCENDING, TEXT, IndexModel
+import hashlib
+import json
+import logging
+import os
+import sys
+
+from MongoDB.setup import mark_done
+from MongoDB.stock import STOCK_BAJO
+
+logger = logging.getLogger(__name__)
+
+# 1 = crear además el índice de texto para la búsqueda por nombre con ranking
+TEXT_SEARCH = os.getenv('MONGO_TEXT_SEARCH', '0') == '1'
+
+#  INDICES POR COLECCION
+#  Cada índice indica qué consultas de HospitalModel lo necesitan.
+
+INDEXES = {
+    'pacientes': [
+        {'keys': [('Paciente_ID', ASCENDING)], 'name': 'paciente_id', 'unique': True,
+         'used_by': ['get_paciente_by_id', 'get_pacientes_page', 'iter_pacientes']},
+        {'keys': [('Nombre_Busqueda', ASCENDING)], 'name': 'nombre_busqueda',
+         'used_by': ['buscar_pacientes_por_nombre']},
+    ],
+    'medicamentos': [
+        {'keys': [('Medicamento_ID', ASCENDING)], 'name': 'medicamento_id', 'unique': True,
+         'used_by': ['get_medicamentos_page', 'iter_medicamentos']},
+        # parcial: solo indexa los medicamentos con stock bajo
+        {'keys': [('Stock', ASCENDING)], 'name': 'stock_bajo',
+         'partialFilterExpression': {'Stock': {'$lte': STOCK_BAJO}},
+         'used_by': ['get_medicamentos_bajo_stock']},
+    ],
+    'expedientes': [
+        {'keys': [('Paciente_ID', ASCENDING)], 'name': 'paciente_id',
+         'used_by': ['get_expediente_by_paciente_id']},
+    ],
+    'tratamientos_por_medicamento': [
+        {'keys': [('Medicamento', ASCENDING), ('Paciente_ID', ASCENDING)], 'name': 'medicamento',
+         'used_by': ['get_pacientes_con_tratamiento']},
+        {'keys': [('Expediente', ASCENDING)], 'name': 'expediente',
+         'used_by': ['projections.refresh_expediente']},
+        {'keys': [('Paciente_ID', ASCENDING)], 'name': 'paciente_id',
+         'used_by': ['projections.refresh_paciente']},
+    ],
+    'diagnosticos_frecuencia': [
+        {'keys': [('cantidad', DESCENDING)], 'name': 'cantidad',
+         'used_by': ['get_diagnosticos_frecuentes']},
+    ],
+    'diagnosticos_por_dia': [
+        {'keys': [('Dia', ASCENDING), ('Diagnostico', ASCENDING)], 'name': 'dia_diagnostico', 'unique': True,
+         'used_by': ['get_diagnosticos_frecuentes (dias)', 'projections.refresh_expediente']},
+    ],
+}
+
+if TEXT_SEARCH:
+    # solo puede haber un índice de texto por colección; 'none' = sin stemming ni stopwords
+    INDEXES['pacientes'].append(
+        {'keys': [('Nombre_Busqueda', TEXT)], 'name': 'nombre_texto', 'default_language': 'none',
+         'used_by': ['buscar_pacientes_por_texto']})
+
+
+# índices reemplazados por otros: se eliminan si existen
+OBSOLETE_INDEXES = {
+    'medicamentos': ['stock'],
+}
+
+
+def index_models(collection):
+    """IndexModel de pymongo para una colección"""
+    models = []
+    for spec in INDEXES.get(collection, []):
+        options = {k: v for k, v in spec.items() if k not in ('keys', 'used_by')}
+        models.append(IndexModel(spec['keys'], **options))
+    return models
+
+
+def stale_indexes(collection, existing):
+    """
+    Nombres de índices a eliminar antes de crear los de INDEXES: los obsoletos y
+    los parciales cuyo filtro cambió (p. ej. otro MONGO_STOCK_BAJO), que con el
+    mismo nombre harían fallar create_indexes por conflicto de opciones.
+    `existing` es el resultado de index_information().
+    """
+    names = [name for name in OBSOLETE_INDEXES.get(collection, []) if name in existing]
+    for spec in INDEXES.get(collection, []):
+        info = existing.get(spec['name'])
+        if info is not None and info.get('partialFilterExpression') != spec.get('partialFilterExpression'):
+            names.append(spec['name'])
+    return names
+
+
+def index_plan(existing, collections=None):
+    """
+    Acciones para dejar los índices como en INDEXES: [(colección, nombres a eliminar,
+    IndexModel a crear)]. `existing` es {colección: index_information()}; la misma
+    lista la aplican el cliente síncrono y el de Motor.
+    """
+    return [(collection, stale_indexes(collection, existing.get(collection, {})), index_models(collection))
+            for collection in collections or INDEXES]
+
+
+def index_fingerprint():
+    """Huella de INDEXES, para saber si los índices de la base están al día"""
+    specs = {collection: [{k: v for k, v in spec.items() if k != 'used_by'} for spec in specs]
+             for collection, specs in INDEXES.items()}
+    return hashlib.sha1(json.dumps(specs, sort_keys=True, default=str).encode()).hexdigest()
+
+
+def ensure_indexes(db, collections=None):
+    """
+    Crea los índices declarados en INDEXES y elimina los obsoletos. Es parte del
+    setup (MongoDB.setup), no de connect(): create_indexes es idempotente, pero
+    eliminar un índice no debe depender de qué proceso conecta primero.
+    """
+    existing = {collection: db[collection].index_information() for collection in collections or INDEXES}
+    for collection, stale, models in index_plan(existing, collections):
+        for name in stale:
+            db[collection].drop_index(name)
+            logger.info(f"Índice obsoleto eliminado: {collection}.{name}")
+        if models:
+            names = db[collection].create_indexes(models)
+            logger.info(f"Índices en {collection}: {', '.join(names)}")
+    if collections is None:
+        mark_done(db, 'indexes', fingerprint=index_fingerprint())
+
+
+#  VERIFICACION DE PLANES
+
+def _collscans(plan, lookup_only=False, path='plan'):
+    """Busca etapas COLLSCAN (o $lookup que escanean la colección foránea) en un explain"""
+    found = []
+    if isinstance(plan, dict):
+        if not lookup_only and plan.get('stage') == 'COLLSCAN':
+            found.append(path)
+        if '$lookup' in plan and plan.get('collectionScans', 0) > 0:
+            found.append(f"{path}.$lookup({plan['$lookup'].get('from')})")
+        for key, value in plan.items():
+            if key == 'rejectedPlans':
+                continue
+            found.extend(_collscans(value, lookup_only, f"{path}.{key}"))
+    elif isinstance(plan, list):
+        for i, value in enumerate(plan):
+            found.extend(_collscans(value, lookup_only, f"{path}[{i}]"))
+    return found
+
+
+def hot_query_plans(db):
+    """
+    Explain de las consultas de HospitalModel que deben usar índice.
+    Retorna [(nombre, explain, solo_lookup)].
+    """
+    from MongoDB.model import query_pacientes_por_nombre, query_pacientes_con_tratamiento
+
+    return [
+        ('get_paciente_by_id',
+         db.pacientes.find({'Paciente_ID': 'P001'}, {'_id': 0}).limit(1).explain(), False),
+        ('get_pacientes_page',
+         db.pacientes.find({'Paciente_ID': {'$gt': 'P001'}}, {'_id': 0}).sort('Paciente_ID', 1).limit(21).explain(),
+         False),
+        ('get_medicamentos_page',
+         db.medicamentos.find({'Medicamento_ID': {'$gt': 1}}, {'_id': 0}).sort('Medicamento_ID', 1).limit(21).explain(),
+         False),
+        ('get_expediente_by_paciente_id',
+         db.expedientes.find({'Paciente_ID': 'P001'}, {'_id': 0}).limit(1).explain(), False),
+        ('buscar_pacientes_por_nombre',
+         db.pacientes.find(query_pacientes_por_nombre('car her'), {'_id': 0}).sort('Paciente_ID', 1).limit(21).explain(),
+         False),
+        ('get_medicamentos_bajo_stock',
+         db.medicamentos.find({'Stock': {'$lte': STOCK_BAJO}}, {'_id': 0}).sort('Stock', 1).explain(), False),
+        ('get_diagnosticos_frecuentes',
+         db.diagnosticos_frecuencia.find({}, {'_id': 0}).sort('cantidad', DESCENDING).limit(5).explain(), False),
+        ('get_pacientes_con_tratamiento',
+         db.tratamientos_por_medicamento.find(query_pacientes_con_tratamiento('para'), {'_id': 0}).explain(),
+         False),
+    ]
+
+
+def verify_query_plans(db):
+    """
+    Modo self-check: falla si alguna consulta caliente usa COLLSCAN.
+    Lanza RuntimeError con la lista de consultas afectadas.
+    """
+    failures = []
+    for name, plan, lookup_only in hot_query_plans(db):
+        scans = _collscans(plan, lookup_only)
+        if scans:
+            failures.append(f"{name}: {', '.join(scans)}")
+        else:
+            logger.info(f"✅ Plan con índice: {name}")
+    if failures:
+        raise RuntimeError("Consultas con COLLSCAN:\n  " + "\n  ".join(failures))
+    return True
+
+
+if __name__ == "__main__":
+    # python -m MongoDB.indexes            -> crea los índices
+    # python -m MongoDB.indexes --check    -> crea los índices y verifica los planes
+    from connect import MongoDBConnection
+
+    conn = MongoDBConnection()
+    conn.connect()
+    db = conn.get_db()
+    ensure_indexes(db)
+    if '--check' in sys.argv:
+        try:
+            verify_query_plans(db)
+        except RuntimeError as e:
+            logger.error(f"❌ {e}")
+            sys.exit(1)
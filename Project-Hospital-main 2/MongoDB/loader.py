@@ -0,0 +1,146 @@
+from concurrent.futures import ThreadPoolExecutor
+import csv
+import logging
+import sys
+
+from pymongo import UpdateOne
+from pymongo.errors import BulkWriteError
+
+from common import TimedStats, iter_chunks
+from MongoDB.indexes import index_models
+from MongoDB.schema import DERIVED, normalize_document
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_CHUNK_SIZE = 1000
+STAGING_SUFFIX = '_staging'
+
+# colección -> CSV de origen
+SOURCES = {
+    'pacientes': 'data/Mongo/pacientes.csv',
+    'medicamentos': 'data/Mongo/medicamentos.csv',
+    'expedientes': 'data/Mongo/expedientes.csv',
+}
+
+
+class LoadStats(TimedStats):
+    """
+    Contadores de la carga de una colección: documentos, lotes y tiempo
+    """
+
+    COUNTERS = ('documents', 'batches', 'errors')
+    RATE = 'documents'
+
+    def __init__(self, collection):
+        super().__init__()
+        self.collection = collection
+
+    @property
+    def docs_per_sec(self):
+        return self.per_sec('documents')
+
+    def _fields(self):
+        return [f"collection={self.collection}"] + super()._fields()
+
+
+def iter_csv_documents(file_path, collection):
+    """Lee el CSV fila por fila y devuelve cada documento ya tipado"""
+    with open(file_path, 'r', encoding='utf-8', newline='') as fd:
+        for row in csv.DictReader(fd):
+            yield normalize_document(collection, row)
+
+
+def load_collection(db, collection, file_path, chunk_size=DEFAULT_CHUNK_SIZE):
+    """
+    Carga `file_path` en `collection` sin dejarla vacía durante la carga:
+    los documentos se insertan por lotes (insert_many unordered) en una colección
+    de staging, se crean sus índices y al final se renombra sobre la colección
+    real con dropTarget. Si algún lote falla la colección original no se toca.
+    La memoria queda acotada a un lote.
+    """
+    stats = LoadStats(collection)
+    staging = db[collection + STAGING_SUFFIX]
+    staging.drop()  # restos de una carga anterior interrumpida
+
+    try:
+        for chunk in iter_chunks(iter_csv_documents(file_path, collection), chunk_size):
+            try:
+                result = staging.insert_many(chunk, ordered=False)
+                stats.documents += len(result.inserted_ids)
+            except BulkWriteError as e:
+                stats.documents += e.details.get('nInserted', 0)
+                stats.errors += len(e.details.get('writeErrors', []))
+            stats.batches += 1
+        if stats.errors:
+            raise RuntimeError(f"{stats.errors} documentos rechazados en {collection}")
+
+        models = index_models(collection)
+        if models:
+            staging.create_indexes(models)
+        staging.rename(collection, dropTarget=True)
+    except Exception:
+        staging.drop()
+        raise
+    stats.finish()
+    logger.info(f"✅ {stats}")
+    return stats
+
+
+def load_all(db, sources=None, chunk_size=DEFAULT_CHUNK_SIZE, parallel=False):
+    """
+    Carga varias colecciones ({colección: CSV}, por defecto SOURCES).
+    Con parallel=True cada colección se carga en su propio hilo (MongoClient es thread-safe).
+    Retorna {colección: LoadStats}.
+    """
+    sources = sources or SOURCES
+    if not parallel:
+        return {c: load_collection(db, c, path, chunk_size) for c, path in sources.items()}
+    with ThreadPoolExecutor(max_workers=len(sources)) as pool:
+        futures = {c: pool.submit(load_collection, db, c, path, chunk_size) for c, path in sources.items()}
+        return {c: future.result() for c, future in futures.items()}
+
+
+def backfill_derived(db, collection, chunk_size=DEFAULT_CHUNK_SIZE):
+    """
+    Recalcula los campos derivados (DERIVED) de los documentos ya cargados,
+    p. ej. Nombre_Busqueda en pacientes cargados antes de existir ese campo.
+    """
+    derive = DERIVED[collection]
+    stats = LoadStats(collection)
+    for chunk in iter_chunks(db[collection].find({}), chunk_size):
+        requests = []
+        for doc in chunk:
+            before = dict(doc)
+            derive(doc)
+            changes = {k: v for k, v in doc.items() if before.get(k) != v}
+            if changes:
+                requests.append(UpdateOne({'_id': doc['_id']}, {'$set': changes}))
+        if requests:
+            stats.documents += db[collection].bulk_write(requests, ordered=False).modified_count
+        stats.batches += 1
+    stats.finish()
+    logger.info(f"✅ Campos derivados: {stats}")
+    return stats
+
+
+if __name__ == "__main__":
+    # python -m MongoDB.loader [--parallel] [--chunk-size N]
+    # python -m MongoDB.loader --backfill-derived
+    from connect import MongoDBConnection
+
+    logging.basicConfig(level=logging.INFO)
+    chunk_size = DEFAULT_CHUNK_SIZE
+    if '--chunk-size' in sys.argv:
+        chunk_size = int(sys.argv[sys.argv.index('--chunk-size') + 1])
+
+    conn = MongoDBConnection()
+    conn.connect()
+    try:
+        if '--backfill-derived' in sys.argv:
+            for collection in DERIVED:
+                print(backfill_derived(conn.get_db(), collection, chunk_size))
+            sys.exit(0)
+        for stats in load_all(conn.get_db(), chunk_size=chunk_size, parallel='--parallel' in sys.argv).values():
+            print(stats)
+    finally:
+        conn.release()
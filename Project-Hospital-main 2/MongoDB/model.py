@@ -1,9 +1,51 @@
 from connect import MongoDBConnection
+from MongoDB.indexes import TEXT_SEARCH, verify_query_plans
+from MongoDB.projections import TRATAMIENTOS, top_diagnosticos
+from MongoDB.schema import normalize_text, search_tokens
+from MongoDB.setup import pending_setup, warn_pending
+from MongoDB.stock import STOCK_BAJO, dispensar, reabastecer
 from datetime import datetime
 import logging
+import os
+import re
 
 logger = logging.getLogger(__name__)
 
+# 1 = al conectar, verificar que las consultas calientes no hagan COLLSCAN
+SELF_CHECK = os.getenv('MONGO_SELF_CHECK', '0') == '1'
+
+
+def query_pacientes_con_tratamiento(medicamento_nombre):
+    """Prefijo del nombre normalizado del medicamento sobre la proyección (usa su índice)"""
+    clave = normalize_text(medicamento_nombre)
+    if not clave:
+        return None
+    return {'Medicamento': {'$regex': '^' + re.escape(clave)}}
+
+
+def query_pacientes_por_nombre(texto):
+    """
+    Cada palabra del texto debe ser prefijo de alguna palabra de nombre o apellido
+    ('car hern' encuentra a Carlos Hernández). La entrada se normaliza y se escapa,
+    y el prefijo anclado (^) permite usar el índice sobre Nombre_Busqueda.
+    """
+    tokens = search_tokens(texto)
+    if not tokens:
+        return None
+    return {'$and': [{'Nombre_Busqueda': {'$regex': '^' + re.escape(t)}} for t in tokens]}
+
+
+PROYECCION_BUSQUEDA = {'_id': 0, 'Paciente_ID': 1, 'Nombre': 1, 'Apellido': 1, 'Telefono': 1}
+
+PROYECCION_PACIENTES = {
+    '_id': 0, 'Paciente_ID': 1, 'Nombre': 1, 'Apellido': 1,
+    'Telefono': 1, 'Domicilio.Ciudad': 1, 'Fecha_de_Nacimiento': 1
+}
+
+# documentos por ida y vuelta al servidor en los generadores iter_*
+DEFAULT_BATCH_SIZE = int(os.getenv('MONGO_BATCH_SIZE', '500'))
+
+
 class HospitalModel:
     def __init__(self):
         self.conn = MongoDBConnection()
@@ -12,20 +54,44 @@ class HospitalModel:
     def connect(self):
         if self.conn.connect():
             self.db = self.conn.get_db()
+            warn_pending(pending_setup(self.db))
+            if SELF_CHECK:
+                verify_query_plans(self.db)
             return True
         return False
     
     def close(self):
         if self.conn:
-            self.conn.close()
+            self.conn.release()
     
     #  PACIENTES
 
+    def _page(self, collection, key, projection, after, limit, query=None):
+        """
+        Paginación por llave (keyset) sobre un campo con índice único: devuelve
+        (documentos, after de la siguiente página o None si no hay más).
+        `query` filtra además los documentos (p. ej. la búsqueda por nombre).
+        """
+        if after is not None:
+            query = {'$and': [query, {key: {'$gt': after}}]} if query else {key: {'$gt': after}}
+        docs = list(self.db[collection].find(query or {}, projection).sort(key, 1).limit(limit + 1))
+        if len(docs) > limit:
+            return docs[:limit], docs[limit - 1][key]
+        return docs, None
+
+    def _iter(self, collection, key, projection, batch_size):
+        return self.db[collection].find({}, projection).sort(key, 1).batch_size(batch_size)
+
     def get_all_pacientes(self):
-        return list(self.db.pacientes.find({}, {
-            '_id': 0, 'Paciente_ID': 1, 'Nombre': 1, 'Apellido': 1,
-            'Telefono': 1, 'Domicilio.Ciudad': 1, 'Fecha_de_Nacimiento': 1
-        }))
+        return list(self.iter_pacientes())
+
+    def get_pacientes_page(self, after=None, limit=20):
+        """Pacientes ordenados por Paciente_ID a partir de `after` (exclusivo)"""
+        return self._page('pacientes', 'Paciente_ID', PROYECCION_PACIENTES, after, limit)
+
+    def iter_pacientes(self, batch_size=DEFAULT_BATCH_SIZE):
+        """Generador sobre todos los pacientes; en memoria solo queda un lote del cursor"""
+        yield from self._iter('pacientes', 'Paciente_ID', PROYECCION_PACIENTES, batch_size)
 
     def get_paciente_by_id(self, paciente_id):
         try:
@@ -38,85 +104,99 @@ class HospitalModel:
 
     def get_pacientes_con_alergias(self):
         return list(self.db.pacientes.find(
-            {'Alergias': {'$nin': ['[]', '', None]}}, 
+            {'Alergias.0': {'$exists': True}}, 
             {'_id': 0, 'Paciente_ID': 1, 'Nombre': 1, 'Apellido': 1, 'Alergias': 1}
         )
     )
 
-    def buscar_pacientes_por_nombre(self, texto):
-        return list(self.db.pacientes.find({
-            '$or': [
-                {'Nombre': {'$regex': texto, '$options': 'i'}},
-                {'Apellido': {'$regex': texto, '$options': 'i'}}
-            ]
-        }, {
-            '_id': 0, 'Paciente_ID': 1, 'Nombre': 1, 'Apellido': 1, 'Telefono': 1
-        }))
+    def buscar_pacientes_por_nombre(self, texto, after=None, limit=20):
+        """
+        Búsqueda por prefijo sin acentos ni mayúsculas, paginada por Paciente_ID igual
+        que get_pacientes_page: devuelve (pacientes, after de la siguiente página o None).
+        Una página no repite ni salta pacientes aunque otros se inserten entre páginas.
+        """
+        query = query_pacientes_por_nombre(texto)
+        if query is None:
+            return [], None
+        return self._page('pacientes', 'Paciente_ID', PROYECCION_BUSQUEDA, after, limit, query)
+
+    def buscar_pacientes_por_texto(self, texto, pagina=1, por_pagina=20):
+        """
+        Búsqueda por palabras completas con ranking (textScore); requiere MONGO_TEXT_SEARCH=1.
+        Sin el índice de texto se usa la búsqueda por prefijo. Los empates de score
+        se ordenan por Paciente_ID para que las páginas no cambien entre consultas.
+        """
+        tokens = search_tokens(texto)
+        if not TEXT_SEARCH or not tokens:
+            query = query_pacientes_por_nombre(texto)
+            if query is None:
+                return []
+            return list(self.db.pacientes.find(query, PROYECCION_BUSQUEDA).sort('Paciente_ID', 1)
+                        .skip((pagina - 1) * por_pagina).limit(por_pagina))
+        proyeccion = dict(PROYECCION_BUSQUEDA, score={'$meta': 'textScore'})
+        return list(self.db.pacientes.find({'$text': {'$search': ' '.join(tokens)}}, proyeccion)
+                    .sort([('score', {'$meta': 'textScore'}), ('Paciente_ID', 1)])
+                    .skip((pagina - 1) * por_pagina).limit(por_pagina))
 
     #  MEDICAMENTO
 
     def get_all_medicamentos(self):
-        return list(self.db.medicamentos.find({}, {'_id': 0}))
+        return list(self.iter_medicamentos())
+
+    def get_medicamentos_page(self, after=None, limit=20):
+        """Medicamentos ordenados por Medicamento_ID a partir de `after` (exclusivo)"""
+        return self._page('medicamentos', 'Medicamento_ID', {'_id': 0}, after, limit)
+
+    def iter_medicamentos(self, batch_size=DEFAULT_BATCH_SIZE):
+        yield from self._iter('medicamentos', 'Medicamento_ID', {'_id': 0}, batch_size)
 
     def get_medicamentos_por_principio(self, principio):
         return list(self.db.medicamentos.find({
             'Principio_Activo': {'$regex': principio, '$options': 'i'}
         }, {'_id': 0, 'Medicamento_ID': 1, 'Nombre': 1, 'Dosis': 1, 'Stock': 1}))
 
-    def get_medicamentos_bajo_stock(self, limite=20):
+    def get_medicamentos_bajo_stock(self, limite=STOCK_BAJO):
+        """
+        Con limite <= STOCK_BAJO la consulta solo recorre el índice parcial stock_bajo
+        """
         return list(self.db.medicamentos.find({
             'Stock': {'$lte': limite}
         }, {'_id': 0}).sort('Stock', 1))
 
+    def dispensar_medicamento(self, medicamento_id, cantidad):
+        """Descuenta stock de forma atómica; None si no existe o no alcanza"""
+        return dispensar(self.db, medicamento_id, cantidad)
+
+    def reabastecer_medicamento(self, medicamento_id, cantidad):
+        return reabastecer(self.db, medicamento_id, cantidad)
+
     #  EXPEDIENTES
 
     def get_expediente_by_paciente_id(self, paciente_id):
         try:
             return self.db.expedientes.find_one(
-                {'Paciente_ID': int(paciente_id)},
+                {'Paciente_ID': str(paciente_id)},
                 {'_id': 0}
             )
         except:
             return None
 
-    def get_diagnosticos_frecuentes(self, limite=5):
-        pipeline = [
-            {'$unwind': '$Diagnosticos'},
-            {'$group': {
-                '_id': '$Diagnosticos',
-                'cantidad': {'$sum': 1}
-            }},
-            {'$sort': {'cantidad': -1}},
-            {'$limit': limite}
-        ]
-        return list(self.db.expedientes.aggregate(pipeline))
+    def get_diagnosticos_frecuentes(self, limite=5, dias=None):
+        """
+        Top de diagnósticos desde los contadores de MongoDB.projections;
+        con `dias` solo cuenta expedientes creados en esa ventana
+        """
+        return [{'_id': d['Nombre'], 'cantidad': d['cantidad']}
+                for d in top_diagnosticos(self.db, limite, dias)]
 
     def get_pacientes_con_tratamiento(self, medicamento_nombre):
-        pipeline = [
-            {'$match': {'Tratamientos.medicamento': {'$regex': medicamento_nombre, '$options': 'i'}}},
-            {'$lookup': {
-                'from': 'pacientes',
-                'localField': 'Paciente_ID',
-                'foreignField': 'Paciente_ID',
-                'as': 'paciente_info'
-            }},
-            {'$unwind': '$paciente_info'},
-            {'$project': {
-                '_id': 0,
-                'Paciente_ID': 1,
-                'Nombre': '$paciente_info.Nombre',
-                'Apellido': '$paciente_info.Apellido',
-                'Tratamiento': {
-                    '$filter': {
-                        'input': '$Tratamientos',
-                        'as': 't',
-                        'cond': {'$regexMatch': {
-                            'input': '$$t.medicamento',
-                            'regex': medicamento_nombre,
-                            'options': 'i'
-                        }}
-                    }
-                }
-            }}
-        ]
-        return list(self.db.expedientes.aggregate(pipeline))
\ No newline at end of file
+        """
+        Pacientes que toman un medicamento, leídos de la proyección
+        tratamientos_por_medicamento (ver MongoDB.projections)
+        """
+        query = query_pacientes_con_tratamiento(medicamento_nombre)
+        if query is None:
+            return []
+        return list(self.db[TRATAMIENTOS].find(query, {
+            '_id': 0, 'Paciente_ID': 1, 'Nombre': 1, 'Apellido': 1, 'Tratamiento': 1
+        }))
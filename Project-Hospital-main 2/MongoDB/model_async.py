@@ -0,0 +1,159 @@
+from motor.motor_asyncio import AsyncIOMotorClient
+from pymongo import DESCENDING
+import logging
+
+from connect import MONGO_MAX_POOL_SIZE, MONGO_MIN_POOL_SIZE, MONGO_URI
+from MongoDB.indexes import TEXT_SEARCH
+from MongoDB.model import (DEFAULT_BATCH_SIZE, PROYECCION_BUSQUEDA, PROYECCION_PACIENTES,
+                           query_pacientes_con_tratamiento, query_pacientes_por_nombre)
+from MongoDB.projections import DIAGNOSTICOS, DIAGNOSTICOS_DIA, TRATAMIENTOS, pipeline_top_diagnosticos
+from MongoDB.schema import search_tokens
+from MongoDB.setup import SETUP_STATE, pending_steps, warn_pending
+from MongoDB.stock import STOCK_BAJO, dispensar, reabastecer
+
+logger = logging.getLogger(__name__)
+
+
+class AsyncHospitalModel:
+    """
+    Versión asyncio de HospitalModel (mismas consultas, mismos resultados) sobre Motor.
+    Cada método es una corrutina, así muchas consultas pueden estar en vuelo a la vez
+    en un mismo event loop. El cliente queda ligado al loop en el que se usa por
+    primera vez, por eso no se comparte a través de connect.connections.
+    Índices y proyecciones (tratamientos, diagnósticos) los crea MongoDB.setup;
+    connect() solo avisa si falta algún paso, igual que HospitalModel.
+    """
+
+    def __init__(self):
+        self.client = None
+        self.db = None
+
+    async def connect(self):
+        try:
+            self.client = AsyncIOMotorClient(
+                MONGO_URI,
+                minPoolSize=MONGO_MIN_POOL_SIZE,
+                maxPoolSize=MONGO_MAX_POOL_SIZE,
+                serverSelectionTimeoutMS=5000
+            )
+            await self.client.admin.command('ping')
+            self.db = self.client['Hospital']
+            state = {doc['_id']: doc async for doc in self.db[SETUP_STATE].find()}
+            warn_pending(pending_steps(state))
+            logger.info("✅ Conexión asíncrona exitosa a MongoDB")
+            return True
+        except Exception as e:
+            logger.error(f"❌ Error conectando a MongoDB (async): {e}")
+            self.close()
+            return False
+
+    def close(self):
+        if self.client is not None:
+            self.client.close()
+        self.client = None
+        self.db = None
+
+    #  PACIENTES
+
+    async def _page(self, collection, key, projection, after, limit, query=None):
+        if after is not None:
+            query = {'$and': [query, {key: {'$gt': after}}]} if query else {key: {'$gt': after}}
+        docs = await self.db[collection].find(query or {}, projection).sort(key, 1).limit(limit + 1).to_list(None)
+        if len(docs) > limit:
+            return docs[:limit], docs[limit - 1][key]
+        return docs, None
+
+    async def _iter(self, collection, key, projection, batch_size):
+        async for doc in self.db[collection].find({}, projection).sort(key, 1).batch_size(batch_size):
+            yield doc
+
+    async def get_all_pacientes(self):
+        return [p async for p in self.iter_pacientes()]
+
+    async def get_pacientes_page(self, after=None, limit=20):
+        return await self._page('pacientes', 'Paciente_ID', PROYECCION_PACIENTES, after, limit)
+
+    def iter_pacientes(self, batch_size=DEFAULT_BATCH_SIZE):
+        """Generador asíncrono: async for p in model.iter_pacientes()"""
+        return self._iter('pacientes', 'Paciente_ID', PROYECCION_PACIENTES, batch_size)
+
+    async def get_paciente_by_id(self, paciente_id):
+        try:
+            return await self.db.pacientes.find_one({'Paciente_ID': str(paciente_id)}, {'_id': 0})
+        except Exception:
+            return None
+
+    async def get_pacientes_con_alergias(self):
+        return await self.db.pacientes.find(
+            {'Alergias.0': {'$exists': True}},
+            {'_id': 0, 'Paciente_ID': 1, 'Nombre': 1, 'Apellido': 1, 'Alergias': 1}
+        ).to_list(None)
+
+    async def buscar_pacientes_por_nombre(self, texto, after=None, limit=20):
+        query = query_pacientes_por_nombre(texto)
+        if query is None:
+            return [], None
+        return await self._page('pacientes', 'Paciente_ID', PROYECCION_BUSQUEDA, after, limit, query)
+
+    async def buscar_pacientes_por_texto(self, texto, pagina=1, por_pagina=20):
+        tokens = search_tokens(texto)
+        if not TEXT_SEARCH or not tokens:
+            query = query_pacientes_por_nombre(texto)
+            if query is None:
+                return []
+            return await (self.db.pacientes.find(query, PROYECCION_BUSQUEDA).sort('Paciente_ID', 1)
+                          .skip((pagina - 1) * por_pagina).limit(por_pagina).to_list(None))
+        proyeccion = dict(PROYECCION_BUSQUEDA, score={'$meta': 'textScore'})
+        return await (self.db.pacientes.find({'$text': {'$search': ' '.join(tokens)}}, proyeccion)
+                      .sort([('score', {'$meta': 'textScore'}), ('Paciente_ID', 1)])
+                      .skip((pagina - 1) * por_pagina).limit(por_pagina).to_list(None))
+
+    #  MEDICAMENTO
+
+    async def get_all_medicamentos(self):
+        return [m async for m in self.iter_medicamentos()]
+
+    async def get_medicamentos_page(self, after=None, limit=20):
+        return await self._page('medicamentos', 'Medicamento_ID', {'_id': 0}, after, limit)
+
+    def iter_medicamentos(self, batch_size=DEFAULT_BATCH_SIZE):
+        return self._iter('medicamentos', 'Medicamento_ID', {'_id': 0}, batch_size)
+
+    async def get_medicamentos_por_principio(self, principio):
+        return await self.db.medicamentos.find({
+            'Principio_Activo': {'$regex': principio, '$options': 'i'}
+        }, {'_id': 0, 'Medicamento_ID': 1, 'Nombre': 1, 'Dosis': 1, 'Stock': 1}).to_list(None)
+
+    async def get_medicamentos_bajo_stock(self, limite=STOCK_BAJO):
+        return await self.db.medicamentos.find({'Stock': {'$lte': limite}}, {'_id': 0}).sort('Stock', 1).to_list(None)
+
+    async def dispensar_medicamento(self, medicamento_id, cantidad):
+        # con Motor las funciones de MongoDB.stock devuelven la corrutina de find_one_and_update
+        return await dispensar(self.db, medicamento_id, cantidad)
+
+    async def reabastecer_medicamento(self, medicamento_id, cantidad):
+        return await reabastecer(self.db, medicamento_id, cantidad)
+
+    #  EXPEDIENTES
+
+    async def get_expediente_by_paciente_id(self, paciente_id):
+        try:
+            return await self.db.expedientes.find_one({'Paciente_ID': str(paciente_id)}, {'_id': 0})
+        except Exception:
+            return None
+
+    async def get_diagnosticos_frecuentes(self, limite=5, dias=None):
+        if dias is None:
+            docs = await (self.db[DIAGNOSTICOS].find({}, {'_id': 0, 'Nombre': 1, 'cantidad': 1})
+                          .sort('cantidad', DESCENDING).limit(limite).to_list(None))
+        else:
+            docs = await self.db[DIAGNOSTICOS_DIA].aggregate(pipeline_top_diagnosticos(limite, dias)).to_list(None)
+        return [{'_id': d['Nombre'], 'cantidad': d['cantidad']} for d in docs]
+
+    async def get_pacientes_con_tratamiento(self, medicamento_nombre):
+        query = query_pacientes_con_tratamiento(medicamento_nombre)
+        if query is None:
+            return []
+        return await self.db[TRATAMIENTOS].find(query, {
+            '_id': 0, 'Paciente_ID': 1, 'Nombre': 1, 'Apellido': 1, 'Tratamiento': 1
+        }).to_list(None)
@@ -0,0 +1,338 @@
+from collections import Counter
+from datetime import datetime, timedelta
+import logging
+import sys
+
+from pymongo import DESCENDING, UpdateOne
+
+from common import iter_chunks
+from connect import replica_set_name
+from MongoDB.indexes import index_models
+from MongoDB.loader import DEFAULT_CHUNK_SIZE, STAGING_SUFFIX, LoadStats
+from MongoDB.schema import normalize_text
+from MongoDB.setup import is_done, mark_done
+
+logger = logging.getLogger(__name__)
+
+#  PROYECCION MEDICAMENTO -> PACIENTES
+#  Un documento por (medicamento normalizado, expediente) con los datos del paciente
+#  y los tratamientos de ese medicamento; responde "¿quién toma X?" con una lectura
+#  por índice en lugar de $match + $lookup + $filter sobre expedientes.
+
+TRATAMIENTOS = 'tratamientos_por_medicamento'
+
+#  FRECUENCIA DE DIAGNOSTICOS
+#  Contadores por diagnóstico normalizado (total y por día de Fecha_Creacion) más
+#  la contribución de cada expediente, para poder aplicar diferencias al modificarlo.
+
+DIAGNOSTICOS = 'diagnosticos_frecuencia'
+DIAGNOSTICOS_DIA = 'diagnosticos_por_dia'
+DIAGNOSTICOS_EXPEDIENTE = 'diagnosticos_por_expediente'
+
+# eventos que invalidan la proyección completa (p. ej. el rename del loader)
+REBUILD_EVENTS = ('drop', 'rename', 'dropDatabase', 'invalidate')
+
+
+def tratamiento_entries(expediente, paciente):
+    """Documentos de la proyección para un expediente; `paciente` puede ser None"""
+    por_medicamento = {}
+    for t in expediente.get('Tratamientos') or []:
+        clave = normalize_text(t.get('medicamento'))
+        if clave:
+            por_medicamento.setdefault(clave, []).append(t)
+    paciente = paciente or {}
+    return [{
+        'Medicamento': clave,
+        'Expediente': expediente['_id'],
+        'Paciente_ID': expediente.get('Paciente_ID'),
+        'Nombre': paciente.get('Nombre'),
+        'Apellido': paciente.get('Apellido'),
+        'Tratamiento': tratamientos,
+    } for clave, tratamientos in por_medicamento.items()]
+
+
+def _pacientes_por_id(db, ids):
+    return {p['Paciente_ID']: p for p in db.pacientes.find(
+        {'Paciente_ID': {'$in': list(ids)}}, {'_id': 0, 'Paciente_ID': 1, 'Nombre': 1, 'Apellido': 1})}
+
+
+def rebuild_tratamientos(db, chunk_size=DEFAULT_CHUNK_SIZE):
+    """
+    Reconstruye la proyección desde expedientes en una colección de staging y
+    la reemplaza con rename, igual que MongoDB.loader.load_collection.
+    """
+    stats = LoadStats(TRATAMIENTOS)
+    staging = db[TRATAMIENTOS + STAGING_SUFFIX]
+    staging.drop()
+    try:
+        cursor = db.expedientes.find({}, {'Paciente_ID': 1, 'Tratamientos': 1})
+        for chunk in iter_chunks(cursor, chunk_size):
+            pacientes = _pacientes_por_id(db, {e.get('Paciente_ID') for e in chunk})
+            entries = [doc for e in chunk for doc in tratamiento_entries(e, pacientes.get(e.get('Paciente_ID')))]
+            if entries:
+                stats.documents += len(staging.insert_many(entries, ordered=False).inserted_ids)
+            stats.batches += 1
+        staging.create_indexes(index_models(TRATAMIENTOS))
+        staging.rename(TRATAMIENTOS, dropTarget=True)
+    except Exception:
+        staging.drop()
+        raise
+    stats.finish()
+    mark_done(db, TRATAMIENTOS, documentos=stats.documents)
+    logger.info(f"✅ Proyección reconstruida: {stats}")
+    return stats
+
+
+def ensure_tratamientos(db):
+    """
+    Construye la proyección si nunca se construyó (base cargada antes de este cambio).
+    Se decide por la marca en setup_state, no por si está vacía: una proyección
+    vacía porque no hay tratamientos no se reconstruye en cada setup.
+    """
+    if not is_done(db, TRATAMIENTOS):
+        rebuild_tratamientos(db)
+
+
+def _dia(fecha):
+    return datetime(fecha.year, fecha.month, fecha.day) if isinstance(fecha, datetime) else None
+
+
+def diagnostico_contribution(expediente):
+    """
+    Diagnósticos de un expediente como [[clave normalizada, nombre, veces], ...]
+    (lista y no dict: las claves pueden tener puntos) y el día del expediente
+    """
+    nombres, veces = {}, Counter()
+    for d in expediente.get('Diagnosticos') or []:
+        clave = normalize_text(d)
+        if clave:
+            nombres.setdefault(clave, d)
+            veces[clave] += 1
+    return {'Diagnosticos': [[k, nombres[k], veces[k]] for k in sorted(veces)],
+            'Dia': _dia(expediente.get('Fecha_Creacion'))}
+
+
+def _counter_updates(delta, nombres, dia=None):
+    filtro = (lambda clave: {'Diagnostico': clave, 'Dia': dia}) if dia else (lambda clave: {'_id': clave})
+    return [UpdateOne(filtro(clave), {'$inc': {'cantidad': n}, '$setOnInsert': {'Nombre': nombres[clave]}},
+                      upsert=True)
+            for clave, n in delta.items() if n]
+
+
+def _apply_diagnostico_delta(db, old, new):
+    """Aplica la diferencia entre dos contribuciones a los contadores"""
+    nombres = {k: nombre for c in (old, new) if c for k, nombre, _n in c['Diagnosticos']}
+    for contribution, sign in ((old, -1), (new, 1)):
+        if not contribution:
+            continue
+        delta = {k: sign * n for k, _nombre, n in contribution['Diagnosticos']}
+        updates = _counter_updates(delta, nombres)
+        if updates:
+            db[DIAGNOSTICOS].bulk_write(updates, ordered=False)
+        if contribution['Dia'] is not None:
+            updates = _counter_updates(delta, nombres, contribution['Dia'])
+            if updates:
+                db[DIAGNOSTICOS_DIA].bulk_write(updates, ordered=False)
+    db[DIAGNOSTICOS].delete_many({'cantidad': {'$lte': 0}})
+    db[DIAGNOSTICOS_DIA].delete_many({'cantidad': {'$lte': 0}})
+
+
+def count_diagnosticos(db, chunk_size=DEFAULT_CHUNK_SIZE):
+    """
+    Cuenta desde cero sobre expedientes. Retorna (total, por_dia, contribuciones):
+    {clave: [nombre, n]}, {(clave, dia): [nombre, n]} y {oid expediente: contribución}.
+    """
+    total, por_dia, contributions = {}, {}, {}
+    cursor = db.expedientes.find({}, {'Diagnosticos': 1, 'Fecha_Creacion': 1})
+    for chunk in iter_chunks(cursor, chunk_size):
+        for e in chunk:
+            contribution = diagnostico_contribution(e)
+            contributions[e['_id']] = contribution
+            for clave, nombre, n in contribution['Diagnosticos']:
+                total.setdefault(clave, [nombre, 0])[1] += n
+                if contribution['Dia'] is not None:
+                    por_dia.setdefault((clave, contribution['Dia']), [nombre, 0])[1] += n
+    return total, por_dia, contributions
+
+
+def _swap(db, collection, documents, chunk_size=DEFAULT_CHUNK_SIZE):
+    """Escribe `documents` en staging, crea sus índices y reemplaza `collection`"""
+    staging = db[collection + STAGING_SUFFIX]
+    staging.drop()
+    try:
+        for chunk in iter_chunks(documents, chunk_size):
+            staging.insert_many(chunk, ordered=False)
+        models = index_models(collection)
+        if models:
+            staging.create_indexes(models)
+        staging.rename(collection, dropTarget=True)
+    except Exception:
+        staging.drop()
+        raise
+
+
+def rebuild_diagnosticos(db, chunk_size=DEFAULT_CHUNK_SIZE):
+    """Recalcula los contadores de diagnósticos desde cero"""
+    stats = LoadStats(DIAGNOSTICOS)
+    total, por_dia, contributions = count_diagnosticos(db, chunk_size)
+    _swap(db, DIAGNOSTICOS_EXPEDIENTE,
+          ({'_id': oid, 'Diagnosticos': c['Diagnosticos'], 'Dia': c['Dia']} for oid, c in contributions.items()),
+          chunk_size)
+    _swap(db, DIAGNOSTICOS_DIA,
+          ({'Diagnostico': clave, 'Dia': dia, 'Nombre': nombre, 'cantidad': n}
+           for (clave, dia), (nombre, n) in por_dia.items()), chunk_size)
+    _swap(db, DIAGNOSTICOS,
+          ({'_id': clave, 'Nombre': nombre, 'cantidad': n} for clave, (nombre, n) in total.items()), chunk_size)
+    stats.documents = len(contributions)
+    stats.finish()
+    mark_done(db, DIAGNOSTICOS, expedientes=stats.documents)
+    logger.info(f"✅ Contadores de diagnósticos reconstruidos: {stats}")
+    return stats
+
+
+def verify_diagnosticos(db):
+    """
+    Compara los contadores guardados con un conteo desde cero.
+    Retorna {clave: (guardado, real)} solo con las diferencias.
+    """
+    total, _por_dia, _contributions = count_diagnosticos(db)
+    stored = {d['_id']: d['cantidad'] for d in db[DIAGNOSTICOS].find({}, {'cantidad': 1})}
+    return {k: (stored.get(k, 0), total[k][1] if k in total else 0)
+            for k in set(stored) | set(total)
+            if stored.get(k, 0) != (total[k][1] if k in total else 0)}
+
+
+def ensure_diagnosticos(db):
+    """Construye los contadores si nunca se construyeron (marca en setup_state)"""
+    if not is_done(db, DIAGNOSTICOS):
+        rebuild_diagnosticos(db)
+
+
+def pipeline_top_diagnosticos(limite, dias):
+    """Suma los contadores diarios de los últimos `dias` días y ordena"""
+    desde = _dia(datetime.now()) - timedelta(days=dias - 1)
+    return [
+        {'$match': {'Dia': {'$gte': desde}}},
+        {'$group': {'_id': '$Diagnostico', 'Nombre': {'$first': '$Nombre'}, 'cantidad': {'$sum': '$cantidad'}}},
+        {'$sort': {'cantidad': -1}},
+        {'$limit': limite},
+        {'$project': {'_id': 0, 'Nombre': 1, 'cantidad': 1}},
+    ]
+
+
+def top_diagnosticos(db, limite=5, dias=None):
+    """
+    Diagnósticos más frecuentes. Sin `dias` es una lectura ordenada por índice;
+    con `dias` suma los contadores diarios de la ventana (p. ej. dias=30).
+    """
+    if dias is None:
+        return list(db[DIAGNOSTICOS].find({}, {'_id': 0, 'Nombre': 1, 'cantidad': 1})
+                    .sort('cantidad', DESCENDING).limit(limite))
+    return list(db[DIAGNOSTICOS_DIA].aggregate(pipeline_top_diagnosticos(limite, dias)))
+
+
+def rebuild_projections(db):
+    rebuild_tratamientos(db)
+    rebuild_diagnosticos(db)
+
+
+#  MANTENIMIENTO INCREMENTAL (hooks de escritura y change stream)
+
+def refresh_expediente(db, expediente):
+    """Actualiza las proyecciones tras insertar o modificar un expediente"""
+    db[TRATAMIENTOS].delete_many({'Expediente': expediente['_id']})
+    paciente = db.pacientes.find_one({'Paciente_ID': expediente.get('Paciente_ID')},
+                                     {'_id': 0, 'Nombre': 1, 'Apellido': 1})
+    entries = tratamiento_entries(expediente, paciente)
+    if entries:
+        db[TRATAMIENTOS].insert_many(entries)
+
+    new = diagnostico_contribution(expediente)
+    old = db[DIAGNOSTICOS_EXPEDIENTE].find_one_and_replace(
+        {'_id': expediente['_id']}, new, upsert=True)
+    if old is None or old['Diagnosticos'] != new['Diagnosticos'] or old['Dia'] != new['Dia']:
+        _apply_diagnostico_delta(db, old, new)
+
+
+def remove_expediente(db, expediente_oid):
+    db[TRATAMIENTOS].delete_many({'Expediente': expediente_oid})
+    old = db[DIAGNOSTICOS_EXPEDIENTE].find_one_and_delete({'_id': expediente_oid})
+    if old is not None:
+        _apply_diagnostico_delta(db, old, None)
+
+
+def refresh_paciente(db, paciente):
+    """Propaga a la proyección un cambio de nombre/apellido del paciente"""
+    db[TRATAMIENTOS].update_many({'Paciente_ID': paciente.get('Paciente_ID')},
+                                 {'$set': {'Nombre': paciente.get('Nombre'), 'Apellido': paciente.get('Apellido')}})
+
+
+def apply_change(db, change):
+    """
+    Aplica un evento del change stream de la base. Retorna True si hubo que
+    reconstruir la proyección completa.
+    """
+    op = change['operationType']
+    coll = change.get('ns', {}).get('coll')
+    if op in REBUILD_EVENTS:
+        target = change.get('to', {}).get('coll') if op == 'rename' else coll
+        if op in ('dropDatabase', 'invalidate') or target == 'expedientes':
+            rebuild_projections(db)
+            return True
+        if target == 'pacientes':
+            rebuild_tratamientos(db)
+            return True
+        return False
+
+    doc = change.get('fullDocument')
+    if coll == 'expedientes':
+        if op == 'delete' or doc is None:
+            remove_expediente(db, change['documentKey']['_id'])
+        else:
+            refresh_expediente(db, doc)
+    elif coll == 'pacientes' and doc is not None:
+        refresh_paciente(db, doc)
+    return False
+
+
+def watch_projections(db, stop=None):
+    """
+    Mantiene la proyección al día con un change stream sobre la base (requiere
+    replica set). `stop` es un threading.Event opcional para terminar.
+    """
+    if replica_set_name(db.client) is None:
+        raise RuntimeError("watch_projections requiere replica set (change streams); en un servidor "
+                           "standalone las proyecciones solo se actualizan al reconstruirlas")
+    pipeline = [{'$match': {'$or': [
+        {'ns.coll': {'$in': ['expedientes', 'pacientes']}},
+        {'operationType': {'$in': list(REBUILD_EVENTS)}},
+    ]}}]
+    with db.watch(pipeline, full_document='updateLookup') as stream:
+        logger.info(f"✅ Escuchando cambios para {TRATAMIENTOS} y {DIAGNOSTICOS}")
+        while stream.alive and not (stop is not None and stop.is_set()):
+            change = stream.try_next()
+            if change is not None:
+                apply_change(db, change)
+
+
+if __name__ == "__main__":
+    # python -m MongoDB.projections            -> reconstruye las proyecciones
+    # python -m MongoDB.projections --watch    -> las mantiene con un change stream
+    # python -m MongoDB.projections --verify   -> compara los contadores de diagnósticos con un conteo nuevo
+    from connect import MongoDBConnection
+
+    logging.basicConfig(level=logging.INFO)
+    conn = MongoDBConnection()
+    conn.connect()
+    try:
+        if '--watch' in sys.argv:
+            watch_projections(conn.get_db())
+        elif '--verify' in sys.argv:
+            diferencias = verify_diagnosticos(conn.get_db())
+            for clave, (guardado, real) in diferencias.items():
+                print(f"{clave}: guardado={guardado} real={real}")
+            sys.exit(1 if diferencias else 0)
+        else:
+            rebuild_projections(conn.get_db())
+    finally:
+        conn.release()
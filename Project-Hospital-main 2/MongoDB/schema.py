@@ -0,0 +1,106 @@
+from datetime import datetime
+import ast
+import logging
+import re
+import unicodedata
+
+logger = logging.getLogger(__name__)
+
+#  CONVERSORES
+
+def _vacio(valor):
+    return valor is None or str(valor).strip() == ''
+
+def to_str(valor):
+    return None if _vacio(valor) else str(valor).strip()
+
+def to_int(valor):
+    return None if _vacio(valor) else int(str(valor).strip())
+
+def to_date(valor):
+    """'YYYY-MM-DD' -> datetime (BSON date)"""
+    return None if _vacio(valor) else datetime.strptime(str(valor).strip(), '%Y-%m-%d')
+
+def to_list(valor):
+    """Lista (o lista de documentos) escrita como literal de Python/JSON en el CSV"""
+    if _vacio(valor):
+        return []
+    parsed = ast.literal_eval(str(valor).strip())
+    if not isinstance(parsed, (list, tuple)):
+        raise ValueError(f"se esperaba una lista: {valor!r}")
+    return list(parsed)
+
+
+#  TEXTO NORMALIZADO PARA BUSQUEDAS
+
+def normalize_text(valor):
+    """Minúsculas, sin acentos ni espacios repetidos: 'José  Núñez' -> 'jose nunez'"""
+    texto = unicodedata.normalize('NFKD', str(valor or ''))
+    texto = ''.join(c for c in texto if not unicodedata.combining(c))
+    return ' '.join(texto.lower().split())
+
+def search_tokens(valor):
+    """Palabras normalizadas (solo letras y dígitos), sin repetir y en orden"""
+    return list(dict.fromkeys(re.findall(r'[a-z0-9]+', normalize_text(valor))))
+
+
+#  ESQUEMAS POR COLECCION
+#  Columnas sin conversor explícito se guardan como texto.
+
+SCHEMAS = {
+    'pacientes': {
+        'Paciente_ID': to_str,
+        'Fecha_de_Nacimiento': to_date,
+        'Alergias': to_list,
+    },
+    'medicamentos': {
+        'Medicamento_ID': to_int,
+        'Stock': to_int,
+        'Fecha_Vencimiento': to_date,
+    },
+    'expedientes': {
+        'Expediente_ID': to_int,
+        'Paciente_ID': to_str,
+        'Fecha_Creacion': to_date,
+        'Citas': to_list,
+        'Diagnosticos': to_list,
+        'Tratamientos': to_list,
+    },
+}
+
+# Campos calculados a partir del documento ya tipado
+def _pacientes_derived(doc):
+    # Nombre_Busqueda: palabras de nombre y apellido para la búsqueda por prefijo
+    doc['Nombre_Busqueda'] = search_tokens(f"{doc.get('Nombre') or ''} {doc.get('Apellido') or ''}")
+
+DERIVED = {
+    'pacientes': _pacientes_derived,
+}
+
+# Columnas con prefijo que se agrupan en un subdocumento: Domicilio_Ciudad -> Domicilio.Ciudad
+NESTED = {
+    'pacientes': ['Domicilio'],
+}
+
+
+def normalize_document(collection, row):
+    """Convierte una fila del CSV (todo texto) al documento tipado de la colección"""
+    schema = SCHEMAS.get(collection, {})
+    prefixes = NESTED.get(collection, [])
+    doc = {}
+    for campo, valor in row.items():
+        if campo == '_id':
+            continue
+        try:
+            valor = schema.get(campo, to_str)(valor)
+        except (ValueError, SyntaxError) as e:
+            raise ValueError(f"{collection}.{campo}: valor inválido {valor!r} ({e})")
+        for prefijo in prefixes:
+            if campo.startswith(prefijo + '_'):
+                doc.setdefault(prefijo, {})[campo[len(prefijo) + 1:]] = valor
+                break
+        else:
+            doc[campo] = valor
+    if collection in DERIVED:
+        DERIVED[collection](doc)
+    return doc
@@ -0,0 +1,80 @@
+from datetime import datetime
+import logging
+
+from connect import replica_set_name
+
+logger = logging.getLogger(__name__)
+
+#  PROVISIONING
+#  Índices (MongoDB.indexes) y proyecciones (MongoDB.projections) se crean aquí,
+#  desde populate.py o con python -m MongoDB.setup, nunca al conectar. Cada paso
+#  deja un documento en setup_state; connect() solo lo lee para avisar si falta algo.
+
+SETUP_STATE = 'setup_state'
+
+
+def mark_done(db, step, **fields):
+    """Registra que `step` ya se ejecutó (con datos extra, p. ej. la huella de los índices)"""
+    db[SETUP_STATE].replace_one({'_id': step}, dict(fields, _id=step, Fecha=datetime.now()), upsert=True)
+
+
+def is_done(db, step):
+    return db[SETUP_STATE].count_documents({'_id': step}, limit=1) > 0
+
+
+def pending_steps(state):
+    """
+    Pasos pendientes según los documentos de setup_state ({_id: documento}).
+    Los índices se comparan por huella: cambia con MONGO_TEXT_SEARCH o MONGO_STOCK_BAJO.
+    """
+    from MongoDB.indexes import index_fingerprint
+    from MongoDB.projections import DIAGNOSTICOS, TRATAMIENTOS
+
+    pending = []
+    if state.get('indexes', {}).get('fingerprint') != index_fingerprint():
+        pending.append('indexes')
+    pending += [step for step in (TRATAMIENTOS, DIAGNOSTICOS) if step not in state]
+    return pending
+
+
+def pending_setup(db):
+    return pending_steps({doc['_id']: doc for doc in db[SETUP_STATE].find()})
+
+
+def warn_pending(pending):
+    if pending:
+        logger.warning(f"⚠️ Base sin provisionar ({', '.join(pending)}): ejecutar python -m MongoDB.setup")
+
+
+def setup(db, rebuild=False):
+    """
+    Crea o actualiza los índices (elimina los obsoletos) y construye las proyecciones
+    que todavía no existen; con rebuild=True las reconstruye siempre (después de una carga).
+    Sin replica set no hay change streams y las proyecciones quedan desactualizadas
+    ante cualquier escritura hasta el siguiente rebuild.
+    """
+    from MongoDB.indexes import ensure_indexes
+    from MongoDB.projections import ensure_diagnosticos, ensure_tratamientos, rebuild_projections
+
+    ensure_indexes(db)
+    if rebuild:
+        rebuild_projections(db)
+    else:
+        ensure_tratamientos(db)
+        ensure_diagnosticos(db)
+    if replica_set_name(db.client) is None:
+        logger.warning("⚠️ MongoDB sin replica set: las proyecciones no se mantienen solas "
+                       "(watch_projections requiere change streams); reconstruir con python -m MongoDB.projections")
+
+
+if __name__ == "__main__":
+    # python -m MongoDB.setup    -> índices y proyecciones de una base ya cargada
+    from connect import MongoDBConnection
+
+    logging.basicConfig(level=logging.INFO)
+    conn = MongoDBConnection()
+    conn.connect()
+    try:
+        setup(conn.get_db())
+    finally:
+        conn.release()
@@ -0,0 +1,115 @@
+import logging
+import os
+import sys
+
+from pymongo import ReturnDocument
+
+logger = logging.getLogger(__name__)
+
+# Un medicamento está en stock bajo cuando Stock <= STOCK_BAJO. El índice parcial
+# de medicamentos (ver MongoDB.indexes) solo contiene esos documentos.
+STOCK_BAJO = int(os.getenv('MONGO_STOCK_BAJO', '50'))
+
+
+def dispensar(db, medicamento_id, cantidad):
+    """
+    Descuenta `cantidad` con un $inc atómico, solo si alcanza el stock.
+    Retorna el documento actualizado o None si no existe o no hay suficiente.
+    """
+    if cantidad <= 0:
+        raise ValueError("la cantidad debe ser positiva")
+    return db.medicamentos.find_one_and_update(
+        {'Medicamento_ID': int(medicamento_id), 'Stock': {'$gte': cantidad}},
+        {'$inc': {'Stock': -cantidad}},
+        projection={'_id': 0},
+        return_document=ReturnDocument.AFTER,
+    )
+
+
+def reabastecer(db, medicamento_id, cantidad):
+    """Suma `cantidad` al stock. Retorna el documento actualizado o None si no existe."""
+    if cantidad <= 0:
+        raise ValueError("la cantidad debe ser positiva")
+    return db.medicamentos.find_one_and_update(
+        {'Medicamento_ID': int(medicamento_id)},
+        {'$inc': {'Stock': cantidad}},
+        projection={'_id': 0},
+        return_document=ReturnDocument.AFTER,
+    )
+
+
+def crossing(anterior, actual, umbral=STOCK_BAJO):
+    """'bajo' si el stock cruzó hacia abajo del umbral, 'repuesto' si volvió a subir, None si no cruzó"""
+    if actual is None:
+        return None
+    if (anterior is None or anterior > umbral) and actual <= umbral:
+        return 'bajo'
+    if anterior is not None and anterior <= umbral < actual:
+        return 'repuesto'
+    return None
+
+
+def log_notification(evento):
+    if evento['tipo'] == 'bajo':
+        logger.warning(f"⚠️ Stock bajo: {evento['Nombre']} (ID {evento['Medicamento_ID']}) "
+                       f"{evento['anterior']} -> {evento['Stock']}")
+    else:
+        logger.info(f"✅ Stock repuesto: {evento['Nombre']} (ID {evento['Medicamento_ID']}) "
+                    f"{evento['anterior']} -> {evento['Stock']}")
+
+
+def _stock_actual(db):
+    return {m['_id']: m.get('Stock') for m in db.medicamentos.find({}, {'Stock': 1})}
+
+
+def watch_stock(db, notify=log_notification, umbral=STOCK_BAJO, stop=None):
+    """
+    Escucha los cambios de medicamentos (change stream, requiere replica set) y
+    llama a notify(evento) cuando un medicamento cruza el umbral en cualquier
+    sentido. El stock anterior se toma de un mapa en memoria que se inicializa
+    con una lectura de la colección (el inventario es pequeño), hecha después de
+    abrir el change stream para que ningún cambio quede entre la lectura y el stream.
+    """
+    pipeline = [{'$match': {'$or': [
+        {'ns.coll': 'medicamentos'},
+        {'operationType': 'rename', 'to.coll': 'medicamentos'},
+    ]}}]
+    with db.watch(pipeline, full_document='updateLookup') as stream:
+        conocido = _stock_actual(db)  # _id -> Stock
+        logger.info(f"✅ Vigilando stock (umbral {umbral})")
+        while stream.alive and not (stop is not None and stop.is_set()):
+            change = stream.try_next()
+            if change is None:
+                continue
+            op = change['operationType']
+            if op == 'rename':
+                # el loader reemplazó la colección: se toma el nuevo estado como base
+                conocido = _stock_actual(db)
+                continue
+            if op == 'delete':
+                conocido.pop(change['documentKey']['_id'], None)
+                continue
+            doc = change.get('fullDocument')
+            if doc is None:
+                continue
+            anterior, actual = conocido.get(doc['_id']), doc.get('Stock')
+            conocido[doc['_id']] = actual
+            tipo = crossing(anterior, actual, umbral)
+            if tipo is not None:
+                notify({'tipo': tipo, 'Medicamento_ID': doc.get('Medicamento_ID'), 'Nombre': doc.get('Nombre'),
+                        'anterior': anterior, 'Stock': actual})
+
+
+if __name__ == "__main__":
+    # python -m MongoDB.stock    -> notifica en el log los cruces del umbral de stock
+    from connect import MongoDBConnection
+
+    logging.basicConfig(level=logging.INFO)
+    conn = MongoDBConnection()
+    conn.connect()
+    try:
+        watch_stock(conn.get_db())
+    except KeyboardInterrupt:
+        sys.exit(0)
+    finally:
+        conn.release()
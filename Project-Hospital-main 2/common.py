@@ -0,0 +1,85 @@
+#-------------------------------------------------------------------------------------------------------
+#UTILIDADES COMPARTIDAS: CONTADORES, TIEMPOS Y LOTES (CASSANDRA, MONGODB, DGRAPH)
+
+from itertools import islice
+import threading
+import time
+
+
+def iter_chunks(items, size):
+    """Agrupa un iterable en listas de a lo más `size` elementos; en memoria queda un lote"""
+    items = iter(items)
+    while True:
+        chunk = list(islice(items, size))
+        if not chunk:
+            return
+        yield chunk
+
+
+class Counters:
+    """
+    Contadores con nombre. Las subclases declaran COUNTERS; todos empiezan en 0.
+    add() suma varios a la vez bajo un lock (para hilos que reportan en paralelo);
+    el repr muestra los contadores en el orden declarado.
+    """
+
+    COUNTERS = ()
+
+    def __init__(self):
+        for name in self.COUNTERS:
+            setattr(self, name, 0)
+        self._lock = threading.Lock()
+
+    def add(self, **counts):
+        with self._lock:
+            for name, n in counts.items():
+                setattr(self, name, getattr(self, name) + n)
+
+    def _fields(self):
+        return [f"{name}={getattr(self, name)}" for name in self.COUNTERS]
+
+    def __repr__(self):
+        return f"{type(self).__name__}({', '.join(self._fields())})"
+
+
+class TimedStats(Counters):
+    """
+    Contadores de una carga o ingesta con su tiempo: `started` al crearse,
+    `finished` con finish() y la tasa por segundo del contador RATE
+    """
+
+    RATE = None
+
+    def __init__(self):
+        super().__init__()
+        self.started = time.perf_counter()
+        self.finished = None
+
+    def finish(self):
+        self.finished = time.perf_counter()
+
+    @property
+    def elapsed(self):
+        end = self.finished if self.finished is not None else time.perf_counter()
+        return end - self.started
+
+    def per_sec(self, counter=None):
+        elapsed = self.elapsed
+        return getattr(self, counter or self.RATE) / elapsed if elapsed > 0 else 0.0
+
+    def _fields(self):
+        return super()._fields() + [f"elapsed={self.elapsed:.2f}s", f"{self.RATE}_per_sec={self.per_sec():.0f}"]
+
+
+class HitStats(Counters):
+    """Contadores de un cache: siempre hits y misses, más los que declare la subclase"""
+
+    COUNTERS = ('hits', 'misses')
+
+    @property
+    def hit_rate(self):
+        total = self.hits + self.misses
+        return self.hits / total if total else 0.0
+
+    def _fields(self):
+        return super()._fields() + [f"hit_rate={self.hit_rate:.2%}"]
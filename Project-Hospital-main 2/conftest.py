@@ -0,0 +1,2 @@
+# Los módulos se importan como en la aplicación (from Cassandra.x import y), desde
+# esta carpeta: pytest la agrega a sys.path por contener este conftest.
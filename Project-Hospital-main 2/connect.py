@@ -1,49 +1,252 @@
 #-------------------------------------------------------------------------------------------------------
-#CONEXION MONGODB
+#CONEXIONES COMPARTIDAS (CASSANDRA, MONGODB, DGRAPH)
+
+import atexit
+import os
+import threading
+import time
 
+from cassandra.cluster import Cluster, EXEC_PROFILE_DEFAULT, ExecutionProfile
+from cassandra.policies import DCAwareRoundRobinPolicy, TokenAwarePolicy
 from pymongo import MongoClient
+from pymongo.errors import OperationFailure
+import pydgraph
 import logging
 
 # Configurar logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# Configuración por variables de entorno
+CASSANDRA_CLUSTER_IPS = os.getenv('CASSANDRA_CLUSTER_IPS', '127.0.0.1')
+CASSANDRA_LOCAL_DC = os.getenv('CASSANDRA_LOCAL_DC', 'datacenter1')
+CASSANDRA_EXECUTOR_THREADS = int(os.getenv('CASSANDRA_EXECUTOR_THREADS', '2'))
+MONGO_URI = os.getenv('MONGO_URI', 'mongodb://localhost:27017/')
+MONGO_MIN_POOL_SIZE = int(os.getenv('MONGO_MIN_POOL_SIZE', '0'))
+MONGO_MAX_POOL_SIZE = int(os.getenv('MONGO_MAX_POOL_SIZE', '100'))
+DGRAPH_ADDRESS = os.getenv('DGRAPH_ADDRESS', 'localhost:9080')
+DGRAPH_STUBS = int(os.getenv('DGRAPH_STUBS', '1'))
+
+# Reintentos de conexión con backoff exponencial
+CONNECT_ATTEMPTS = int(os.getenv('CONNECT_ATTEMPTS', '3'))
+CONNECT_BASE_DELAY = 0.5
+CONNECT_MAX_DELAY = 8.0
+
+
+class ConnectionManager:
+    """
+    Crea bajo demanda y reutiliza una sola conexión por proceso para cada base
+    de datos: Cluster/Session de Cassandra, MongoClient y cliente de Dgraph.
+    """
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._cluster = None
+        self._cassandra_session = None
+        self._cassandra_setups = set()  # setups ya ejecutados sobre la sesión actual
+        self._mongo_client = None
+        self._dgraph_stubs = []
+        self._dgraph_client = None
+
+    def _with_retry(self, name, connect):
+        """Ejecuta connect() reintentando con backoff exponencial"""
+        delay = CONNECT_BASE_DELAY
+        for attempt in range(1, CONNECT_ATTEMPTS + 1):
+            try:
+                return connect()
+            except Exception as e:
+                if attempt == CONNECT_ATTEMPTS:
+                    logger.error(f"❌ {name}: no se pudo conectar después de {attempt} intentos: {e}")
+                    raise
+                logger.warning(f"{name}: intento {attempt} fallido ({e}), reintentando en {delay:.1f}s")
+                time.sleep(delay)
+                delay = min(delay * 2, CONNECT_MAX_DELAY)
+
+    # CASSANDRA
+
+    def get_cassandra_session(self, setup=None):
+        """
+        Retorna la sesión de Cassandra del proceso. `setup(session)` (keyspace,
+        tablas, prepares) se ejecuta una vez por sesión y por función de setup:
+        si la sesión la creó otro llamador sin setup, se ejecuta en esta llamada.
+        Se marca como hecho solo si termina bien, así un fallo se reintenta en la
+        siguiente llamada; una sesión nueva cuyo setup falla se cierra.
+        """
+        with self._lock:
+            if self._cassandra_session is None or self._cassandra_session.is_shutdown:
+                self.close('cassandra')
+                session = self._with_retry('Cassandra', self._connect_cassandra)
+                self._cluster = session.cluster
+                self._cassandra_session = session
+            if setup is not None and setup not in self._cassandra_setups:
+                try:
+                    setup(self._cassandra_session)
+                except Exception:
+                    if not self._cassandra_setups:
+                        # sesión recién creada y sin schema: no se deja para el siguiente llamador
+                        self.close('cassandra')
+                    raise
+                self._cassandra_setups.add(setup)
+            return self._cassandra_session
+
+    def _connect_cassandra(self):
+        # Con protocolo v5 el driver multiplexa requests sobre una conexión por host;
+        # el paralelismo se ajusta con executor_threads y la concurrencia de cada consulta.
+        cluster = Cluster(
+            CASSANDRA_CLUSTER_IPS.split(','),
+            execution_profiles={EXEC_PROFILE_DEFAULT: ExecutionProfile(
+                load_balancing_policy=TokenAwarePolicy(DCAwareRoundRobinPolicy(local_dc=CASSANDRA_LOCAL_DC))
+            )},
+            protocol_version=5,
+            executor_threads=CASSANDRA_EXECUTOR_THREADS,
+        )
+        try:
+            session = cluster.connect()
+        except Exception:
+            cluster.shutdown()
+            raise
+        logger.info("✅ Conexión exitosa a Cassandra")
+        return session
+
+    # MONGODB
+
+    def get_mongo_client(self):
+        """Retorna el MongoClient del proceso (ya incluye su propio pool de conexiones)"""
+        with self._lock:
+            if self._mongo_client is None:
+                self._mongo_client = self._with_retry('MongoDB', self._connect_mongo)
+            return self._mongo_client
+
+    def _connect_mongo(self):
+        client = MongoClient(
+            MONGO_URI,
+            minPoolSize=MONGO_MIN_POOL_SIZE,
+            maxPoolSize=MONGO_MAX_POOL_SIZE,
+            serverSelectionTimeoutMS=5000  # 5 segundos timeout
+        )
+        try:
+            # Probar conexión
+            client.admin.command('ping')
+        except Exception:
+            client.close()
+            raise
+        logger.info("✅ Conexión exitosa a MongoDB")
+        return client
+
+    # DGRAPH
+
+    def get_dgraph_client(self):
+        """Retorna el cliente de Dgraph; con DGRAPH_STUBS > 1 reparte las peticiones entre varios canales gRPC"""
+        with self._lock:
+            if self._dgraph_client is None:
+                self._dgraph_stubs = [pydgraph.DgraphClientStub(DGRAPH_ADDRESS) for _ in range(DGRAPH_STUBS)]
+                self._dgraph_client = pydgraph.DgraphClient(*self._dgraph_stubs)
+            return self._dgraph_client
+
+    # SALUD Y CIERRE
+
+    def health_check(self, reconnect_failed=False):
+        """
+        Verifica las conexiones abiertas. Retorna {backend: True/False};
+        los backends que aún no se han usado no aparecen. Con reconnect_failed=True
+        las conexiones que fallan se cierran (close) para reabrirse en el siguiente uso.
+        """
+        status = {}
+        if self._cassandra_session is not None:
+            status['cassandra'] = self._check('Cassandra', lambda: self._cassandra_session.execute(
+                "SELECT release_version FROM system.local"))
+        if self._mongo_client is not None:
+            status['mongodb'] = self._check('MongoDB', lambda: self._mongo_client.admin.command('ping'))
+        if self._dgraph_client is not None:
+            status['dgraph'] = self._check('Dgraph', lambda: self._dgraph_client.txn(read_only=True).query(
+                "{ q(func: has(dgraph.type), first: 1) { uid } }"))
+        if reconnect_failed:
+            for backend, ok in status.items():
+                if not ok:
+                    self.close(backend)
+        return status
+
+    def _check(self, name, probe):
+        try:
+            probe()
+            return True
+        except Exception as e:
+            logger.warning(f"{name}: health check fallido: {e}")
+            return False
+
+    def close(self, backend):
+        """
+        Cierra la conexión de `backend` ('cassandra', 'mongodb', 'dgraph'). No es
+        definitivo: el siguiente get_* abre una nueva (con backoff).
+        """
+        with self._lock:
+            if backend == 'cassandra' and self._cluster is not None:
+                self._cluster.shutdown()
+                self._cluster = self._cassandra_session = None
+                self._cassandra_setups.clear()
+            elif backend == 'mongodb' and self._mongo_client is not None:
+                self._mongo_client.close()
+                self._mongo_client = None
+            elif backend == 'dgraph' and self._dgraph_client is not None:
+                for stub in self._dgraph_stubs:
+                    stub.close()
+                self._dgraph_stubs = []
+                self._dgraph_client = None
+
+    def close_all(self):
+        """Cierra todas las conexiones del proceso"""
+        for backend in ('cassandra', 'mongodb', 'dgraph'):
+            try:
+                self.close(backend)
+            except Exception as e:
+                logger.warning(f"Error cerrando {backend}: {e}")
+        logger.info(" Conexiones cerradas")
+
+
+connections = ConnectionManager()
+atexit.register(connections.close_all)
+
+#-------------------------------------------------------------------------------------------------------
+#CONEXION MONGODB
+
 class MongoDBConnection:
-    def __init__(self, connection_string="mongodb://localhost:27017/"):
-        self.connection_string = connection_string
+    def __init__(self):
         self.client = None
         self.db = None
-        
+
     def connect(self):
-        """Establece conexión con MongoDB"""
-        self.client = MongoClient(
-            self.connection_string,
-            serverSelectionTimeoutMS=5000  # 5 segundos timeout
-        )
-            
-        # Probar conexión
-        self.client.admin.command('ping')
+        """Establece conexión con MongoDB (reutiliza el cliente compartido del proceso)"""
+        self.client = connections.get_mongo_client()
         self.db = self.client['Hospital']
-        logger.info("✅ Conexión exitosa a MongoDB")
         return True
-    
-    def close(self):
-        """Cierra la conexión"""
-        if self.client:
-            self.client.close()
-            logger.info(" Conexión cerrada")
-    
+
+    def release(self):
+        """
+        Deja de usar el cliente compartido, sin cerrarlo: lo siguen usando los demás
+        modelos del proceso. Se cierra con connections.close('mongodb') o al salir.
+        """
+        self.client = None
+        self.db = None
+
     def get_db(self):
         """Retorna la base de datos"""
         return self.db
 
+
+def replica_set_name(client):
+    """
+    Nombre del replica set (setName de hello; isMaster en servidores anteriores a 4.4.2)
+    o None si el servidor es standalone y no tiene change streams
+    """
+    try:
+        reply = client.admin.command('hello')
+    except OperationFailure:
+        reply = client.admin.command('isMaster')
+    return reply.get('setName')
+
 #-------------------------------------------------------------------------------------------------------
 #CONEXION DE DGRAPH
 
-# DGraph/connect.py
-import pydgraph
-
-# Crear y retornar un cliente Dgraph
+# Retornar el cliente Dgraph compartido del proceso
 def create_client():
-    client_stub = pydgraph.DgraphClientStub("localhost:9080") # Ajusta la dirección y el puerto según tu configuración
-    return pydgraph.DgraphClient(client_stub)
+    return connections.get_dgraph_client()
@@ -1,6 +1,8 @@
 #-------------------------------------------------------------------------------------------------------
 # MONGODB MAIN
 from MongoDB.model import HospitalModel
+from MongoDB.cache import MONGO_CACHE, CachedHospitalModel
+from MongoDB.stock import STOCK_BAJO
 import os
 from datetime import date
 import logging
@@ -9,10 +11,16 @@ import logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 logger = logging.getLogger(__name__)
 
+def formatear_fecha(fecha):
+    """Muestra una fecha (datetime o texto) como YYYY-MM-DD"""
+    if isinstance(fecha, date):
+        return fecha.strftime('%Y-%m-%d')
+    return fecha if fecha else "N/A"
+
 def calcular_edad(fecha_nac):
-    """Calcula la edad a partir de una fecha en formato YYYY-MM-DD"""
+    """Calcula la edad a partir de una fecha (datetime o texto YYYY-MM-DD)"""
     try:
-        nacimiento = date.fromisoformat(fecha_nac)
+        nacimiento = fecha_nac.date() if hasattr(fecha_nac, 'date') else date.fromisoformat(fecha_nac)
         hoy = date.today()
         edad = hoy.year - nacimiento.year - ((hoy.month, hoy.day) < (nacimiento.month, nacimiento.day))
         return edad
@@ -35,11 +43,12 @@ def print_menu_Mongodb():
     print("8. Ver expediente clínico por ID de paciente")
     print("9. Diagnósticos más frecuentes")
     print("10. Pacientes que toman un medicamento específico")
+    print("11. Dispensar medicamento")
     print("0. Salir")
     print("=" * 60)
 
 def main_mongoDB():
-    model = HospitalModel()
+    model = CachedHospitalModel() if MONGO_CACHE else HospitalModel()
     if not model.connect():
         print("ERROR: No se pudo conectar a la base de datos")
         input("Presiona Enter para salir...")
@@ -53,10 +62,14 @@ def main_mongoDB():
             if option == '1':
                 print("\nLISTADO DE PACIENTES")
                 print("-" * 80)
-                pacientes = model.get_all_pacientes()
-                for p in pacientes:
-                    edad = calcular_edad(p['Fecha_de_Nacimiento'])
-                    print(f"ID: {p['Paciente_ID']:<6} | {p['Nombre']} {p['Apellido']:<25} | Edad: {edad:<3} | Tel: {p['Telefono']}")
+                after = None
+                while True:
+                    pacientes, after = model.get_pacientes_page(after, 20)
+                    for p in pacientes:
+                        edad = calcular_edad(p['Fecha_de_Nacimiento'])
+                        print(f"ID: {p['Paciente_ID']:<6} | {p['Nombre']} {p['Apellido']:<25} | Edad: {edad:<3} | Tel: {p['Telefono']}")
+                    if after is None or input("Enter = siguiente página, q = terminar: ").strip().lower() == 'q':
+                        break
                 print("-" * 80)
 
             elif option == '2':
@@ -72,10 +85,10 @@ def main_mongoDB():
                     print(f"Nombre        : {paciente['Nombre']} {paciente['Apellido']}")
                     print(f"Edad          : {edad} años")
                     print(f"Teléfono      : {paciente['Telefono']}")
-                    print(f"Ciudad        : {paciente['Domicilio_Ciudad']}")
+                    print(f"Ciudad        : {paciente.get('Domicilio', {}).get('Ciudad', 'N/A')}")
                     print(f"Género        : {paciente['Genero']}")
                     print(f"Ocupación     : {paciente['Ocupacion']}")
-                    print(f"Alergias      : {(paciente['Alergias']) if paciente['Alergias'] else 'Ninguna'}")
+                    print(f"Alergias      : {', '.join(paciente['Alergias']) if paciente['Alergias'] else 'Ninguna'}")
                     print(f"Emergencia    : {paciente['Datos_emergencia_Nombre']} ({paciente['Datos_emergencia_Parentesco']}) - {paciente['Datos_emergencia_Celular']}")
                     print("-" * 60)
 
@@ -84,30 +97,38 @@ def main_mongoDB():
                 print("-" * 80)
                 pacientes = model.get_pacientes_con_alergias()
                 for p in pacientes:
-                    print(f"ID: {p['Paciente_ID']:<6} | {p['Nombre']} {p['Apellido']:<25} | Alergias: {(p['Alergias'])}")
+                    print(f"ID: {p['Paciente_ID']:<6} | {p['Nombre']} {p['Apellido']:<25} | Alergias: {', '.join(p['Alergias'])}")
                 print("-" * 80)
 
             elif option == '4':
                 texto = input("Buscar por nombre o apellido: ").strip()
                 print(f"\nRESULTADOS PARA: {texto.upper()}")
                 print("-" * 60)
-                pacientes = model.buscar_pacientes_por_nombre(texto)
-                for p in pacientes:
-                    print(f"ID: {p['Paciente_ID']:<6} | {p['Nombre']} {p['Apellido']:<25} | Tel: {p['Telefono']}")
+                after = None
+                while True:
+                    pacientes, after = model.buscar_pacientes_por_nombre(texto, after, 20)
+                    for p in pacientes:
+                        print(f"ID: {p['Paciente_ID']:<6} | {p['Nombre']} {p['Apellido']:<25} | Tel: {p['Telefono']}")
+                    if after is None or input("Enter = siguiente página, q = terminar: ").strip().lower() == 'q':
+                        break
                 print("-" * 60)
 
             elif option == '5':
                 print("\nINVENTARIO DE MEDICAMENTOS")
                 print("-" * 90)
-                meds = model.get_all_medicamentos()
-                for m in meds:
-                    print(f"ID: {m['Medicamento_ID']:<3} | {m['Nombre']:<20} | {m['Principio_Activo']:<25} | Dosis: {m['Dosis']:<8} | Stock: {m['Stock']:<4} | Vence: {m['Fecha_Vencimiento']}")
+                after = None
+                while True:
+                    meds, after = model.get_medicamentos_page(after, 20)
+                    for m in meds:
+                        print(f"ID: {m['Medicamento_ID']:<3} | {m['Nombre']:<20} | {m['Principio_Activo']:<25} | Dosis: {m['Dosis']:<8} | Stock: {m['Stock']:<4} | Vence: {formatear_fecha(m['Fecha_Vencimiento'])}")
+                    if after is None or input("Enter = siguiente página, q = terminar: ").strip().lower() == 'q':
+                        break
                 print("-" * 90)
 
             elif option == '6':
-                print("\nMEDICAMENTOS CON STOCK BAJO (<= 50 unidades)")
+                print(f"\nMEDICAMENTOS CON STOCK BAJO (<= {STOCK_BAJO} unidades)")
                 print("-" * 70)
-                meds = model.get_medicamentos_bajo_stock(50)
+                meds = model.get_medicamentos_bajo_stock()
                 for m in meds:
                     print(f"ID: {m['Medicamento_ID']:<3} | {m['Nombre']:<20} | Stock: {m['Stock']:<4} | Fabricante: {m['Fabricante']}")
                 print("-" * 70)
@@ -129,7 +150,7 @@ def main_mongoDB():
                 else:
                     print(f"\nEXPEDIENTE CLÍNICO - Paciente ID: {pid}")
                     print("-" * 80)
-                    print(f"Fecha creación: {expediente['Fecha_Creacion']}")
+                    print(f"Fecha creación: {formatear_fecha(expediente['Fecha_Creacion'])}")
                     print("\nCITAS:")
                     for c in expediente['Citas']:
                         print(f"  {c['fecha']} - {c['motivo']} ({c['medico']})")
@@ -142,9 +163,10 @@ def main_mongoDB():
                     print("-" * 80)
 
             elif option == '9':
+                dias = input("Últimos N días (Enter = todos): ").strip()
                 print("\nDIAGNÓSTICOS MÁS FRECUENTES")
                 print("-" * 50)
-                diagnosticos = model.get_diagnosticos_frecuentes(10)
+                diagnosticos = model.get_diagnosticos_frecuentes(10, int(dias) if dias.isdigit() else None)
                 for item in diagnosticos:
                     print(f"{item['_id']:<35} | {item['cantidad']} casos")
                 print("-" * 50)
@@ -158,6 +180,20 @@ def main_mongoDB():
                     print(f"ID: {p['Paciente_ID']:<6} | {p['Nombre']} {p['Apellido']:<25} | Tratamiento: {p['Tratamiento']}")
                 print("-" * 70)
 
+            elif option == '11':
+                mid = input("ID del medicamento: ").strip()
+                cantidad = input("Cantidad a dispensar: ").strip()
+                if not mid.isdigit() or not cantidad.isdigit() or int(cantidad) == 0:
+                    print("ID y cantidad deben ser números positivos.")
+                else:
+                    med = model.dispensar_medicamento(int(mid), int(cantidad))
+                    if med is None:
+                        print("Medicamento no encontrado o stock insuficiente.")
+                    else:
+                        print(f"Dispensado. Stock restante de {med['Nombre']}: {med['Stock']}")
+                        if med['Stock'] <= STOCK_BAJO:
+                            print(f"AVISO: stock bajo (<= {STOCK_BAJO} unidades)")
+
             elif option == '0':
                 print("Saliendo del sistema. Hasta luego.")
                 break
@@ -180,17 +216,19 @@ def main_mongoDB():
 import logging
 import os
 import sys
+from datetime import datetime, timedelta, timezone
 
-from cassandra.cluster import Cluster
-from cassandra.cluster import Cluster
-from cassandra.policies import DCAwareRoundRobinPolicy
+from connect import connections
 from Cassandra import model_cass
 
 
 # Read env vars related to Cassandra App
-CLUSTER_IPS = os.getenv('CASSANDRA_CLUSTER_IPS', '127.0.0.1')
 KEYSPACE = os.getenv('CASSANDRA_KEYSPACE', 'cassandra_project')
 REPLICATION_FACTOR = int(os.getenv('CASSANDRA_REPLICATION_FACTOR', '1'))
+# 1 = leer/escribir tambien la tabla particionada por dia (data_by_patient_day)
+USE_DAY_BUCKETS = os.getenv('CASSANDRA_DAY_BUCKETS', '0') == '1'
+# 1 = mantener rollups_by_patient al ingerir y responder Q7/Q9 desde los agregados
+USE_ROLLUPS = os.getenv('CASSANDRA_ROLLUPS', '0') == '1'
 
 def print_menu_Cassandra():
     mm_options = {
@@ -205,25 +243,24 @@ def print_menu_Cassandra():
         8: "Show last N reads by patient (Q8)",
         9: "Show readings by patient (Q9)",
         10: "Show weareable info by patient (Q10)",
-        11: "Exit",
+        11: "Show alerts by patient",
+        12: "Exit",
     }
     for key in mm_options.keys():
         print(key, '--', mm_options[key])
 
-def main_Cassandra():
-
-    cluster = Cluster(
-        CLUSTER_IPS.split(','),
-        load_balancing_policy=DCAwareRoundRobinPolicy(local_dc='datacenter1'),
-        protocol_version=5
-    )
-    session = cluster.connect()
-
+def setup_Cassandra(session):
+    # se ejecuta una sola vez por sesion (la sesion se reutiliza entre entradas al menu)
     model_cass.create_keyspace(session, KEYSPACE, REPLICATION_FACTOR)
-    session = cluster.connect(KEYSPACE)
+    session.set_keyspace(KEYSPACE)
 
     # create tables if needed
     model_cass.create_schema(session)
+    model_cass.prepare_all_statements(session)
+
+def main_Cassandra():
+
+    session = connections.get_cassandra_session(setup=setup_Cassandra)
 
     try:
         while True:
@@ -237,15 +274,21 @@ def main_Cassandra():
 
             if option == 0:
                 print("Populating sample data...")
-                model_cass.bulk_insert(session)
+                model_cass.bulk_insert(session, buckets=USE_DAY_BUCKETS, rollups=USE_ROLLUPS)
                 print("Sample data populated successfully!")
 
             elif option == 1:
                 patient_id = input('Enter patient ID: ')
                 print(f"\nQ1: Show heart rate, steps and spo2 for patient {patient_id}")
-                rows = model_cass.get_data_by_patient(session, patient_id)
-                for r in rows:
-                    print(r)
+                paging_state = None
+                while True:
+                    rows, paging_state = model_cass.get_data_by_patient_page(
+                        session, patient_id, page_size=20, paging_state=paging_state
+                    )
+                    for r in rows:
+                        print(r)
+                    if paging_state is None or input('Enter = next page, q = stop: ').strip().lower() == 'q':
+                        break
 
             elif option == 2:
                 patient_id = input('Enter patient ID: ')
@@ -254,7 +297,7 @@ def main_Cassandra():
                 try:
                     start_dt = start
                     end_dt = end
-                    rows = model_cass.get_readings_by_patient_interval(session, patient_id, start_dt, end_dt)
+                    rows = model_cass.get_readings_by_patient_interval(session, patient_id, start_dt, end_dt, bucketed=USE_DAY_BUCKETS)
                     for r in rows:
                         print(r)
                 except Exception as e:
@@ -263,20 +306,20 @@ def main_Cassandra():
             elif option == 3:
                 patient_id = input('Enter patient ID: ')
                 print(f"\nQ3: Show glucose by patient: {patient_id}")
-                rows = model_cass.get_glucose_by_patient(session, patient_id)
+                rows = model_cass.iter_glucose_by_patient(session, patient_id)
                 for r in rows:
                     print(r)
 
             elif option == 4:
                 ids = input('Enter comma-separated patient IDs: ')
                 patient_list = [i.strip() for i in ids.split(',') if i.strip()]
-                rows = model_cass.get_last_read_by_n_patients(session, patient_list)
-                for r in rows:
-                    print(r)
+                latest = model_cass.get_last_read_by_n_patients(session, patient_list)
+                for pid, r in latest.items():
+                    print(f"{pid}: {r if r is not None else 'no readings'}")
 
             elif option == 5:
                 patient_id = input('Enter patient ID: ')
-                row = model_cass.get_last_read_by_patient(session, patient_id)
+                row = model_cass.get_last_read_by_patient(session, patient_id, bucketed=USE_DAY_BUCKETS)
                 print(row)
 
             elif option == 6:
@@ -284,9 +327,18 @@ def main_Cassandra():
                 if not patient_id:
                     print("Patient ID vacío.")
                 else:
-                    out_rows = model_cass.get_out_of_range_by_patient(session, patient_id)
+                    hours = input('Hours to look back (default 24): ').strip()
+                    try:
+                        hours = float(hours) if hours else 24
+                    except ValueError:
+                        hours = 24
+                    end_dt = datetime.now(timezone.utc).replace(tzinfo=None)
+                    out_rows = model_cass.get_out_of_range_by_patient(
+                        session, patient_id,
+                        start_dt=end_dt - timedelta(hours=hours), end_dt=end_dt, bucketed=USE_DAY_BUCKETS
+                    )
                     if not out_rows:
-                        print(f"No out-of-range readings for patient {patient_id}.")
+                        print(f"No out-of-range readings for patient {patient_id} in the last {hours:g} hours.")
                     else:
                         print(f"Out-of-range readings for patient {patient_id}:")
                         for r in out_rows:
@@ -297,7 +349,7 @@ def main_Cassandra():
                 if not patient_id:
                     print("Patient ID vacío.")
                 else:
-                    stats = model_cass.get_heart_rate_stats(session, patient_id)
+                    stats = model_cass.get_heart_rate_stats(session, patient_id, from_rollups=USE_ROLLUPS)
                     print(f"Heart rate stats for {patient_id}: count={stats['count']}, avg={stats['avg']}, min={stats['min']}, max={stats['max']}")
 
             elif option == 8:
@@ -307,7 +359,7 @@ def main_Cassandra():
                     n_int = int(n)
                 except ValueError:
                     n_int = 10
-                rows = model_cass.get_last_n_reads_by_patient(session, patient_id, n_int)
+                rows = model_cass.get_last_n_reads_by_patient(session, patient_id, n_int, bucketed=USE_DAY_BUCKETS)
                 for r in rows:
                     print(r)
             
@@ -316,7 +368,7 @@ def main_Cassandra():
                 if not patient_id:
                     print("Patient ID vacío.")
                 else:
-                    count = model_cass.get_readings_count_by_patient(session, patient_id)
+                    count = model_cass.get_readings_count_by_patient(session, patient_id, from_rollups=USE_ROLLUPS)
                     print(f"Patient {patient_id} has {count} readings.")
 
             elif option == 10:
@@ -326,28 +378,31 @@ def main_Cassandra():
                     print(r)
 
             elif option == 11:
+                patient_id = input('Enter patient ID: ').strip()
+                if not patient_id:
+                    print("Patient ID vacío.")
+                else:
+                    alerts = model_cass.get_alerts_by_patient(session, patient_id)
+                    if not alerts:
+                        print(f"No alerts for patient {patient_id}.")
+                    for a in alerts:
+                        print(a)
+
+            elif option == 12:
                 print("Exiting application...")
                 break
 
             else:
                 print("Invalid option. Please try again.")
     finally:
-        try:
-            session.shutdown()
-        except Exception:
-            pass
-        try:
-            cluster.shutdown()
-        except Exception:
-            pass
+        # la sesion queda abierta para la siguiente entrada al menu; se cierra al salir del proceso
+        stats = model_cass.get_statement_stats()
+        logger.info(f"Cassandra statements: prepares={stats['prepares']}, executions={stats['executions']}")
 
 #-------------------------------------------------------------------------------------------------------
 #DGRAPH MAIN
 
-from connect import create_client
-from DGraph import model_graph
-
-client = create_client()
+from DGraph import interactions, model_graph
 
 # Consultas de primary doctor, care team, medicines by patient, patients by doctor
 import json
@@ -365,7 +420,8 @@ def main_dgraph():
         print("8. Query: Recomendación de especialista")
         print("9. Query: Búsqueda de contactos de emergencia")
         print("10. Query: Clínicas en las que opera un doctor")
-        print("11. Salir")
+        print("11. Verificar interacciones de un paciente")
+        print("12. Salir")
         op = input("> ")
 
         # Procesar la opción seleccionada con un if-elif-else
@@ -391,6 +447,8 @@ def main_dgraph():
         elif op == "10":
             model_graph.query_clinicas_doctor()
         elif op == "11":
+            interactions.query_interacciones_paciente()
+        elif op == "12":
             break
 
             # Si vas a trabajar con más modulos como Cassandra o MongoDB, puedes modificar la opcion de salir para regresar al menu principal de selección de modulos con algo como esto:
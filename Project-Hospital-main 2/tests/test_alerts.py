@@ -0,0 +1,78 @@
+from datetime import datetime, timedelta, timezone
+
+from cassandra.util import unix_time_from_uuid1, uuid_from_time
+
+from Cassandra.alerts import AlertEngine, RateOfChangeRule, SustainedRule, ThresholdRule, alert_key
+from Cassandra.ingest import Reading
+
+T0 = datetime(2026, 1, 1, 12, 0, tzinfo=timezone.utc)
+
+
+def reading(seconds=0, heart_rate=80, glucose=100, spo2=98, patient_id='P001'):
+    return Reading(patient_id, 'Ana', 100, heart_rate, spo2, glucose,
+                   uuid_from_time(T0 + timedelta(seconds=seconds)))
+
+
+def run(rule, readings):
+    state = {}
+    return [rule.evaluate(r, unix_time_from_uuid1(r.timestmp), state) for r in readings]
+
+
+def test_threshold_above_and_below():
+    high = ThresholdRule('heart_rate', 120)
+    assert high.evaluate(reading(heart_rate=120), 0, {}) is None
+    alert = high.evaluate(reading(heart_rate=121), 0, {})
+    assert alert[:4] == ('heart_rate_high', 121, 120, 'HIGH')
+
+    low = ThresholdRule('spo2', 90, above=False)
+    assert low.evaluate(reading(spo2=90), 0, {}) is None
+    assert low.evaluate(reading(spo2=89), 0, {})[0] == 'spo2_low'
+
+
+def test_threshold_ignores_missing_values():
+    assert ThresholdRule('glucose', 140).evaluate(reading(glucose=None), 0, {}) is None
+
+
+def test_rate_of_change_within_window():
+    rule = RateOfChangeRule('heart_rate', 30, window_seconds=60)
+    results = run(rule, [reading(0, heart_rate=80), reading(30, heart_rate=115), reading(50, heart_rate=120)])
+    assert results[0] is None
+    assert results[1][:3] == ('heart_rate_rate', 115, 30)
+    assert results[2] is None
+
+
+def test_rate_of_change_ignores_old_previous_reading():
+    rule = RateOfChangeRule('heart_rate', 30, window_seconds=60)
+    assert run(rule, [reading(0, heart_rate=80), reading(120, heart_rate=150)]) == [None, None]
+
+
+def test_sustained_fires_once_and_rearms():
+    rule = SustainedRule('heart_rate', 120, duration_seconds=300)
+    values = [(0, 130), (200, 130), (300, 131), (400, 135), (500, 100), (600, 130), (900, 130)]
+    results = run(rule, [reading(s, heart_rate=hr) for s, hr in values])
+    fired = [s for (s, _hr), result in zip(values, results) if result is not None]
+    assert fired == [300, 900]
+
+
+def test_alert_key_is_deterministic_and_distinct_per_rule():
+    r = reading()
+    ts = unix_time_from_uuid1(r.timestmp)
+    assert alert_key(r.timestmp, ts, 0) == alert_key(r.timestmp, ts, 0)
+    assert alert_key(r.timestmp, ts, 0)[1] != alert_key(r.timestmp, ts, 1)[1]
+    assert unix_time_from_uuid1(alert_key(r.timestmp, ts, 0)[1]) == ts
+
+
+def test_engine_state_is_per_patient():
+    engine = AlertEngine([RateOfChangeRule('heart_rate', 30)])
+    assert engine.evaluate(reading(0, heart_rate=80, patient_id='P001')) == []
+    assert engine.evaluate(reading(10, heart_rate=150, patient_id='P002')) == []
+    alerts = engine.evaluate(reading(20, heart_rate=150, patient_id='P001'))
+    assert [a[1:3] for a in alerts] == [('P001', 'heart_rate_rate')]
+    assert engine.emitted == 1
+
+
+def test_engine_reingest_produces_same_rows():
+    rows = [reading(0, heart_rate=150, spo2=85)]
+    first = AlertEngine().evaluate(rows[0])
+    second = AlertEngine().evaluate(rows[0])
+    assert first == second and len(first) == 2
@@ -0,0 +1,75 @@
+from datetime import date, datetime, timedelta, timezone
+from types import SimpleNamespace
+
+import pytest
+from cassandra.util import uuid_from_time
+
+from Cassandra import model_cass
+from Cassandra.model_cass import _days_desc, _interval_from_buckets, _merge_desc, _scan_buckets_desc, reading_day
+
+T0 = datetime(2026, 3, 5, 23, 59, tzinfo=timezone.utc)
+
+
+def row(minutes):
+    return SimpleNamespace(timestmp=uuid_from_time(T0 - timedelta(minutes=minutes)))
+
+
+@pytest.fixture
+def buckets(monkeypatch):
+    """{dia: filas} servido por _execute_buckets; registra los lotes de dias pedidos"""
+    data, calls = {}, []
+
+    def execute_buckets(session, query, params_list):
+        calls.append([params[1] for params in params_list])
+        return [r for params in params_list for r in data.get(params[1], [])]
+
+    monkeypatch.setattr(model_cass, '_execute_buckets', execute_buckets)
+    return data, calls
+
+
+def test_days_desc_and_reading_day():
+    assert _days_desc(datetime(2026, 3, 3, 18), datetime(2026, 3, 5, 1)) == [
+        date(2026, 3, 5), date(2026, 3, 4), date(2026, 3, 3)]
+    assert reading_day(uuid_from_time(T0)) == date(2026, 3, 5)
+
+
+def test_merge_desc_dedupes_and_sorts_newest_first():
+    a, b, c = row(1), row(5), row(9)
+    assert _merge_desc([b, a], [c, b]) == [a, b, c]
+    assert _merge_desc([c], [a, b], limit=2) == [a, b]
+
+
+def test_scan_buckets_desc_stops_once_the_limit_is_reached(buckets, monkeypatch):
+    monkeypatch.setattr(model_cass, 'BUCKET_FANOUT', 2)
+    data, calls = buckets
+    days = _days_desc(T0 - timedelta(days=5), T0)
+    data[days[1]] = [row(60 * 24 + i) for i in range(2)]
+    data[days[2]] = [row(60 * 48 + i) for i in range(2)]
+    params = [('P001', day) for day in days]
+
+    assert _scan_buckets_desc(None, 'q', params, limit=3) == data[days[1]] + data[days[2]][:1]
+    assert calls == [days[0:2], days[2:4]]
+
+    calls.clear()
+    assert len(_scan_buckets_desc(None, 'q', params)) == 4
+    assert calls == [days[0:2], days[2:4], days[4:6]]
+
+
+def test_interval_falls_back_to_data_by_patient_until_migrated(buckets, monkeypatch):
+    data, _ = buckets
+    recent, old = row(1), row(60 * 24)
+    data[T0.date()] = [recent]
+    legacy = []
+    monkeypatch.setattr(model_cass, 'execute_prepared',
+                        lambda session, query, params: legacy.append(params) or [recent, old])
+
+    start = T0 - timedelta(days=1)
+    assert _interval_from_buckets(None, 'q', 'legacy', 'P001', start, T0) == [recent, old]
+    assert _interval_from_buckets(None, 'q', 'legacy', 'P001', start, T0, limit=2) == [recent, old]
+    assert legacy == [('P001', start, T0), ('P001', start, T0, 2)]
+
+    # con el limite cubierto por los buckets no se consulta data_by_patient
+    assert _interval_from_buckets(None, 'q', 'legacy', 'P001', start, T0, limit=1) == [recent]
+    monkeypatch.setattr(model_cass, 'BUCKETS_MIGRATED', True)
+    assert _interval_from_buckets(None, 'q', 'legacy', 'P001', start, T0) == [recent]
+    assert len(legacy) == 2
@@ -0,0 +1,101 @@
+from datetime import datetime
+
+from MongoDB.cache import LRUCache, SQLiteStore, invalidate_change
+
+
+class RecordingCache:
+    def __init__(self):
+        self.tags = []
+        self.cleared = 0
+
+    def invalidate_tag(self, tag):
+        self.tags.append(tag)
+
+    def clear(self):
+        self.cleared += 1
+
+
+def invalidated(change):
+    cache = RecordingCache()
+    invalidate_change(cache, change)
+    return cache.tags, cache.cleared
+
+
+def test_document_change_invalidates_the_patient_tag():
+    change = {'operationType': 'update', 'ns': {'coll': 'pacientes'},
+              'fullDocument': {'Paciente_ID': 'P001'}}
+    assert invalidated(change) == (['pacientes:P001'], 0)
+    change['ns']['coll'] = 'expedientes'
+    assert invalidated(change) == (['expedientes:P001'], 0)
+
+
+def test_delete_without_document_invalidates_the_collection():
+    change = {'operationType': 'delete', 'ns': {'coll': 'expedientes'}, 'documentKey': {'_id': 1}}
+    assert invalidated(change) == (['expedientes'], 0)
+
+
+def test_medicamentos_changes_invalidate_the_whole_collection():
+    change = {'operationType': 'update', 'ns': {'coll': 'medicamentos'},
+              'fullDocument': {'Medicamento_ID': 7}}
+    assert invalidated(change) == (['medicamentos'], 0)
+
+
+def test_unwatched_collections_are_ignored():
+    change = {'operationType': 'insert', 'ns': {'coll': 'tratamientos'},
+              'fullDocument': {'Paciente_ID': 'P001'}}
+    assert invalidated(change) == ([], 0)
+    assert invalidated({'operationType': 'drop', 'ns': {'coll': 'tratamientos'}}) == ([], 0)
+
+
+def test_drop_and_rename_invalidate_the_target_collection():
+    assert invalidated({'operationType': 'drop', 'ns': {'coll': 'pacientes'}}) == (['pacientes'], 0)
+    rename = {'operationType': 'rename', 'ns': {'coll': 'tmp'}, 'to': {'coll': 'pacientes'}}
+    assert invalidated(rename) == (['pacientes'], 0)
+
+
+def test_drop_database_and_invalidate_clear_everything():
+    assert invalidated({'operationType': 'dropDatabase', 'ns': {}}) == ([], 1)
+    assert invalidated({'operationType': 'invalidate'}) == ([], 1)
+
+
+def test_lru_invalidate_tag_and_stale_epoch():
+    cache = LRUCache(max_entries=10, ttl=60)
+    cache.set('paciente:P001', {'Nombre': 'Ana'}, tags=('pacientes', 'pacientes:P001'))
+    cache.set('paciente:P002', {'Nombre': 'Luis'}, tags=('pacientes', 'pacientes:P002'))
+    epoch = cache.epoch
+    cache.invalidate_tag('pacientes:P001')
+    assert cache.get('paciente:P001') == (False, None)
+    assert cache.get('paciente:P002') == (True, {'Nombre': 'Luis'})
+
+    # una carga que empezó antes de la invalidación no se guarda
+    cache.set('paciente:P001', {'Nombre': 'vieja'}, tags=('pacientes:P001',), epoch=epoch)
+    assert cache.get('paciente:P001') == (False, None)
+    assert cache.stats.invalidations == 1
+
+
+def test_lru_evicts_least_recently_used():
+    cache = LRUCache(max_entries=2, ttl=60)
+    cache.set('a', 1)
+    cache.set('b', 2)
+    cache.get('a')
+    cache.set('c', 3)
+    assert cache.get('b') == (False, None)
+    assert cache.get('a') == (True, 1)
+    assert cache.stats.evictions == 1
+
+
+def test_sqlite_store_round_trip_and_tags(tmp_path):
+    store = SQLiteStore(str(tmp_path / 'cache.db'))
+    value = [{'Fecha': datetime(2026, 1, 1, 8, 30), 'Dosis': None, 'Sintomas': ['fiebre']}]
+    store.set('expediente:P001', value, 60, ['expedientes', 'expedientes:P001'])
+    assert store.get('expediente:P001') == (True, value)
+    assert sorted(store.tags('expediente:P001')) == ['expedientes', 'expedientes:P001']
+
+    store.invalidate_tag('expedientes:P001')
+    assert store.get('expediente:P001') == (False, None)
+
+
+def test_sqlite_store_treats_undecodable_entries_as_misses(tmp_path):
+    store = SQLiteStore(str(tmp_path / 'cache.db'))
+    store._conn.execute("INSERT INTO entries VALUES (?, ?, ?)", ('k', b'\x80\x04junk', 1e12))
+    assert store.get('k') == (False, None)
@@ -0,0 +1,68 @@
+from collections import namedtuple
+from datetime import datetime, timezone
+
+import pytest
+from cassandra.util import uuid_from_time
+
+np = pytest.importorskip("numpy")
+
+from Cassandra import columnar, model_cass
+
+Vitals = namedtuple('Vitals', 'heart_rate glucose spo2')
+
+
+def test_timeuuids_to_datetime64():
+    moments = [datetime(2026, 1, 1, 0, 0, 0, 123400, tzinfo=timezone.utc), datetime(2026, 1, 2, tzinfo=timezone.utc)]
+    result = columnar.timeuuids_to_datetime64([uuid_from_time(m) for m in moments])
+    expected = np.array(['2026-01-01T00:00:00.123400', '2026-01-02T00:00:00'], dtype='datetime64[ns]')
+    assert np.array_equal(result, expected)
+
+
+def test_row_factory_types_and_nulls():
+    ts = uuid_from_time(datetime(2026, 1, 1, tzinfo=timezone.utc))
+    [page] = columnar.columnar_row_factory(['name', 'heart_rate', 'glucose', 'timestmp'],
+                                           [('Ana', 80, None, ts), ('Ana', 90, 110, ts)])
+    assert page['heart_rate'].dtype == np.int64
+    assert page['glucose'].dtype == np.float64 and np.isnan(page['glucose'][0])
+    assert page['name'].dtype == object
+    assert page['timestmp'].dtype == np.dtype('datetime64[ns]')
+
+
+def test_row_factory_empty_page():
+    [page] = columnar.columnar_row_factory(['heart_rate'], [])
+    assert len(page['heart_rate']) == 0
+
+
+def test_rolling_mean_ignores_nan():
+    result = columnar.rolling_mean([1, 2, np.nan, 4, 5], 2)
+    assert np.isnan(result[0])
+    assert result[1:].tolist() == [1.5, 2.0, 4.0, 4.5]
+
+
+def test_percentiles():
+    assert columnar.percentiles(list(range(101)), q=(50, 90)) == {50: 50.0, 90: 90.0}
+    assert columnar.percentiles([np.nan, np.nan], q=(50,)) == {50: None}
+
+
+def test_resample_by_minute():
+    base = np.datetime64('2026-01-01T00:00:00', 'ns')
+    timestamps = base + np.array([0, 30, 70, 90], dtype='timedelta64[s]').astype('timedelta64[ns]')
+    starts, means = columnar.resample(timestamps, [10, 20, np.nan, 40])
+    assert np.array_equal(starts, [base, base + np.timedelta64(60, 's')])
+    assert means.tolist() == [15.0, 40.0]
+    _, maxes = columnar.resample(timestamps, [10, 20, 30, 40], how='max')
+    assert maxes.tolist() == [20.0, 40.0]
+    with pytest.raises(ValueError):
+        columnar.resample(timestamps, [1, 2, 3, 4], how='median')
+
+
+def test_anomaly_flags():
+    values = [10.0] * 20 + [100.0]
+    assert columnar.anomaly_flags(values, z=3.0).tolist() == [False] * 20 + [True]
+
+
+def test_out_of_range_mask_matches_row_check():
+    rows = [Vitals(80, 100, 98), Vitals(150, 100, 98), Vitals(80, None, 85), Vitals(None, 300, None)]
+    columns = {name: np.array([np.nan if getattr(r, name) is None else getattr(r, name) for r in rows])
+               for name in Vitals._fields}
+    assert columnar.out_of_range_mask(columns).tolist() == [model_cass.is_out_of_range(r) for r in rows]
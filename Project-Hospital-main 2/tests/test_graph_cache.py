@@ -0,0 +1,98 @@
+import json
+from types import SimpleNamespace
+
+from DGraph.cache import GraphCache, mutation_predicates, query_predicates
+from DGraph.model_graph import QUERY_CATALOG
+
+
+class FakeClient:
+    """Cliente que responde siempre lo mismo con read timestamps crecientes"""
+
+    def __init__(self, start_ts=10):
+        self.start_ts = start_ts
+        self.queries = 0
+        self.on_query = None
+
+    def txn(self, read_only=False, best_effort=False):
+        return self
+
+    def query(self, query, variables=None):
+        self.queries += 1
+        if self.on_query:
+            self.on_query()
+        return SimpleNamespace(json=json.dumps({'patient': [{'patient_id': variables.get('$patient_id')}]}),
+                               txn=SimpleNamespace(start_ts=self.start_ts))
+
+
+def test_query_predicates_of_a_catalog_query():
+    predicates = query_predicates(QUERY_CATALOG['historial_medicamentos'][0])
+    assert predicates == {'patient_id', 'name', 'treated_with', 'treatment_id', 'description',
+                          'route', 'frequency', 'uses_medicine', 'medicine_id', 'dose_mg'}
+
+
+def test_query_predicates_reverse_edges_and_type():
+    query = "{ q(func: type(Doctor)) { ~has_primary_doctor { patient_id } doctor_id } }"
+    assert query_predicates(query) == {'has_primary_doctor', 'patient_id', 'doctor_id', 'dgraph.type'}
+
+
+def test_query_predicates_ignores_undeclared_words():
+    assert query_predicates("{ q(func: uid(0x1)) { uid nombre } }") == frozenset()
+
+
+def test_mutation_predicates_from_nested_json():
+    obj = [{'uid': '_:p1', 'dgraph.type': 'Patient', 'patient_id': 'P001',
+            'has_primary_doctor': {'uid': '0x2', 'doctor_id': 'D1'},
+            'care_team': [{'uid': '0x3'}, {'uid': '0x4', 'specialty': 'Cardiology'}],
+            'treated_with|frequency': 'daily'}]
+    assert mutation_predicates(obj) == {'dgraph.type', 'patient_id', 'has_primary_doctor', 'doctor_id',
+                                        'care_team', 'specialty', 'treated_with'}
+
+
+def test_mutation_predicates_from_nquads():
+    nquads = '\n'.join(['<0x1> <name> "Ana" .',
+                        '_:m1 <medicine_id> "M1" .',
+                        'uid(a) <interacts_with> uid(b) .'])
+    assert mutation_predicates(nquads=nquads) == {'name', 'medicine_id', 'interacts_with'}
+    assert mutation_predicates() == frozenset()
+
+
+def test_cache_hits_and_invalidates_by_predicate():
+    client = FakeClient()
+    cache = GraphCache(client, max_entries=10, ttl=60)
+    assert cache.query('historial_medicamentos', patient_id='P001') == {'patient': [{'patient_id': 'P001'}]}
+    cache.query('historial_medicamentos', patient_id='P001')
+    assert (client.queries, cache.stats.hits, cache.stats.misses) == (1, 1, 1)
+
+    # una mutación que no toca la consulta no la invalida
+    cache.invalidate({'specialty'}, commit_ts=20)
+    cache.query('historial_medicamentos', patient_id='P001')
+    assert client.queries == 1
+
+    cache.invalidate({'dose_mg'}, commit_ts=20)
+    assert len(cache) == 0 and cache.stats.invalidations == 1
+
+
+def test_cache_keeps_entries_read_after_the_commit():
+    client = FakeClient(start_ts=30)
+    cache = GraphCache(client, max_entries=10, ttl=60)
+    cache.query('historial_medicamentos', patient_id='P001')
+    cache.invalidate({'dose_mg'}, commit_ts=20)
+    assert len(cache) == 1
+
+
+def test_cache_does_not_store_reads_older_than_a_known_commit():
+    client = FakeClient(start_ts=10)
+    cache = GraphCache(client, max_entries=10, ttl=60)
+    cache.invalidate({'dose_mg'}, commit_ts=20)
+    cache.query('historial_medicamentos', patient_id='P001')
+    assert len(cache) == 0 and cache.stats.discarded == 1
+
+
+def test_cache_discards_reads_racing_a_mutation_or_clear():
+    client = FakeClient()
+    cache = GraphCache(client, max_entries=10, ttl=60)
+    client.on_query = lambda: cache.invalidate({'treated_with'})
+    cache.query('historial_medicamentos', patient_id='P001')
+    client.on_query = cache.clear
+    cache.query('historial_medicamentos', patient_id='P002')
+    assert len(cache) == 0 and cache.stats.discarded == 2
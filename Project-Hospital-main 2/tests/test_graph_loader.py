@@ -0,0 +1,111 @@
+from types import SimpleNamespace
+
+import pydgraph
+import pytest
+
+from DGraph import loader
+from DGraph.loader import (GraphLoadStats, _load_chunk, _mutate, _ref, build_doctors, build_medicines,
+                           build_patients, build_treatments, interaction_edges)
+
+UIDS = {('Doctor', 'D1'): '0x1', ('Medicine', 'M1'): '0x2', ('Medicine', 'M2'): '0x3',
+        ('Medicine', 'M3'): '0x4', ('Patient', 'P1'): '0x5'}
+
+
+class FakeClient:
+    """Asigna uids a los blank nodes; aborta las primeras `aborts` mutaciones"""
+
+    def __init__(self, aborts=0):
+        self.aborts = aborts
+        self.mutations = []
+
+    def txn(self):
+        return self
+
+    def mutate(self, set_obj=None, commit_now=False):
+        if self.aborts:
+            self.aborts -= 1
+            raise pydgraph.AbortedError()
+        self.mutations.append(set_obj)
+        blanks = [obj['uid'][2:] for obj in set_obj if obj['uid'].startswith('_:')]
+        return SimpleNamespace(uids={blank: f"0x{100 + i:x}" for i, blank in enumerate(blanks)})
+
+    def discard(self):
+        pass
+
+
+def test_ref_resolves_known_uids_only():
+    assert _ref(UIDS, 'Doctor', 'D1') == {'uid': '0x1'}
+    assert _ref(UIDS, 'Doctor', 'D9') is None
+    assert _ref(UIDS, 'Doctor', '') is None
+
+
+def test_build_doctors_and_medicines():
+    objs, created, edges, missing = build_doctors(
+        [{'doctor_id': 'D1', 'name': 'Ana', 'specialty': 'Cardiology', 'rating': '4.5'}], {})
+    assert objs == [{'uid': '_:D1', 'dgraph.type': 'Doctor', 'doctor_id': 'D1', 'name': 'Ana',
+                     'specialty': 'Cardiology', 'rating': 4.5}]
+    assert (created, edges, missing) == ([('Doctor', 'D1')], 0, 0)
+
+    objs, created, _, _ = build_medicines(
+        [{'medicine_id': 'M1', 'name': 'Aspirina', 'dose_mg': '100', 'interaction_group': 'G1'},
+         {'medicine_id': 'M2', 'name': 'Paracetamol', 'dose_mg': '500', 'interaction_group': ''}], {})
+    assert objs[0]['interaction_group'] == 'G1' and objs[0]['dose_mg'] == 100.0
+    assert 'interaction_group' not in objs[1]
+    assert created == [('Medicine', 'M1'), ('Medicine', 'M2')]
+
+
+def test_build_patients_links_known_doctors_and_counts_missing():
+    rows = [{'patient_id': 'P1', 'name': 'Luis', 'primary_doctor_id': 'D1'},
+            {'patient_id': 'P2', 'name': 'Eva', 'primary_doctor_id': 'D9'},
+            {'patient_id': 'P3', 'name': 'Sol', 'primary_doctor_id': ''}]
+    objs, created, edges, missing = build_patients(rows, UIDS)
+    assert objs[0]['has_primary_doctor'] == {'uid': '0x1'}
+    assert 'has_primary_doctor' not in objs[1] and 'has_primary_doctor' not in objs[2]
+    assert created == [('Patient', 'P1'), ('Patient', 'P2'), ('Patient', 'P3')]
+    assert (edges, missing) == (1, 1)
+
+
+def test_build_treatments_links_patient_medicine_and_care_team():
+    rows = [{'treatment_id': 'T1', 'patient_id': 'P1', 'medicine_id': 'M1', 'doctor_id': 'D1',
+             'route': 'oral', 'frequency': 'daily', 'diagnosis': 'Hipertensión'},
+            {'treatment_id': 'T2', 'patient_id': 'P9', 'medicine_id': 'M9', 'doctor_id': '',
+             'route': 'iv', 'frequency': 'once', 'description': 'Suero'}]
+    objs, created, edges, missing = build_treatments(rows, UIDS)
+    treatment, patient, orphan = objs
+    assert treatment['description'] == 'Hipertensión'
+    assert treatment['uses_medicine'] == {'uid': '0x2'}
+    assert patient == {'uid': '0x5', 'treated_with': [{'uid': '_:T1'}], 'care_team': [{'uid': '0x1'}]}
+    assert orphan['description'] == 'Suero' and 'uses_medicine' not in orphan
+    # los tratamientos no se referencian después
+    assert created == []
+    assert (edges, missing) == (3, 2)
+
+
+def test_interaction_edges_link_every_member_of_a_group():
+    rows = [{'medicine_id': 'M1', 'interaction_group': 'G1'},
+            {'medicine_id': 'M2', 'interaction_group': 'G1'},
+            {'medicine_id': 'M3', 'interaction_group': 'G2'},
+            {'medicine_id': 'M9', 'interaction_group': 'G1'}]
+    assert list(interaction_edges(rows, UIDS)) == [
+        {'uid': '0x2', 'interacts_with': [{'uid': '0x3'}]},
+        {'uid': '0x3', 'interacts_with': [{'uid': '0x2'}]},
+    ]
+
+
+def test_load_chunk_maps_created_ids_to_assigned_uids():
+    stats = GraphLoadStats()
+    uids = _load_chunk(FakeClient(), build_patients,
+                       [{'patient_id': 'P7', 'name': 'Ana', 'primary_doctor_id': 'D1'}], UIDS, stats)
+    assert uids == {('Patient', 'P7'): '0x64'}
+    assert (stats.nodes, stats.edges, stats.mutations, stats.missing) == (1, 1, 1, 0)
+
+
+def test_mutate_retries_aborted_transactions(monkeypatch):
+    monkeypatch.setattr(loader.time, 'sleep', lambda _: None)
+    stats = GraphLoadStats()
+    client = FakeClient(aborts=2)
+    assert _mutate(client, [{'uid': '_:D1'}], stats) == {'D1': '0x64'}
+    assert (stats.retries, stats.mutations) == (2, 1)
+
+    with pytest.raises(pydgraph.AbortedError):
+        _mutate(FakeClient(aborts=loader.MAX_RETRIES + 1), [{'uid': '_:D1'}], GraphLoadStats())
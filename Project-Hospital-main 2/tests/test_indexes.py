@@ -0,0 +1,65 @@
+from MongoDB.indexes import INDEXES, _collscans, index_fingerprint, index_plan, stale_indexes
+from MongoDB.stock import STOCK_BAJO
+
+
+def test_stale_indexes_drops_obsolete_ones_present():
+    existing = {'_id_': {}, 'stock': {'key': [('Stock', 1)]}}
+    assert stale_indexes('medicamentos', existing) == ['stock']
+    assert stale_indexes('medicamentos', {'_id_': {}}) == []
+
+
+def test_stale_indexes_drops_partial_index_with_changed_filter():
+    current = {'stock_bajo': {'partialFilterExpression': {'Stock': {'$lte': STOCK_BAJO}}}}
+    changed = {'stock_bajo': {'partialFilterExpression': {'Stock': {'$lte': STOCK_BAJO + 1}}}}
+    assert stale_indexes('medicamentos', current) == []
+    assert stale_indexes('medicamentos', changed) == ['stock_bajo']
+
+
+def test_index_plan_covers_every_collection_or_the_requested_ones():
+    plan = index_plan({'medicamentos': {'stock': {}}})
+    assert [collection for collection, _, _ in plan] == list(INDEXES)
+    drops = {collection: names for collection, names, _ in plan}
+    assert drops['medicamentos'] == ['stock']
+    assert drops['pacientes'] == []
+
+    (collection, names, models), = index_plan({}, ['pacientes'])
+    assert collection == 'pacientes' and names == []
+    assert [m.document['name'] for m in models] == [spec['name'] for spec in INDEXES['pacientes']]
+
+
+def test_index_models_do_not_carry_used_by():
+    for _, _, models in index_plan({}):
+        for model in models:
+            assert 'used_by' not in model.document
+
+
+def test_index_fingerprint_is_stable_and_tracks_specs(monkeypatch):
+    fingerprint = index_fingerprint()
+    assert fingerprint == index_fingerprint()
+    specs = [dict(spec, used_by=['otra']) for spec in INDEXES['pacientes']]
+    monkeypatch.setitem(INDEXES, 'pacientes', specs)
+    assert index_fingerprint() == fingerprint
+    monkeypatch.setitem(INDEXES, 'pacientes', specs[:1])
+    assert index_fingerprint() != fingerprint
+
+
+def test_collscans_finds_nested_stages_and_skips_rejected_plans():
+    plan = {
+        'queryPlanner': {
+            'winningPlan': {'stage': 'FETCH', 'inputStage': {'stage': 'COLLSCAN'}},
+            'rejectedPlans': [{'stage': 'COLLSCAN'}],
+        }
+    }
+    assert _collscans(plan) == ['plan.queryPlanner.winningPlan.inputStage']
+    assert _collscans({'stage': 'FETCH', 'inputStage': {'stage': 'IXSCAN'}}) == []
+
+
+def test_collscans_reports_lookups_that_scan_the_foreign_collection():
+    stages = [
+        {'$cursor': {'queryPlanner': {'winningPlan': {'stage': 'COLLSCAN'}}}},
+        {'$lookup': {'from': 'expedientes'}, 'collectionScans': 3},
+        {'$lookup': {'from': 'medicamentos'}, 'collectionScans': 0},
+    ]
+    assert _collscans(stages, lookup_only=True) == ['plan[1].$lookup(expedientes)']
+    assert _collscans(stages) == ['plan[0].$cursor.queryPlanner.winningPlan',
+                                  'plan[1].$lookup(expedientes)']
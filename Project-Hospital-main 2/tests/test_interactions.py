@@ -0,0 +1,59 @@
+from DGraph.interactions import InteractionIndex, patient_medicines
+
+
+def index_of(*nodes):
+    index = InteractionIndex()
+    for node in nodes:
+        index._set_out(node)
+    return index
+
+
+def node(medicine_id, *neighbours, name=None):
+    return {'medicine_id': medicine_id, 'name': name or medicine_id.lower(),
+            'interacts_with': [{'medicine_id': n} for n in neighbours]}
+
+
+def test_check_returns_sorted_pairs_in_either_direction():
+    index = index_of(node('M3', 'M1'), node('M1', 'M2'), node('M2'))
+    assert index.check(['M3', 'M2', 'M1']) == [('M1', 'M2'), ('M1', 'M3')]
+    assert index.interacts('M1', 'M3') and index.interacts('M3', 'M1')
+    assert not index.interacts('M2', 'M3')
+
+
+def test_check_ignores_unknown_and_repeated_ids():
+    index = index_of(node('M1', 'M2'))
+    assert index.check(['M1', 'M1', 'M9', 'M2']) == [('M1', 'M2')]
+    assert index.check(['M9']) == []
+    assert index.check([]) == []
+
+
+def test_edge_pair_in_both_directions_is_reported_once():
+    index = index_of(node('M1', 'M2'), node('M2', 'M1'))
+    assert index.check(['M2', 'M1']) == [('M1', 'M2')]
+
+
+def test_set_out_replaces_outgoing_edges():
+    index = index_of(node('M1', 'M2', 'M3'))
+    index._set_out(node('M1', 'M3'))
+    assert index.check(['M1', 'M2', 'M3']) == [('M1', 'M3')]
+    # las entrantes de M1 no cambian al recargar solo las salientes de otro nodo
+    index._set_out(node('M4', 'M1'))
+    index._set_out(node('M3'))
+    assert index.check(['M1', 'M3', 'M4']) == [('M1', 'M3'), ('M1', 'M4')]
+
+
+def test_names_come_from_the_loaded_nodes():
+    index = index_of(node('M2'), node('M1', 'M2', name='Ibuprofeno'))
+    assert index.name('M1') == 'Ibuprofeno'
+    assert index.name('M2') == 'm2'
+    assert index.name('M9') is None
+
+
+def test_patient_medicines_accepts_single_or_list_uses_medicine():
+    historial = {'treated_with': [
+        {'uses_medicine': [{'medicine_id': 'M1'}, {'medicine_id': 'M2'}]},
+        {'uses_medicine': {'medicine_id': 'M3'}},
+        {'description': 'reposo'},
+    ]}
+    assert patient_medicines(historial) == ['M1', 'M2', 'M3']
+    assert patient_medicines({}) == []
@@ -0,0 +1,103 @@
+from types import SimpleNamespace
+
+from Cassandra import model_cass
+from Cassandra.model_cass import (LIMITABLE_STATEMENTS, _decode_paging_state, _encode_paging_state,
+                                  get_page, iter_rows, prepare_statement, with_limit)
+
+
+class Statement:
+    def __init__(self, query):
+        self.query = query
+
+    def bind(self, params):
+        return SimpleNamespace(query=self.query, params=params, fetch_size=None)
+
+
+class Result:
+    """Como el ResultSet del driver: current_rows es la página; al iterar pide las siguientes"""
+
+    def __init__(self, session, bound, start):
+        end = start + bound.fetch_size
+        self.current_rows = session.rows[start:end]
+        self.paging_state = end.to_bytes(4, 'big') if end < len(session.rows) else None
+        self._next = lambda: session.execute(bound, self.paging_state)
+
+    def __iter__(self):
+        yield from self.current_rows
+        if self.paging_state is not None:
+            yield from self._next()
+
+
+class PagedSession:
+    """Sirve `rows` en páginas de bound.fetch_size; el paging state es el offset en bytes"""
+
+    def __init__(self, rows):
+        self.rows = rows
+        self.prepared = []
+        self.executed = []
+
+    def prepare(self, query):
+        self.prepared.append(query)
+        return Statement(query)
+
+    def execute(self, bound, paging_state=None):
+        self.executed.append((bound, paging_state))
+        return Result(self, bound, int.from_bytes(paging_state, 'big') if paging_state else 0)
+
+
+def test_with_limit_appends_a_single_bind_marker():
+    for query in LIMITABLE_STATEMENTS:
+        limited = with_limit(query)
+        assert limited.rstrip().endswith("LIMIT ?")
+        assert limited.count('?') == query.count('?') + 1
+        assert 'LIMIT' not in query
+
+
+def test_with_limit_statements_are_prepared_once_per_session():
+    session = PagedSession([])
+    query = with_limit(LIMITABLE_STATEMENTS[0])
+    assert prepare_statement(session, query) is prepare_statement(session, query)
+    assert session.prepared == [query]
+
+
+def test_paging_token_round_trip():
+    state = b'\x00\x04\x01\xff'
+    token = _encode_paging_state(state)
+    assert token == '000401ff'
+    assert _decode_paging_state(token) == state
+    # sin más páginas / primera página
+    assert _encode_paging_state(None) is None
+    assert _decode_paging_state(None) is None
+    assert _decode_paging_state('') is None
+
+
+def test_get_page_returns_a_token_for_the_next_page():
+    session = PagedSession(list(range(5)))
+    rows, token = get_page(session, LIMITABLE_STATEMENTS[0], ('P001',), page_size=2)
+    seen = list(rows)
+    while token is not None:
+        assert isinstance(token, str)
+        rows, token = get_page(session, LIMITABLE_STATEMENTS[0], ('P001',), page_size=2, paging_state=token)
+        seen.extend(rows)
+    assert seen == [0, 1, 2, 3, 4]
+    assert [state for _, state in session.executed] == [None, b'\x00\x00\x00\x02', b'\x00\x00\x00\x04']
+
+
+def test_iter_rows_continues_from_a_get_page_token():
+    session = PagedSession(list(range(5)))
+    _, token = get_page(session, LIMITABLE_STATEMENTS[0], ('P001',), page_size=3)
+    assert list(iter_rows(session, LIMITABLE_STATEMENTS[0], ('P001',), fetch_size=3, paging_state=token)) == [3, 4]
+    bound, state = session.executed[-1]
+    assert bound.fetch_size == 3 and state == bytes.fromhex(token)
+
+
+def test_iter_rows_walks_every_page():
+    session = PagedSession(list(range(7)))
+    assert list(iter_rows(session, LIMITABLE_STATEMENTS[0], ('P001',), fetch_size=3)) == list(range(7))
+    assert len(session.executed) == 3
+
+
+def test_executions_are_counted():
+    before = model_cass.get_statement_stats()['executions']
+    get_page(PagedSession([1]), LIMITABLE_STATEMENTS[0], ('P001',))
+    assert model_cass.get_statement_stats()['executions'] == before + 1
@@ -0,0 +1,61 @@
+import json
+from types import SimpleNamespace
+
+import pytest
+
+from DGraph.model_graph import QUERY_CATALOG, _batch_of, iter_batch, prepare_query, run_batch
+
+
+class FakeTxn:
+    """Responde páginas de `patients` según $first/$offset sobre los ids pedidos"""
+
+    def __init__(self):
+        self.calls = []
+
+    def query(self, query, variables=None):
+        self.calls.append(variables)
+        ids = json.loads(variables['$ids'])
+        first, offset = int(variables['$first']), int(variables['$offset'])
+        page = [{'patient_id': p} for p in ids[offset:offset + first]]
+        return SimpleNamespace(json=json.dumps({'patients': page}))
+
+
+def test_batch_of_rewrites_the_root_block():
+    query = QUERY_CATALOG['historial_medicamentos'][0]
+    batch = _batch_of('historial_medicamentos', query)
+    assert batch.startswith("\nquery historial_medicamentos_batch($ids: string, $first: int, $offset: int) {\n"
+                            "  patients(func: eq(patient_id, $ids), orderasc: patient_id, first: $first, "
+                            "offset: $offset) {")
+    # el cuerpo de la consulta no cambia
+    assert batch.split('{', 2)[2] == query.split('{', 2)[2]
+    assert QUERY_CATALOG['historial_medicamentos_batch'] == (batch, ('ids', 'first', 'offset'))
+
+
+def test_batch_of_rejects_queries_with_another_root():
+    with pytest.raises(ValueError, match="pacientes_por_medico: la consulta no empieza"):
+        _batch_of('pacientes_por_medico', QUERY_CATALOG['pacientes_por_medico'][0])
+
+
+def test_prepare_query_encodes_variables_as_strings():
+    _, variables = prepare_query('historial_medicamentos_batch', {'ids': ['P2', 'P1'], 'first': 10, 'offset': 0})
+    assert variables == {'$ids': '["P2", "P1"]', '$first': '10', '$offset': '0'}
+
+
+def test_prepare_query_reports_missing_variables():
+    with pytest.raises(ValueError, match="faltan variables first, offset"):
+        prepare_query('historial_medicamentos_batch', {'ids': ['P1']})
+
+
+def test_run_batch_sorts_and_dedupes_ids():
+    txn = FakeTxn()
+    assert run_batch('equipo_cuidado', ['P2', 'P1', 'P2'], txn=txn) == [{'patient_id': 'P1'},
+                                                                       {'patient_id': 'P2'}]
+    assert run_batch('equipo_cuidado', [], txn=txn) == []
+    assert len(txn.calls) == 1
+
+
+def test_iter_batch_walks_every_page_on_the_same_txn():
+    txn = FakeTxn()
+    ids = [f"P{i:03d}" for i in range(7)]
+    assert [p['patient_id'] for p in iter_batch('camino_atencion', ids, page_size=3, txn=txn)] == ids
+    assert [call['$offset'] for call in txn.calls] == ['0', '3', '6']
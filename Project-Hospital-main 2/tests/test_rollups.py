@@ -0,0 +1,86 @@
+from collections import namedtuple
+from datetime import datetime, timedelta, timezone
+
+import pytest
+from cassandra.util import uuid_from_time
+
+from Cassandra.ingest import Reading
+from Cassandra.rollups import (READINGS, RollupAccumulator, _merge, aggregate, bucket_start,
+                               get_readings_count, get_rollup_stats, rollup_params)
+
+T0 = datetime(2026, 3, 5, 10, 59, 30, tzinfo=timezone.utc)
+Bucket = namedtuple('Bucket', 'cnt total minimum maximum sumsq')
+
+
+class FakeSession:
+    """Devuelve `rows` para cualquier consulta preparada"""
+
+    def __init__(self, rows):
+        self.rows = rows
+
+    def prepare(self, query):
+        return query
+
+    def execute(self, stmt, params=None, **kwargs):
+        return list(self.rows)
+
+
+def reading(seconds, heart_rate=80, glucose=None, patient_id='P001'):
+    return Reading(patient_id, 'Ana', 10, heart_rate, 97, glucose, uuid_from_time(T0 + timedelta(seconds=seconds)))
+
+
+def test_bucket_start_per_resolution():
+    ts = T0.timestamp()
+    assert bucket_start(ts, 'minute') == datetime(2026, 3, 5, 10, 59)
+    assert bucket_start(ts, 'hour') == datetime(2026, 3, 5, 10)
+    assert bucket_start(ts, 'day') == datetime(2026, 3, 5)
+
+
+def test_merge_combines_counts_and_ignores_missing_extremes():
+    agg = [2, 10, 4, 6, 52]
+    assert _merge(agg, [1, 3, 3, 3, 9]) == [3, 13, 3, 6, 61]
+    assert _merge([0, 0, None, None, 0], [1, 5, 5, 5, 25]) == [1, 5, 5, 5, 25]
+    assert _merge([1, 5, 5, 5, 25], [0, 0, None, None, 0]) == [1, 5, 5, 5, 25]
+
+
+def test_aggregate_splits_buckets_and_skips_nulls():
+    aggs = aggregate([reading(0, 80), reading(40, 100)], resolutions=('minute', 'hour'))
+    # 10:59:30 y 11:00:10 caen en minutos y horas distintas
+    assert aggs[('P001', 'minute', 'heart_rate', datetime(2026, 3, 5, 10, 59))] == [1, 80, 80, 80, 6400]
+    assert aggs[('P001', 'hour', 'heart_rate', datetime(2026, 3, 5, 11))] == [1, 100, 100, 100, 10000]
+    assert aggs[('P001', 'hour', READINGS, datetime(2026, 3, 5, 10))][0] == 1
+    assert not any(key[2] == 'glucose' for key in aggs)
+
+
+def test_aggregate_is_a_pure_recount():
+    readings = [reading(s, 70 + s) for s in range(0, 20, 5)]
+    assert aggregate(readings) == aggregate(readings)
+    day = aggregate(readings, ('day',))[('P001', 'day', 'heart_rate', datetime(2026, 3, 5))]
+    assert day == [4, 70 + 75 + 80 + 85, 70, 85, sum(v * v for v in (70, 75, 80, 85))]
+
+
+def test_rollup_params_blank_values_for_readings_counter():
+    aggs = aggregate([reading(0)], ('day',))
+    params = {p[2]: p for p in rollup_params(aggs, write_ts=123)}
+    assert params[READINGS][4:9] == (1, None, None, None, None)
+    assert params['heart_rate'][4:9] == (1, 80, 80, 80, 6400)
+    assert params['heart_rate'][-2:] == (0, 123)
+
+
+def test_accumulator_touches_days_once():
+    acc = RollupAccumulator()
+    acc.add(reading(0))
+    acc.touch_rows([('P001', reading(10).timestmp), ('P002', reading(0).timestmp)])
+    assert len(acc) == 2
+
+
+def test_rollup_stats_combine_buckets():
+    session = FakeSession([Bucket(2, 160, 70, 90, 70 * 70 + 90 * 90), Bucket(1, 80, 80, 80, 6400)])
+    stats = get_rollup_stats(session, 'P001', 'heart_rate')
+    assert stats['count'] == 3 and stats['avg'] == 80 and (stats['min'], stats['max']) == (70, 90)
+    assert stats['stddev'] == pytest.approx((200 / 3) ** 0.5)
+
+
+def test_rollup_stats_none_without_buckets():
+    assert get_rollup_stats(FakeSession([]), 'P001', 'heart_rate') is None
+    assert get_readings_count(FakeSession([]), 'P001') is None
@@ -0,0 +1,59 @@
+from datetime import datetime
+import os
+
+import pytest
+
+from MongoDB.loader import iter_csv_documents
+from MongoDB.schema import normalize_document, normalize_text, search_tokens, to_int, to_list
+
+DATA_DIR = os.path.join(os.path.dirname(__file__), '..', 'data', 'Mongo')
+
+
+def test_normalize_text():
+    assert normalize_text('  José   NÚÑEZ ') == 'jose nunez'
+    assert normalize_text(None) == ''
+
+
+def test_search_tokens_drop_punctuation_and_repeats():
+    assert search_tokens("María-José  d'Ávila maría") == ['maria', 'jose', 'd', 'avila']
+    assert search_tokens('   ') == []
+
+
+def test_converters_treat_blank_as_missing():
+    assert to_int(' ') is None
+    assert to_list('') == []
+    with pytest.raises(ValueError):
+        to_list("'no es lista'")
+
+
+def test_paciente_is_typed_nested_and_searchable():
+    doc = normalize_document('pacientes', {
+        'Paciente_ID': ' P010 ', 'Nombre': 'Ana', 'Apellido': 'Núñez', 'Fecha_de_Nacimiento': '1990-05-12',
+        'Domicilio_Ciudad': 'Guadalajara', 'Domicilio_CP': '06500', 'Alergias': "['Penicilina']",
+    })
+    assert doc['Paciente_ID'] == 'P010'
+    assert doc['Fecha_de_Nacimiento'] == datetime(1990, 5, 12)
+    # los códigos postales siguen siendo texto (conservan el cero inicial)
+    assert doc['Domicilio'] == {'Ciudad': 'Guadalajara', 'CP': '06500'}
+    assert doc['Alergias'] == ['Penicilina']
+    assert doc['Nombre_Busqueda'] == ['ana', 'nunez']
+
+
+def test_expediente_lists_of_documents():
+    doc = normalize_document('expedientes', {
+        'Expediente_ID': '7', 'Paciente_ID': 'P001', 'Fecha_Creacion': '2024-01-10', 'Citas': '',
+        'Diagnosticos': "['Gastritis']", 'Tratamientos': "[{'medicamento': 'Omeprazol', 'dosis': '20 mg'}]",
+    })
+    assert doc['Expediente_ID'] == 7 and doc['Citas'] == []
+    assert doc['Tratamientos'][0]['medicamento'] == 'Omeprazol'
+
+
+def test_invalid_value_names_the_field():
+    with pytest.raises(ValueError, match='medicamentos.Stock'):
+        normalize_document('medicamentos', {'Medicamento_ID': '1', 'Stock': 'muchos'})
+
+
+@pytest.mark.parametrize('collection', ['pacientes', 'medicamentos', 'expedientes'])
+def test_bundled_csvs_normalize(collection):
+    docs = list(iter_csv_documents(os.path.join(DATA_DIR, f'{collection}.csv'), collection))
+    assert docs and all('_id' not in d for d in docs)
@@ -0,0 +1,27 @@
+from MongoDB.stock import crossing
+
+
+def test_crossing_down_to_threshold_is_low():
+    assert crossing(60, 50, umbral=50) == 'bajo'
+    assert crossing(51, 10, umbral=50) == 'bajo'
+
+
+def test_crossing_back_above_threshold_is_restocked():
+    assert crossing(50, 51, umbral=50) == 'repuesto'
+    assert crossing(0, 200, umbral=50) == 'repuesto'
+
+
+def test_no_crossing_on_same_side():
+    assert crossing(100, 60, umbral=50) is None
+    assert crossing(40, 10, umbral=50) is None
+    assert crossing(10, 50, umbral=50) is None
+
+
+def test_unknown_previous_stock():
+    # un documento nuevo (sin estado anterior) ya bajo el umbral avisa; sobre el umbral no
+    assert crossing(None, 5, umbral=50) == 'bajo'
+    assert crossing(None, 80, umbral=50) is None
+
+
+def test_missing_current_stock_is_ignored():
+    assert crossing(60, None, umbral=50) is None